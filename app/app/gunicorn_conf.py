@@ -0,0 +1,75 @@
+"""gunicorn settings for serving the app in production
+
+    gunicorn -c python:app.gunicorn_conf app.wsgi
+
+workers and threads are sized from the CPUs the container may use and
+can be set with the GUNICORN_* environment variables below. each worker
+thread takes one pooled database connection while serving a request,
+so DB_POOL_MAX_SIZE should be at least GUNICORN_THREADS.
+"""
+import multiprocessing
+import os
+import sys
+
+
+def _cpus():
+    """return the number of CPUs this process may run on"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+
+# threads overlap the time requests wait on the database, processes
+# make use of every CPU
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', _cpus() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# load the app once in the master and fork warm workers from it
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# recycle workers now and then, staggered so they do not all restart
+# at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+
+
+def on_starting(server):
+    """refuse to fork several workers onto caches they can not share"""
+    if server.cfg.workers < 2:
+        return
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
+    import django
+    django.setup()
+    from core.checks import per_process_caches
+    unshared = per_process_caches()
+    if unshared:
+        server.log.error('%s name a cache each worker keeps on its own, '
+                         'set SHARED_CACHE_BACKEND or run one worker',
+                         ', '.join(unshared))
+        sys.exit(1)
+
+
+def when_ready(server):
+    """warm up the preloaded app before the workers are forked"""
+    if preload_app:
+        from core.warmup import warm_up
+        seconds = warm_up(connect=False)
+        server.log.info('warmed up the app in %.3f seconds', seconds)
+
+
+def post_worker_init(worker):
+    """warm up a worker and connect it before it accepts requests"""
+    from core.warmup import warm_up
+    seconds = warm_up()
+    worker.log.info('warmed up worker %s in %.3f seconds',
+                    worker.pid, seconds)
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.1/ref/settings/
 """
 
+import importlib.util
 import os
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
@@ -39,12 +40,18 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
-    'core',
-    'users',
+    'core.apps.CoreConfig',
+    'users.apps.UserConfig',
     'recipes',
 ]
 
 MIDDLEWARE = [
+    # answers /healthz and /readyz before anything else runs
+    'core.health.HealthCheckMiddleware',
+    # times everything below, removes itself unless METRICS_ENABLED
+    'core.metrics.MetricsMiddleware',
+    # logs N+1 and slow queries of sampled requests
+    'core.querywatch.QueryWatchMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -78,16 +85,155 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
 
+# connections come from a per process pool of at most DB_POOL_MAX_SIZE,
+# requests wait up to DB_POOL_TIMEOUT seconds for a free one. idle
+# connections are closed after DB_POOL_IDLE_TIMEOUT seconds and checked
+# before reuse once idle for DB_POOL_CHECK_AFTER seconds.
+# DB_POOL_MAX_SIZE=0 turns the pool off, connections are then opened per
+# request and kept for DB_CONN_MAX_AGE seconds
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': 'core.db.pooled' if DB_POOL_MAX_SIZE
+        else 'django.db.backends.postgresql',
         'HOST': os.environ.get('DB_HOST'),
         'NAME': os.environ.get('DB_NAME'),
         'USER': os.environ.get('DB_USER'),
         'PASSWORD': os.environ.get('DB_PASS'),
+        # pooled connections are handed back at the end of each request
+        'CONN_MAX_AGE': 0 if DB_POOL_MAX_SIZE
+        else int(os.environ.get('DB_CONN_MAX_AGE', 0)),
+        'POOL': {
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+            'idle_timeout': float(
+                os.environ.get('DB_POOL_IDLE_TIMEOUT', 300)),
+            'check_after': float(os.environ.get('DB_POOL_CHECK_AFTER', 30)),
+        },
+    }
+}
+
+# safe requests to the recipe and user endpoints read from the replica at
+# DB_REPLICA_HOST when it is set. a user's requests keep reading from the
+# primary for DB_REPLICA_STICKY_SECONDS after they wrote, which has to
+# exceed the replication lag. the marker is kept in the
+# DB_REPLICA_CACHE_ALIAS cache, which all processes have to share
+
+DB_REPLICA_HOST = os.environ.get('DB_REPLICA_HOST')
+if DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': DB_REPLICA_HOST,
+        'TEST': {'MIRROR': 'default'},
     }
+DATABASE_ROUTERS = ['core.db.replica.ReplicaRouter']
+DB_REPLICA_STICKY_SECONDS = int(
+    os.environ.get('DB_REPLICA_STICKY_SECONDS', 5))
+DB_REPLICA_CACHE_ALIAS = os.environ.get('DB_REPLICA_CACHE_ALIAS', 'shared')
+
+
+# Caching
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    },
+    # state every process has to see the same way, like revoked tokens.
+    # a per process backend is refused outside DEBUG (core.checks). the
+    # docker image uses the database cache, redis is faster. memcached
+    # evicts entries early, which brings revoked tokens back
+    'shared': {
+        'BACKEND': os.environ.get(
+            'SHARED_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('SHARED_CACHE_LOCATION', 'shared'),
+    },
 }
 
+# cached list and detail responses are kept in RESPONSE_CACHE_ALIAS,
+# which may be per process. the generations that orphan them on writes
+# have to be seen by every process
+RESPONSE_CACHE_ALIAS = os.environ.get('RESPONSE_CACHE_ALIAS', 'default')
+RESPONSE_CACHE_GENERATION_ALIAS = os.environ.get(
+    'RESPONSE_CACHE_GENERATION_ALIAS', 'shared')
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', 300))
+
+# token -> user lookups are kept in a per process LRU and, when an alias
+# is set, in that cache as well. deleted tokens and changed users are
+# dropped from it, so it has to be shared by every process
+AUTH_TOKEN_CACHE_ALIAS = os.environ.get('AUTH_TOKEN_CACHE_ALIAS', 'shared')
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get('AUTH_TOKEN_CACHE_SIZE', 10000))
+AUTH_TOKEN_CACHE_TTL = int(os.environ.get('AUTH_TOKEN_CACHE_TTL', 60))
+
+# logins get signed tokens that expire AUTH_TOKEN_TTL seconds after they
+# were issued, clients swap them for new ones at token/refresh/. revoked
+# tokens are listed in the AUTH_TOKEN_REVOCATION_CACHE_ALIAS cache until
+# they expire, it has to be shared by every process and must not evict
+# entries early. database tokens from before expire AUTH_TOKEN_TTL after
+# they were created and are deleted by the purge_tokens command
+AUTH_TOKEN_TTL = int(os.environ.get('AUTH_TOKEN_TTL', 7 * 24 * 3600))
+AUTH_TOKEN_REVOCATION_CACHE_ALIAS = os.environ.get(
+    'AUTH_TOKEN_REVOCATION_CACHE_ALIAS', 'shared')
+
+
+# per view timing histograms, served on /metrics. METRICS_SERVER_TIMING
+# also sends each response's timings in a Server-Timing header
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '0') == '1'
+METRICS_SERVER_TIMING = os.environ.get('METRICS_SERVER_TIMING', '1') == '1'
+
+# /metrics is only served to requests with METRICS_TOKEN as a bearer token
+# or from the comma separated addresses and networks of METRICS_ALLOWED_IPS
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_ALLOWED_IPS = [
+    network.strip() for network in
+    os.environ.get('METRICS_ALLOWED_IPS', '').split(',') if network.strip()]
+
+# QUERY_WATCH_SAMPLE_RATE of the requests (0 to 1) are watched for
+# statements slower than QUERY_WATCH_SLOW_MS and for one statement
+# template run QUERY_WATCH_REPEAT_THRESHOLD times or more (N+1 queries),
+# which are logged along with the code that made them
+QUERY_WATCH_SAMPLE_RATE = float(os.environ.get('QUERY_WATCH_SAMPLE_RATE', 0))
+QUERY_WATCH_SLOW_MS = int(os.environ.get('QUERY_WATCH_SLOW_MS', 100))
+QUERY_WATCH_REPEAT_THRESHOLD = int(
+    os.environ.get('QUERY_WATCH_REPEAT_THRESHOLD', 5))
+
+
+# Password hashing
+# https://docs.djangoproject.com/en/2.1/topics/auth/passwords/
+# new passwords are hashed with PASSWORD_HASHER, argon2 (the default when
+# argon2-cffi is installed), bcrypt or pbkdf2, at the costs below. hashes
+# made with another hasher or cost are still accepted and replaced on the
+# user's next login. at most PASSWORD_HASH_WORKERS threads of a process
+# hash at once and PASSWORD_HASH_MAX_PENDING more logins wait, others
+# get a 503. 0 workers hashes on the request thread
+PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER') or (
+    'argon2' if importlib.util.find_spec('argon2') else 'pbkdf2')
+_PASSWORD_HASHERS = {
+    'argon2': 'users.hashers.Argon2PasswordHasher',
+    'bcrypt': 'users.hashers.BCryptSHA256PasswordHasher',
+    'pbkdf2': 'users.hashers.PBKDF2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + [
+    hasher for name, hasher in _PASSWORD_HASHERS.items()
+    if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+PASSWORD_ARGON2_TIME_COST = int(os.environ.get('PASSWORD_ARGON2_TIME_COST', 2))
+# in KiB
+PASSWORD_ARGON2_MEMORY_COST = int(
+    os.environ.get('PASSWORD_ARGON2_MEMORY_COST', 19 * 1024))
+PASSWORD_ARGON2_PARALLELISM = int(
+    os.environ.get('PASSWORD_ARGON2_PARALLELISM', 1))
+PASSWORD_BCRYPT_ROUNDS = int(os.environ.get('PASSWORD_BCRYPT_ROUNDS', 12))
+PASSWORD_PBKDF2_ITERATIONS = int(
+    os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 120000))
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 1))
+PASSWORD_HASH_MAX_PENDING = int(
+    os.environ.get('PASSWORD_HASH_MAX_PENDING', 16))
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -132,3 +278,45 @@ MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
 AUTH_USER_MODEL = 'core.User'
+
+# uploaded recipe images are resized to these widths on background
+# threads, 0 workers processes them inline
+RECIPE_IMAGE_WORKERS = int(os.environ.get('RECIPE_IMAGE_WORKERS', 2))
+RECIPE_IMAGE_MAX_PENDING = int(os.environ.get('RECIPE_IMAGE_MAX_PENDING', 16))
+RECIPE_IMAGE_RENDITION_WIDTHS = (320, 1024)
+RECIPE_IMAGE_QUALITY = 80
+
+# uploads are streamed to disk and rejected as soon as one of these is
+# exceeded, the header has to be found within the first
+# RECIPE_IMAGE_MAX_HEADER_BYTES
+RECIPE_IMAGE_MAX_BYTES = int(
+    os.environ.get('RECIPE_IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+RECIPE_IMAGE_MAX_PIXELS = int(
+    os.environ.get('RECIPE_IMAGE_MAX_PIXELS', 40 * 1000 * 1000))
+RECIPE_IMAGE_MAX_HEADER_BYTES = 256 * 1024
+
+
+# API pagination, clients may ask for up to API_MAX_PAGE_SIZE rows a page
+
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', 100))
+API_MAX_PAGE_SIZE = int(os.environ.get('API_MAX_PAGE_SIZE', 1000))
+
+# rows read from the database and rendered at a time when a list is
+# streamed with ?format=json-stream
+API_STREAM_CHUNK_SIZE = int(os.environ.get('API_STREAM_CHUNK_SIZE', 2000))
+
+RECIPES_BULK_MAX_ITEMS = int(os.environ.get('RECIPES_BULK_MAX_ITEMS', 5000))
+
+# incremental sync: sync tokens expire and change log entries are pruned
+# after SYNC_RETENTION_DAYS, a response holds at most SYNC_MAX_CHANGES
+# entries, and the watermark does not pass entries younger than
+# SYNC_SETTLE_SECONDS, which has to exceed the longest write transaction
+
+SYNC_RETENTION_DAYS = int(os.environ.get('SYNC_RETENTION_DAYS', 30))
+SYNC_MAX_CHANGES = int(os.environ.get('SYNC_MAX_CHANGES', 1000))
+SYNC_SETTLE_SECONDS = int(os.environ.get('SYNC_SETTLE_SECONDS', 5))
+
+# text search configuration used to build and query recipe search vectors
+# on PostgreSQL
+
+RECIPES_SEARCH_CONFIG = os.environ.get('RECIPES_SEARCH_CONFIG', 'english')
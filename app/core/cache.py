@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _cache():
+    return caches[settings.RESPONSE_CACHE_GENERATION_ALIAS]
+
+
+def _generation_key(user_id):
+    return f'core:generation:{user_id}'
+
+
+def get_generation(user_id):
+    """return the current data generation of a user
+
+    the counter is seeded from the clock when missing, so an evicted
+    counter never falls back to a value that old entries were stored
+    under.
+    """
+    cache = _cache()
+    key = _generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, int(time.time() * 1000), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(user_id):
+    """move a user on to a new generation, orphaning cached responses"""
+    cache = _cache()
+    key = _generation_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time() * 1000), timeout=None)
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core import checks
+
+
+# backends whose entries only the process that wrote them can see
+PER_PROCESS_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# settings naming a cache that every process has to see the same way
+SHARED_CACHE_SETTINGS = (
+    'AUTH_TOKEN_CACHE_ALIAS',
+    'AUTH_TOKEN_REVOCATION_CACHE_ALIAS',
+    'DB_REPLICA_CACHE_ALIAS',
+    'RESPONSE_CACHE_GENERATION_ALIAS',
+)
+
+
+def per_process_caches():
+    """return the settings whose cache each process keeps on its own"""
+    return [name for name in SHARED_CACHE_SETTINGS
+            if settings.CACHES.get(getattr(settings, name), {})
+            .get('BACKEND') in PER_PROCESS_BACKENDS]
+
+
+@checks.register('caches', deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    """refuse per process caches for state all processes have to share
+
+    a deployment check, run by `check --deploy` before gunicorn starts,
+    so runserver and the test suite can keep them to themselves.
+    gunicorn refuses several workers on such caches as well
+    (app.gunicorn_conf).
+    """
+    return [checks.Error(
+        f'{name} names a cache each process keeps on its own',
+        hint='point it at a cache every process reaches, like the shared '
+        'alias with SHARED_CACHE_BACKEND set to the database cache or '
+        'redis',
+        id='core.E001')
+        for name in per_process_caches()]
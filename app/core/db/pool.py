@@ -0,0 +1,127 @@
+import threading
+import time
+
+from django.db import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    """raised when no connection became free in time
+
+    an OperationalError, so it is handled like a database that does not
+    answer rather than ending in a server error.
+    """
+
+
+class ConnectionPool:
+    """a bounded, thread safe pool of database connections
+
+    at most `max_size` connections are open at once, callers wait up to
+    `timeout` seconds for one to be handed back. the most recently
+    returned connection is reused first, so the rest stay idle and are
+    closed after `idle_timeout` seconds. connections idle for longer
+    than `check_after` seconds are checked with `check` before they are
+    handed out, broken ones are replaced by a new connection.
+    """
+
+    def __init__(self, connect, check, max_size=10, idle_timeout=300,
+                 check_after=30, timeout=30, clock=time.monotonic):
+        self.connect = connect
+        self.check = check
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.check_after = check_after
+        self.timeout = timeout
+        self.clock = clock
+        # (returned at, connection), the most recently returned last
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition()
+
+    @property
+    def size(self):
+        """the number of open connections, idle or in use"""
+        return self._size
+
+    def get(self):
+        """return a connection, opening one if none is idle"""
+        deadline = self.clock() + self.timeout
+        while True:
+            with self._cond:
+                expired = self._take_expired()
+                while not self._idle and self._size >= self.max_size:
+                    remaining = deadline - self.clock()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f'no database connection became free within '
+                            f'{self.timeout} seconds')
+                    self._cond.wait(remaining)
+                if self._idle:
+                    returned, conn = self._idle.pop()
+                else:
+                    returned, conn = None, None
+                    self._size += 1
+            for stale in expired:
+                self._close(stale)
+
+            if conn is None:
+                try:
+                    return self.connect()
+                except BaseException:
+                    self._forget()
+                    raise
+            if self.clock() - returned <= self.check_after or \
+                    self.check(conn):
+                return conn
+            self.put(conn, discard=True)
+
+    def put(self, conn, discard=False):
+        """hand a connection back, closing it when discarded or broken"""
+        if discard or conn.closed:
+            self._close(conn)
+            self._forget()
+            return
+        with self._cond:
+            self._idle.append((self.clock(), conn))
+            expired = self._take_expired()
+            self._cond.notify()
+        for stale in expired:
+            self._close(stale)
+
+    def close_all(self):
+        """close the idle connections"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for _returned, conn in idle:
+            self._close(conn)
+
+    def _take_expired(self):
+        """remove and return the connections idle for too long
+
+        has to be called with the lock held.
+        """
+        cutoff = self.clock() - self.idle_timeout
+        count = 0
+        while count < len(self._idle) and self._idle[count][0] < cutoff:
+            count += 1
+        expired = [conn for _returned, conn in self._idle[:count]]
+        del self._idle[:count]
+        self._size -= count
+        if count:
+            self._cond.notify_all()
+        return expired
+
+    def _forget(self):
+        """free the slot of a connection that was closed"""
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close(conn):
+        """close a connection, ignoring errors of broken ones"""
+        try:
+            conn.close()
+        except Exception:
+            pass
@@ -0,0 +1,111 @@
+import os
+import threading
+
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from core.db.pool import ConnectionPool
+
+
+# one pool per database alias, connection parameters and process. the
+# test runner renames databases in place, and forked workers must not
+# share the sockets of their parent
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def check_connection(connection):
+    """return whether a pooled connection still answers"""
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if not connection.autocommit:
+            connection.rollback()
+    except base.Database.Error:
+        return False
+    return True
+
+
+def close_pools(alias):
+    """close the idle connections of every pool of a database alias"""
+    with _pools_lock:
+        pools = [pool for (pool_alias, _params, pid), pool in _pools.items()
+                 if pool_alias == alias and pid == os.getpid()]
+    for pool in pools:
+        pool.close_all()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    """close pooled connections before the test database is dropped
+
+    postgresql neither drops nor copies a database that has sessions,
+    and connections closed by Django sit idle in the pool.
+    """
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        self.connection.close()
+        close_pools(self.connection.alias)
+        super()._clone_test_db(suffix, verbosity, keepdb)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """postgresql backend taking connections from a per process pool
+
+    Django closes connections at the end of every request when
+    CONN_MAX_AGE is 0, which hands them back to the pool here instead,
+    so requests no longer wait for a connection to be set up. the pool
+    is configured by the POOL entry of the database settings, see
+    `core.db.pool.ConnectionPool` for its keys.
+    """
+
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params):
+        """return the pool of this database in the current process"""
+        key = (self.alias, repr(sorted(conn_params.items())), os.getpid())
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(
+                    lambda: base.Database.connect(**conn_params),
+                    check_connection, **self.settings_dict.get('POOL', {}))
+        return pool
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        connection = self.pool.get()
+
+        # as in the postgresql backend, pooled connections keep the
+        # isolation level once it is set
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+
+        return connection
+
+    def _close(self):
+        """hand the connection back to the pool with no transaction open
+
+        closed inside an atomic block, the connection stays attached to
+        this wrapper until the block exits, so it is closed rather than
+        handed to another thread.
+        """
+        connection = self.connection
+        try:
+            status = connection.get_transaction_status()
+            broken = connection.closed or self.in_atomic_block or \
+                status == extensions.TRANSACTION_STATUS_UNKNOWN
+            if not broken and status != extensions.TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except base.Database.Error:
+            broken = True
+        self.pool.put(connection, discard=broken)
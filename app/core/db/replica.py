@@ -0,0 +1,97 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+REPLICA_DB_ALIAS = 'replica'
+
+_state = threading.local()
+
+
+def replica_configured():
+    """return whether a replica database is set up"""
+    return REPLICA_DB_ALIAS in connections.databases
+
+
+def _sticky_key(user_id):
+    return f'core:replica:sticky:{user_id}'
+
+
+def mark_written(user_id):
+    """keep a user's reads on the primary until the replica caught up"""
+    caches[settings.DB_REPLICA_CACHE_ALIAS].set(
+        _sticky_key(user_id), True,
+        timeout=settings.DB_REPLICA_STICKY_SECONDS)
+
+
+def recently_written(user_id):
+    """return whether a user wrote within the last sticky seconds"""
+    return caches[settings.DB_REPLICA_CACHE_ALIAS].get(
+        _sticky_key(user_id), False)
+
+
+class ReplicaRouter:
+    """send reads to the replica while a ReplicaReadMixin view allows it
+
+    writes always go to the default database, also those of objects
+    that were read from the replica.
+    """
+
+    def db_for_read(self, model, **hints):
+        # the database cache holds state that must not lag, like revoked
+        # tokens
+        if getattr(_state, 'replica', False) and replica_configured() and \
+                model._meta.app_label != 'django_cache':
+            return REPLICA_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, REPLICA_DB_ALIAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """serve a view's safe requests from the replica when one is set up
+
+    a user's requests stay on the primary for DB_REPLICA_STICKY_SECONDS
+    after any of their unsafe requests, so they read their own writes.
+    querysets are pinned to the replica, so ones evaluated after the
+    view returned, like streamed lists, read from it as well.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        previous = getattr(_state, 'replica', False)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _state.replica = previous
+
+    def initial(self, request, *args, **kwargs):
+        """decide where to read from once the user is known"""
+        user = request.user
+        if request.method in SAFE_METHODS and replica_configured() and \
+                not (user.is_authenticated and recently_written(user.pk)):
+            _state.replica = True
+        super().initial(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """start the user's sticky period once their write is done"""
+        user = getattr(request, 'user', None)
+        if request.method not in SAFE_METHODS and \
+                user is not None and user.is_authenticated:
+            mark_written(user.pk)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if getattr(_state, 'replica', False) and replica_configured():
+            queryset = queryset.using(REPLICA_DB_ALIAS)
+        return queryset
@@ -0,0 +1,121 @@
+import logging
+import time
+
+from django.core.exceptions import DisallowedHost
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.http import JsonResponse
+
+
+LIVENESS_PATH = '/healthz'
+READINESS_PATH = '/readyz'
+
+logger = logging.getLogger(__name__)
+
+# once every migration was applied it stays applied for the life of the
+# process, so the migration graph is only loaded until then
+_migrated = False
+
+
+def check_database(alias=DEFAULT_DB_ALIAS):
+    """run a trivial query, return how long it took in seconds"""
+    start = time.perf_counter()
+    with connections[alias].cursor() as cursor:
+        cursor.execute('SELECT 1')
+        cursor.fetchone()
+    return time.perf_counter() - start
+
+
+def pending_migrations(alias=DEFAULT_DB_ALIAS):
+    """return the names of the migrations that were not applied yet"""
+    global _migrated
+    if _migrated:
+        return []
+    executor = MigrationExecutor(connections[alias])
+    plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+    pending = [f'{migration.app_label}.{migration.name}'
+               for migration, _backwards in plan]
+    _migrated = not pending
+    return pending
+
+
+def database_status():
+    """return (whether all databases answer, their latency or error)"""
+    healthy, status = True, {}
+    for alias in connections:
+        try:
+            status[alias] = {
+                'latency_ms': round(check_database(alias) * 1000, 2)}
+        except DatabaseError as exc:
+            healthy = False
+            # the driver error names hosts and users, it is only logged
+            logger.warning('database %s does not answer: %s', alias, exc)
+            status[alias] = {'error': 'not answering'}
+    return healthy, status
+
+
+def _response(request, body, status=200):
+    """return a probe response, only the status for hosts not allowed"""
+    try:
+        request.get_host()
+    except DisallowedHost:
+        body = {'status': body['status']}
+    return JsonResponse(body, status=status)
+
+
+def liveness(request):
+    """report the process as alive
+
+    the databases are left to the readiness probe. an outage or an
+    exhausted connection pool does not fail this probe, restarting the
+    process would not help, and it must not wait for a connection.
+    """
+    return _response(request, {'status': 'ok'})
+
+
+def readiness(request):
+    """report whether requests can be served
+
+    the databases have to answer and every migration has to be applied.
+    an exhausted connection pool raises a DatabaseError as well, after
+    DB_POOL_TIMEOUT.
+    """
+    healthy, databases = database_status()
+    body = {'databases': databases}
+    if healthy:
+        try:
+            body['pending_migrations'] = pending_migrations()
+        except DatabaseError as exc:
+            healthy = False
+            logger.warning('migrations could not be read: %s', exc)
+            body['pending_migrations'] = {'error': 'not readable'}
+        else:
+            healthy = not body['pending_migrations']
+    body['status'] = 'ok' if healthy else 'unavailable'
+    return _response(request, body, 200 if healthy else 503)
+
+
+PROBES = {
+    LIVENESS_PATH: liveness,
+    READINESS_PATH: readiness,
+}
+
+
+class HealthCheckMiddleware:
+    """answer health probes before any other middleware runs
+
+    probes address pods by IP rather than an allowed host and need no
+    sessions, CSRF checks or authentication, so this has to come first
+    in MIDDLEWARE. it deliberately skips the ALLOWED_HOSTS check, for
+    GET and HEAD on the probe paths only, and hosts that are not allowed
+    get the status alone, without database or migration details.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        probe = PROBES.get(request.path_info.rstrip('/'))
+        if probe is not None and request.method in ('GET', 'HEAD'):
+            return probe(request)
+        return self.get_response(request)
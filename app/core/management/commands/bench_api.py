@@ -0,0 +1,330 @@
+import itertools
+import json
+import logging
+import re
+import subprocess
+import threading
+import time
+import uuid
+from collections import Counter, namedtuple
+from contextlib import ExitStack
+from http.client import HTTPConnection, HTTPException
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.db.models import Max
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.management.commands.seed_data import SEED_DOMAIN, seeded_users
+from core.models import ChangeLog, Ingredients, Recipes, Tags
+from recipes import sync
+from users import tokens
+
+
+# names of the objects the benchmark creates, deleted when it is done
+BENCH = 'bench-api'
+
+Endpoint = namedtuple('Endpoint', 'name method path payload')
+
+
+def endpoints(password):
+    """return the requests made to each endpoint
+
+    path and payload are called with the context of a seeded user and
+    the number of the request.
+    """
+    tags = reverse('recipes:tags-list')
+    ingredients = reverse('recipes:ingredients-list')
+    recipes = reverse('recipes:recipes-list')
+    sync_url = reverse('recipes:sync')
+    me = reverse('user:me')
+
+    def detail(context, n):
+        return reverse('recipes:recipes-detail', args=[context['recipe']])
+
+    def recipe(context, n):
+        return {'title': f'{BENCH} recipe {n}', 'time_minutes': 10,
+                'price': '5.00', 'tags': [context['tag']],
+                'ingredients': [context['ingredient']]}
+
+    return (
+        Endpoint('tags list', 'get', lambda c, n: tags, None),
+        Endpoint('tags create', 'post', lambda c, n: tags,
+                 lambda c, n: {'name': f'{BENCH} tag {n}'}),
+        Endpoint('tags upsert', 'post',
+                 lambda c, n: reverse('recipes:tags-upsert'),
+                 lambda c, n: {'names': [c['tag_name']]}),
+        Endpoint('ingredients list', 'get', lambda c, n: ingredients, None),
+        Endpoint('ingredients create', 'post', lambda c, n: ingredients,
+                 lambda c, n: {'name': f'{BENCH} ingredient {n}'}),
+        Endpoint('ingredients upsert', 'post',
+                 lambda c, n: reverse('recipes:ingredients-upsert'),
+                 lambda c, n: {'names': [c['ingredient_name']]}),
+        Endpoint('recipes list', 'get', lambda c, n: recipes, None),
+        Endpoint('recipes by tag', 'get',
+                 lambda c, n: f'{recipes}?tags={c["tag"]}', None),
+        Endpoint('recipes search', 'get',
+                 lambda c, n: f'{recipes}?search=curry', None),
+        Endpoint('recipe detail', 'get', detail, None),
+        Endpoint('recipe create', 'post', lambda c, n: recipes, recipe),
+        Endpoint('recipe update', 'patch', detail,
+                 lambda c, n: {'time_minutes': 5 + n % 100}),
+        Endpoint('recipes bulk create', 'post',
+                 lambda c, n: reverse('recipes:recipes-bulk'),
+                 lambda c, n: [recipe(c, f'{n}.{i}') for i in range(10)]),
+        Endpoint('sync full', 'get', lambda c, n: sync_url, None),
+        Endpoint('sync delta', 'get',
+                 lambda c, n: f'{sync_url}?since={c["since"]}', None),
+        Endpoint('user create', 'post', lambda c, n: reverse('user:create'),
+                 lambda c, n: {'email': f'{BENCH}-{uuid.uuid4().hex}@'
+                               f'{SEED_DOMAIN}',
+                               'password': password, 'name': BENCH}),
+        Endpoint('user token', 'post', lambda c, n: reverse('user:token'),
+                 lambda c, n: {'email': c['email'], 'password': password}),
+        Endpoint('user me', 'get', lambda c, n: me, None),
+        Endpoint('user me update', 'patch', lambda c, n: me,
+                 lambda c, n: {'name': c['name']}),
+    )
+
+
+class ClientTransport:
+    """make requests through the test client, counting their queries"""
+
+    def __init__(self):
+        self.client = APIClient(SERVER_NAME='localhost')
+
+    def request(self, method, path, payload, token):
+        """return the status and number of queries of a request"""
+        queries = itertools.count()
+
+        def count(execute, sql, params, many, context):
+            next(queries)
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(count))
+            resp = getattr(self.client, method)(
+                path, payload, format='json',
+                HTTP_AUTHORIZATION=f'Token {token}')
+        return resp.status_code, next(queries)
+
+
+class HTTPTransport:
+    """make requests to a running server over a kept-alive connection
+
+    queries are only known when the server sends Server-Timing headers.
+    """
+
+    queries = re.compile(r'desc="(\d+) queries"')
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.prefix = parts.path.rstrip('/')
+        self.connection = HTTPConnection(parts.hostname, parts.port)
+
+    def request(self, method, path, payload, token):
+        """return the status and number of queries of a request"""
+        body = None if payload is None else json.dumps(payload)
+        headers = {'Authorization': f'Token {token}',
+                   'Content-Type': 'application/json'}
+        try:
+            self.connection.request(method.upper(), self.prefix + path,
+                                    body, headers)
+            resp = self.connection.getresponse()
+            resp.read()
+        except (HTTPException, OSError):
+            self.connection.close()
+            raise
+        match = self.queries.search(resp.getheader('Server-Timing') or '')
+        return resp.status, int(match.group(1)) if match else None
+
+
+class Command(BaseCommand):
+    """django command to load test every API endpoint"""
+
+    help = 'drive each recipes and users endpoint at a fixed concurrency ' \
+        'as the users made by seed_data, and report throughput, latency ' \
+        'percentiles and queries per request as JSON. image uploads and ' \
+        'deletes are not covered'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='requests made to each endpoint')
+        parser.add_argument('--warmup', type=int, default=5,
+                            help='requests made before measuring')
+        parser.add_argument('--endpoint', action='append',
+                            help='only run endpoints with this name')
+        parser.add_argument('--url',
+                            help='send requests to a server at this URL '
+                            'instead of through the test client')
+        parser.add_argument('--prefix', default='seed',
+                            help='prefix of the seeded users')
+        parser.add_argument('--users', type=int, default=10,
+                            help='seeded users to take turns with')
+        parser.add_argument('--password', default='seedpass',
+                            help='password of the seeded users')
+        parser.add_argument('--output', help='write the report to a file')
+
+    def handle(self, *args, **options):
+        """handle the command"""
+        contexts = self.contexts(options['prefix'], options['users'])
+        selected = [endpoint for endpoint in endpoints(options['password'])
+                    if not options['endpoint'] or
+                    endpoint.name in options['endpoint']]
+        if not selected:
+            raise CommandError('no endpoint matches')
+
+        if options['url']:
+            def transport():
+                return HTTPTransport(options['url'])
+        else:
+            transport = ClientTransport
+
+        report = {
+            'revision': self.revision(),
+            'mode': 'http' if options['url'] else 'client',
+            'database': connection.vendor,
+            'concurrency': options['concurrency'],
+            'requests': options['requests'],
+            'users': len(contexts),
+            'endpoints': {},
+        }
+        # failed requests are counted in the report
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        if options['verbosity'] < 2:
+            request_logger.setLevel(logging.CRITICAL)
+        try:
+            for endpoint in selected:
+                report['endpoints'][endpoint.name] = self.run(
+                    endpoint, contexts, transport, options)
+                if options['verbosity'] > 1:
+                    self.stderr.write(endpoint.name)
+        finally:
+            request_logger.setLevel(level)
+            self.clean_up()
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        else:
+            self.stdout.write(output)
+
+    def contexts(self, prefix, count):
+        """return what the requests of each seeded user refer to"""
+        users = list(seeded_users(prefix)[:count])
+        if not users:
+            raise CommandError('no seeded users, run seed_data first')
+        contexts = []
+        for user in users:
+            tag = Tags.objects.filter(user=user) \
+                .values_list('id', 'name').first()
+            ingredient = Ingredients.objects.filter(user=user) \
+                .values_list('id', 'name').first()
+            recipe = Recipes.objects.filter(user=user) \
+                .values_list('id', flat=True).first()
+            if None in (tag, ingredient, recipe):
+                raise CommandError(f'{user.email} has no data to request')
+            watermark = ChangeLog.objects.filter(user=user) \
+                .aggregate(watermark=Max('id'))['watermark'] or 0
+            contexts.append({
+                'email': user.email, 'name': user.name,
+                'token': tokens.issue(user).key,
+                'tag': tag[0], 'tag_name': tag[1],
+                'ingredient': ingredient[0], 'ingredient_name': ingredient[1],
+                'recipe': recipe, 'since': sync.make_token(user, watermark),
+            })
+        return contexts
+
+    def run(self, endpoint, contexts, transport, options):
+        """make the requests to an endpoint, return their statistics"""
+        numbers = itertools.count()
+        latencies, queries, statuses = [], [], Counter()
+
+        def requests(total, record):
+            client = transport()
+            try:
+                while True:
+                    n = next(numbers)
+                    if n >= total:
+                        return
+                    context = contexts[n % len(contexts)]
+                    start = time.perf_counter()
+                    try:
+                        status, count = client.request(
+                            endpoint.method, endpoint.path(context, n),
+                            endpoint.payload and endpoint.payload(context, n),
+                            context['token'])
+                    except Exception as exc:
+                        status, count = type(exc).__name__, None
+                    if record:
+                        latencies.append(time.perf_counter() - start)
+                        statuses[status] += 1
+                        if count is not None:
+                            queries.append(count)
+            finally:
+                if threading.current_thread() is not threading.main_thread():
+                    connections.close_all()
+
+        requests(options['warmup'], record=False)
+        numbers = itertools.count(options['warmup'])
+        total = options['warmup'] + options['requests']
+        start = time.perf_counter()
+        if options['concurrency'] == 1:
+            requests(total, record=True)
+        else:
+            threads = [threading.Thread(target=requests, args=(total, True))
+                       for _ in range(options['concurrency'])]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - start
+
+        latencies.sort()
+        errors = {str(status): count for status, count in statuses.items()
+                  if not isinstance(status, int) or status >= 400}
+        return {
+            'method': endpoint.method.upper(),
+            'throughput': round(len(latencies) / elapsed, 1),
+            'p50_ms': self.percentile(latencies, 50),
+            'p95_ms': self.percentile(latencies, 95),
+            'p99_ms': self.percentile(latencies, 99),
+            'max_ms': self.percentile(latencies, 100),
+            'queries': round(sum(queries) / len(queries), 1)
+            if queries else None,
+            'errors': errors,
+        }
+
+    def clean_up(self):
+        """delete what the benchmark created"""
+        Recipes.objects.filter(title__startswith=BENCH).delete()
+        Tags.objects.filter(name__startswith=BENCH).delete()
+        Ingredients.objects.filter(name__startswith=BENCH).delete()
+        seeded_users(BENCH).delete()
+
+    @staticmethod
+    def revision():
+        """return the commit being benchmarked, if known"""
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'],
+                cwd=settings.BASE_DIR, stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL, universal_newlines=True,
+                check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    @staticmethod
+    def percentile(latencies, pct):
+        """return a percentile of sorted latencies in milliseconds"""
+        if not latencies:
+            return None
+        index = min(len(latencies) - 1, len(latencies) * pct // 100)
+        return round(latencies[index] * 1000, 2)
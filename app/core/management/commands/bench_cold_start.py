@@ -0,0 +1,88 @@
+import json
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from users import tokens
+
+
+# run in a new interpreter, prints the seconds until the app could
+# accept a request and how long the first request then took
+STARTUP = '''
+import json, sys, time
+start = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+warm_up = None
+if sys.argv[1] == 'warm':
+    from core.warmup import warm_up
+    warm_up()
+ready = time.perf_counter()
+from django.test import Client
+client = Client(SERVER_NAME='localhost')
+ready_client = time.perf_counter()
+resp = client.get(sys.argv[2], HTTP_AUTHORIZATION='Token ' + sys.argv[3])
+done = time.perf_counter()
+print(json.dumps({'status': resp.status_code, 'ready': ready - start,
+                  'first': done - ready_client}))
+'''
+
+MODES = ('cold', 'warm')
+
+
+class Command(BaseCommand):
+    """django command to measure the cold start of a new process"""
+
+    help = 'measure the time from starting a process to its first ' \
+        'response, with and without warming up before accepting requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5,
+                            help='processes started for each mode')
+        parser.add_argument('--path',
+                            help='defaults to the recipe list')
+
+    def handle(self, *args, **options):
+        """handle the command"""
+        user = get_user_model().objects.create_user(
+            f'bench-{uuid.uuid4().hex[:8]}@londonappdev.com', 'testpass')
+        token = tokens.issue(user)
+        path = options['path'] or reverse('recipes:recipes-list')
+        try:
+            for mode in MODES:
+                runs = [self.run(mode, path, token.key)
+                        for _ in range(options['runs'])]
+                self.stdout.write(
+                    f'{mode:5}'
+                    + ''.join(f' {key} {self.median(runs, key):7.1f} ms'
+                              for key in ('ready', 'first', 'total')))
+        finally:
+            user.delete()
+
+    def run(self, mode, path, key):
+        """start a process and make its first request"""
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', STARTUP, mode, path, key],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            cwd=os.getcwd(), env=os.environ, universal_newlines=True)
+        total = time.perf_counter() - start
+        if result.returncode:
+            raise CommandError(result.stderr)
+        timings = json.loads(result.stdout.splitlines()[-1])
+        if timings['status'] != 200:
+            raise CommandError(f'first request returned {timings["status"]}')
+        timings['total'] = total
+        return timings
+
+    @staticmethod
+    def median(runs, key):
+        """return the median of a timing in milliseconds"""
+        values = sorted(run[key] for run in runs)
+        return values[len(values) // 2] * 1000
@@ -0,0 +1,79 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.utils import load_backend
+
+
+ENGINES = (
+    ('new', 'django.db.backends.postgresql'),
+    ('pooled', 'core.db.pooled'),
+)
+
+
+class Command(BaseCommand):
+    """django command to compare new and pooled database connections"""
+
+    help = 'measure query latency percentiles under concurrent load, ' \
+        'connecting for every request and taking connections from a pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='requests made by each thread')
+        parser.add_argument('--query', default='SELECT 1')
+
+    def handle(self, *args, **options):
+        """handle the command"""
+        default = connections['default']
+        if default.vendor != 'postgresql':
+            raise CommandError('the load test needs PostgreSQL')
+        for name, engine in ENGINES:
+            settings_dict = {
+                **default.settings_dict, 'ENGINE': engine, 'CONN_MAX_AGE': 0,
+                'POOL': {**default.settings_dict.get('POOL', {}),
+                         'max_size': options['threads']},
+            }
+            latencies, elapsed = self.run(
+                load_backend(engine), settings_dict, options)
+            latencies.sort()
+            self.stdout.write(
+                f'{name:7}'
+                + ''.join(f' p{pct} {self.percentile(latencies, pct):7.2f} ms'
+                          for pct in (50, 95, 99))
+                + f' max {latencies[-1] * 1000:7.2f} ms'
+                f' {len(latencies) / elapsed:8.0f} req/s')
+
+    def run(self, backend, settings_dict, options):
+        """make the requests from all threads, return their latencies"""
+        latencies = []
+
+        def requests():
+            # each thread has its own connection, like a worker thread
+            connection = backend.DatabaseWrapper(settings_dict, 'bench')
+            timings = []
+            for _ in range(options['requests']):
+                start = time.perf_counter()
+                with connection.cursor() as cursor:
+                    cursor.execute(options['query'])
+                    cursor.fetchall()
+                # what the end of a request does with CONN_MAX_AGE = 0
+                connection.close()
+                timings.append(time.perf_counter() - start)
+            latencies.extend(timings)
+
+        threads = [threading.Thread(target=requests)
+                   for _ in range(options['threads'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, time.perf_counter() - start
+
+    @staticmethod
+    def percentile(latencies, pct):
+        """return a percentile of sorted latencies in milliseconds"""
+        index = min(len(latencies) - 1, len(latencies) * pct // 100)
+        return latencies[index] * 1000
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import ChangeLog
+
+
+class Command(BaseCommand):
+    """django command to delete change log entries sync no longer needs"""
+
+    help = 'delete change log entries older than SYNC_RETENTION_DAYS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        """handle the command"""
+        # sync tokens expire after the retention period, entries written
+        # shortly before a token was issued can still be after it
+        cutoff = timezone.now() - \
+            timedelta(days=settings.SYNC_RETENTION_DAYS,
+                      seconds=settings.SYNC_SETTLE_SECONDS)
+        expired = ChangeLog.objects.filter(created_at__lt=cutoff) \
+            .order_by('id').values_list('id', flat=True)
+        pruned = 0
+        while True:
+            batch = list(expired[:options['batch_size']])
+            if not batch:
+                break
+            # one short DELETE per batch instead of one long one
+            count, _ = ChangeLog.objects.filter(
+                id__gte=batch[0], id__lte=batch[-1],
+                created_at__lt=cutoff).delete()
+            pruned += count
+
+        self.stdout.write(f'pruned {pruned} change log entries')
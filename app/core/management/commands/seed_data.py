@@ -0,0 +1,155 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+
+from core.models import Tags, Ingredients, Recipes
+from core.search import update_search_vectors
+
+
+SEED_DOMAIN = 'seed.localhost'
+
+# recipe titles end with one of these, for search
+WORDS = ('soup', 'salad', 'curry', 'stew', 'pie', 'pasta', 'risotto',
+         'tacos', 'bread', 'cake', 'noodles', 'roast', 'chili', 'dal')
+
+
+def seeded_users(prefix):
+    """return the users created by seed_data with a prefix"""
+    return get_user_model().objects \
+        .filter(email__startswith=f'{prefix}-', email__endswith=SEED_DOMAIN) \
+        .order_by('id')
+
+
+class Command(BaseCommand):
+    """django command to fill the database with synthetic data"""
+
+    help = 'create users with tags, ingredients and recipes for load ' \
+        'tests, with bulk inserts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--tags', type=int, default=50,
+                            help='tags of each user')
+        parser.add_argument('--ingredients', type=int, default=100,
+                            help='ingredients of each user')
+        parser.add_argument('--recipes', type=int, default=1000,
+                            help='recipes of each user')
+        parser.add_argument('--tags-per-recipe', type=int, default=3)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=6)
+        parser.add_argument('--prefix', default='seed',
+                            help='users are named <prefix>-<n>@'
+                            f'{SEED_DOMAIN}')
+        parser.add_argument('--password', default='seedpass')
+        parser.add_argument('--seed', type=int, default=0,
+                            help='seed of the random choices')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--clear', action='store_true',
+                            help='delete users seeded with the prefix first')
+
+    def handle(self, *args, **options):
+        """handle the command"""
+        start = time.perf_counter()
+        with transaction.atomic():
+            if options['clear']:
+                self.clear(options['prefix'])
+            counts = self.seed(options)
+        self.stdout.write(self.style.SUCCESS(
+            'created ' + ', '.join(f'{count} {name}'
+                                   for name, count in counts.items())
+            + f' in {time.perf_counter() - start:.1f} seconds'))
+
+    def clear(self, prefix):
+        """delete the seeded users and everything they own"""
+        users = seeded_users(prefix)
+        # without links, deleting a tag or ingredient does not have to
+        # update its recipes
+        deleted = sum(
+            through.objects.filter(recipes__user__in=users).delete()[0]
+            for through in (Recipes.tags.through,
+                            Recipes.ingredients.through))
+        deleted += users.delete()[0]
+        self.stdout.write(f'deleted {deleted} seeded rows')
+
+    def seed(self, options):
+        """create the users and their data, return the counts"""
+        rng = random.Random(options['seed'])
+        batch_size = options['batch_size']
+        prefix = options['prefix']
+        first = seeded_users(prefix).count()
+        # hashing is slow on purpose, every user shares one hash
+        password = make_password(options['password'])
+        self.bulk_create(get_user_model(), [
+            get_user_model()(email=f'{prefix}-{n}@{SEED_DOMAIN}',
+                             name=f'seed user {n}', password=password)
+            for n in range(first, first + options['users'])], batch_size)
+        users = list(seeded_users(prefix)[first:])
+
+        names = {}
+        for model, count in ((Tags, options['tags']),
+                             (Ingredients, options['ingredients'])):
+            label = model._meta.verbose_name
+            self.bulk_create(model, [
+                model(user=user, name=f'{label} {n}')
+                for user in users for n in range(count)], batch_size)
+            names[model] = self.ids_by_user(model, users)
+
+        self.bulk_create(Recipes, [
+            Recipes(user=user, title=f'recipe {n} {rng.choice(WORDS)}',
+                    time_minutes=rng.randint(5, 180),
+                    price=f'{rng.randint(100, 5000) / 100:.2f}',
+                    link=f'https://example.com/recipes/{n}')
+            for user in users for n in range(options['recipes'])],
+            batch_size)
+        recipes = self.ids_by_user(Recipes, users)
+
+        links = 0
+        for field, model, per_recipe in (
+                ('tags', Tags, options['tags_per_recipe']),
+                ('ingredients', Ingredients,
+                 options['ingredients_per_recipe'])):
+            through = getattr(Recipes, field).through
+            column = f'{model._meta.model_name}_id'
+            rows = [
+                through(recipes_id=recipe_id, **{column: related_id})
+                for user in users
+                for recipe_id in recipes[user.pk]
+                for related_id in rng.sample(
+                    names[model][user.pk],
+                    min(per_recipe, len(names[model][user.pk])))
+            ]
+            self.bulk_create(through, rows, batch_size)
+            links += len(rows)
+
+        # bulk inserts skip the signals that index recipes for search
+        recipe_ids = [pk for ids in recipes.values() for pk in ids]
+        for start in range(0, len(recipe_ids), batch_size):
+            update_search_vectors(
+                Recipes, recipe_ids[start:start + batch_size])
+
+        return {
+            'users': len(users),
+            'tags': sum(map(len, names[Tags].values())),
+            'ingredients': sum(map(len, names[Ingredients].values())),
+            'recipes': len(recipe_ids),
+            'links': links,
+        }
+
+    @staticmethod
+    def bulk_create(model, objs, batch_size):
+        """insert objects in batches the database accepts"""
+        ops = connections[model.objects.db].ops
+        limit = ops.bulk_batch_size(model._meta.concrete_fields, objs)
+        model.objects.bulk_create(objs, batch_size=min(batch_size, limit))
+
+    @staticmethod
+    def ids_by_user(model, users):
+        """return the ids of the users' objects, by user id"""
+        ids = {user.pk: [] for user in users}
+        for user_id, pk in model.objects.filter(user__in=users) \
+                .order_by('id').values_list('user_id', 'id'):
+            ids[user_id].append(pk)
+        return ids
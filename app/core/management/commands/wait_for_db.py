@@ -1,22 +1,49 @@
+import random
 import time
 
-from django.db import connections
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.db.utils import OperationalError
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+
+from core.health import check_database
 
 
 class Command(BaseCommand):
     """django command to pause execution until db is available"""
 
-    def handle(self, *args, **kwargs):
-        """handle the command"""
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--timeout', type=float, default=60,
+                            help='seconds to wait before giving up')
+        parser.add_argument('--initial-delay', type=float, default=0.05)
+        parser.add_argument('--max-delay', type=float, default=2)
+
+    def handle(self, *args, **options):
+        """handle the command
+
+        retries a query with exponential backoff and full jitter, so a
+        database that comes up is noticed quickly, without many
+        containers retrying in lockstep.
+        """
         self.stdout.write('waiting for database...')
-        db_conn = None
-        while not db_conn:
+        deadline = time.monotonic() + options['timeout']
+        delay = options['initial_delay']
+        while True:
             try:
-                db_conn = connections['default']
+                latency = check_database(options['database'])
+                break
             except OperationalError:
-                self.stdout.write('database unavailable, waiting one second')
-                time.sleep(1)
+                connections[options['database']].close()
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise CommandError(
+                        f'database unavailable after {options["timeout"]} '
+                        f'seconds')
+                pause = min(random.uniform(0, delay), remaining)
+                self.stdout.write(
+                    f'database unavailable, retrying in {pause:.2f} seconds')
+                time.sleep(pause)
+                delay = min(delay * 2, options['max_delay'])
 
-        self.stdout.write(self.style.SUCCESS('database available!'))
+        self.stdout.write(self.style.SUCCESS(
+            f'database available! ({latency * 1000:.1f} ms)'))
@@ -0,0 +1,278 @@
+import ipaddress
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+
+METRICS_PATH = '/metrics'
+
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = tuple(256 * 4 ** exponent for exponent in range(8))
+
+# name: (description, buckets)
+HISTOGRAMS = OrderedDict([
+    ('http_request_duration_seconds',
+     ('wall time of requests', TIME_BUCKETS)),
+    ('http_request_db_queries',
+     ('database queries made by requests', COUNT_BUCKETS)),
+    ('http_request_db_duration_seconds',
+     ('time requests spent in database queries', TIME_BUCKETS)),
+    ('http_request_serialize_duration_seconds',
+     ('time requests spent serializing and rendering the response',
+      TIME_BUCKETS)),
+    ('http_response_size_bytes',
+     ('size of response bodies', SIZE_BUCKETS)),
+])
+
+LABELS = ('view', 'action')
+
+# timings of the request the current thread is serving
+_state = threading.local()
+
+
+class Histogram:
+    """count observations into buckets, like a prometheus histogram"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        """count a value into the first bucket it does not exceed"""
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def cumulative(self):
+        """return (upper bound, observations up to it) for each bucket"""
+        total = 0
+        for bound, count in zip((*self.buckets, '+Inf'), self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    """the histograms of this process, one per metric and label values
+
+    every process keeps its own, prometheus scrapes each of them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}
+
+    def observe(self, labels, values):
+        """record the values of one request"""
+        with self._lock:
+            for name, value in values.items():
+                histogram = self._histograms.get((name, labels))
+                if histogram is None:
+                    histogram = self._histograms[name, labels] = \
+                        Histogram(HISTOGRAMS[name][1])
+                histogram.observe(value)
+
+    def clear(self):
+        """forget every observation"""
+        with self._lock:
+            self._histograms.clear()
+
+    def render(self):
+        """return the histograms in the prometheus text format"""
+        lines = []
+        with self._lock:
+            for name, (description, _buckets) in HISTOGRAMS.items():
+                lines += [f'# HELP {name} {description}',
+                          f'# TYPE {name} histogram']
+                for (metric, labels), histogram in sorted(
+                        self._histograms.items()):
+                    if metric != name:
+                        continue
+                    label_text = ','.join(
+                        f'{key}="{_escape(value)}"'
+                        for key, value in zip(LABELS, labels))
+                    for bound, count in histogram.cumulative():
+                        lines.append(f'{name}_bucket{{{label_text},'
+                                     f'le="{bound}"}} {count}')
+                    lines += [f'{name}_sum{{{label_text}}} {histogram.sum}',
+                              f'{name}_count{{{label_text}}} '
+                              f'{sum(histogram.counts)}']
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+
+def _escape(value):
+    """escape a label value for the prometheus text format"""
+    return value.replace('\\', r'\\').replace('"', r'\"') \
+        .replace('\n', r'\n')
+
+
+class RequestTimings:
+    """what the request the current thread is serving spent its time on"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0
+        self.serialize = 0
+        self.serializing = False
+
+    def query(self, execute, sql, params, many, context):
+        """time a query, installed with connection.execute_wrapper"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db += time.perf_counter() - start
+
+
+@contextmanager
+def serializing():
+    """add the time spent in the block to the serialize time
+
+    nested blocks are only counted once.
+    """
+    timings = getattr(_state, 'timings', None)
+    if timings is None or timings.serializing:
+        yield
+        return
+    timings.serializing = True
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.serialize += time.perf_counter() - start
+        timings.serializing = False
+
+
+class SerializeTimingMixin:
+    """count a view's serializers turning instances into data as serializing
+
+    only serializers the view gets from get_serializer are timed, the
+    classes themselves are left alone.
+    """
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        to_representation = serializer.to_representation
+
+        def timed_to_representation(instance):
+            with serializing():
+                return to_representation(instance)
+
+        serializer.to_representation = timed_to_representation
+        return serializer
+
+
+def view_labels(request):
+    """return the URL name and the DRF action that served a request"""
+    match = request.resolver_match
+    method = request.method.lower()
+    if match is None:
+        return 'unresolved', method
+    actions = getattr(match.func, 'actions', None) or {}
+    return match.view_name, actions.get(method, method)
+
+
+def scrape_allowed(request):
+    """return whether a request may read the metrics
+
+    it has to send METRICS_TOKEN as a bearer token or come from an
+    address in METRICS_ALLOWED_IPS. with neither set nobody may.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        scheme, _space, sent = request.META.get(
+            'HTTP_AUTHORIZATION', '').partition(' ')
+        if scheme.lower() == 'bearer' and constant_time_compare(sent, token):
+            return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False)
+               for network in settings.METRICS_ALLOWED_IPS)
+
+
+def metrics(request):
+    """serve the histograms of this process to prometheus"""
+    if not scrape_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(REGISTRY.render(),
+                        content_type='text/plain; version=0.0.4')
+
+
+class MetricsMiddleware:
+    """record how long each view takes and where the time goes
+
+    wall time, database queries and their time, serializer and renderer
+    time and response size are recorded per URL name and DRF action, and
+    served on /metrics to the scrapers scrape_allowed lets in. serializer
+    time is counted for views with SerializeTimingMixin. with
+    METRICS_SERVER_TIMING the timings are also sent in a Server-Timing
+    header. queries made while a streaming response is
+    consumed are not counted. when METRICS_ENABLED is off the middleware
+    removes itself.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.path_info == METRICS_PATH and request.method == 'GET':
+            return metrics(request)
+
+        timings = _state.timings = RequestTimings()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(
+                        connections[alias].execute_wrapper(timings.query))
+                response = self.get_response(request)
+        finally:
+            _state.timings = None
+        total = time.perf_counter() - start
+
+        values = {
+            'http_request_duration_seconds': total,
+            'http_request_db_queries': timings.queries,
+            'http_request_db_duration_seconds': timings.db,
+            'http_request_serialize_duration_seconds': timings.serialize,
+        }
+        if not response.streaming:
+            values['http_response_size_bytes'] = len(response.content)
+        REGISTRY.observe(view_labels(request), values)
+
+        if settings.METRICS_SERVER_TIMING:
+            response['Server-Timing'] = ', '.join((
+                f'total;dur={total * 1000:.2f}',
+                f'db;dur={timings.db * 1000:.2f};'
+                f'desc="{timings.queries} queries"',
+                f'serialize;dur={timings.serialize * 1000:.2f}',
+            ))
+        return response
+
+    def process_template_response(self, request, response):
+        """count rendering the response as serializing"""
+        timings = getattr(_state, 'timings', None)
+        if timings is not None and not timings.serializing:
+            start = time.perf_counter()
+
+            def rendered(response):
+                timings.serialize += time.perf_counter() - start
+
+            response.add_post_render_callback(rendered)
+        return response
@@ -0,0 +1,36 @@
+# Generated by Django 2.1.15 on 2026-10-17 05:53
+
+from django.db import migrations, models
+
+from core.operations import AddIndexConcurrently, RunIndexSQLConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # indexes are built concurrently on PostgreSQL, which cannot happen
+    # inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_recipes_image'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipes',
+            index=models.Index(fields=['user', '-id'], name='recipes_user_id_idx'),
+        ),
+        # the auto-created through tables only have a unique index
+        # leading with recipes_id, add the reverse direction so filtering
+        # recipes by tag or ingredient ids is an index-only scan
+        RunIndexSQLConcurrently(
+            ['CREATE INDEX recipes_tags_tag_recipe_idx '
+             'ON core_recipes_tags (tags_id, recipes_id)'],
+            ['DROP INDEX recipes_tags_tag_recipe_idx'],
+        ),
+        RunIndexSQLConcurrently(
+            ['CREATE INDEX recipes_ingr_ingr_recipe_idx '
+             'ON core_recipes_ingredients (ingredients_id, recipes_id)'],
+            ['DROP INDEX recipes_ingr_ingr_recipe_idx'],
+        ),
+    ]
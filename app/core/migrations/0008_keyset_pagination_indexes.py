@@ -0,0 +1,27 @@
+# Generated by Django 2.1.15 on 2026-10-17 05:55
+
+from django.db import migrations, models
+
+from core.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # indexes are built concurrently on PostgreSQL, which cannot happen
+    # inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0007_recipe_filter_indexes'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='ingredients',
+            index=models.Index(fields=['user', '-name', 'id'], name='ingredients_user_name_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='tags',
+            index=models.Index(fields=['user', '-name', 'id'], name='tags_user_name_idx'),
+        ),
+    ]
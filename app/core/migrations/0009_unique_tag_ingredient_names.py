@@ -0,0 +1,61 @@
+# Generated by Django 2.1.15 on 2026-10-17 06:00
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+from core.operations import AlterUniqueTogetherConcurrently
+
+
+def merge_duplicate_names(apps, schema_editor):
+    """keep the oldest of each user's same named tags and ingredients
+
+    recipes linked to a duplicate are relinked to the kept row so the
+    unique constraint can be added without losing any links.
+    """
+    Recipes = apps.get_model('core', 'Recipes')
+    for model_name, field in (('Tags', 'tags'),
+                              ('Ingredients', 'ingredients')):
+        model = apps.get_model('core', model_name)
+        through = getattr(Recipes, field).through
+        column = f'{field}_id'
+        duplicates = model.objects.values('user_id', 'name') \
+            .annotate(keep=Min('id'), rows=Count('id')).filter(rows__gt=1)
+        for duplicate in duplicates:
+            keep = duplicate['keep']
+            others = list(model.objects.filter(
+                user_id=duplicate['user_id'], name=duplicate['name'],
+            ).exclude(id=keep).values_list('id', flat=True))
+            linked = set(through.objects.filter(**{column: keep})
+                         .values_list('recipes_id', flat=True))
+            for link in through.objects.filter(**{f'{column}__in': others}):
+                if link.recipes_id in linked:
+                    link.delete()
+                else:
+                    setattr(link, column, keep)
+                    link.save()
+                    linked.add(link.recipes_id)
+            model.objects.filter(id__in=others).delete()
+
+
+class Migration(migrations.Migration):
+
+    # the unique indexes are built concurrently on PostgreSQL, which
+    # cannot happen inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0008_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_names,
+                             migrations.RunPython.noop, atomic=True),
+        AlterUniqueTogetherConcurrently(
+            name='ingredients',
+            unique_together={('user', 'name')},
+        ),
+        AlterUniqueTogetherConcurrently(
+            name='tags',
+            unique_together={('user', 'name')},
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.1.15 on 2026-10-17 06:02
+
+import core.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_unique_tag_ingredient_names'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeImageRendition',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('width', models.PositiveIntegerField()),
+                ('format', models.CharField(max_length=10)),
+                ('image', models.ImageField(upload_to=core.models.recipe_rendition_file_path)),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='core.Recipes')),
+            ],
+            options={
+                'ordering': ('width', 'format'),
+            },
+        ),
+    ]
@@ -0,0 +1,109 @@
+# Generated by Django 2.1.15 on 2026-10-17 06:08
+
+import re
+from collections import defaultdict
+
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+# the vectors as core.search built them when this migration was written,
+# copied so later changes to it do not change what the migration does
+BATCH_SIZE = 10000
+FALLBACK_BATCH_SIZE = 300
+LEXEME = re.compile(r'\w+')
+
+
+def _update_postgresql(schema_editor, ids):
+    schema_editor.execute(
+        "UPDATE core_recipes AS r SET search_vector = "
+        "setweight(to_tsvector(%(config)s::regconfig, r.title), 'A') || "
+        "setweight(to_tsvector(%(config)s::regconfig, coalesce(("
+        "SELECT string_agg(n.name, ' ') FROM core_recipes_tags AS l "
+        "JOIN core_tags AS n ON n.id = l.tags_id "
+        "WHERE l.recipes_id = r.id), '')), 'B') || "
+        "setweight(to_tsvector(%(config)s::regconfig, coalesce(("
+        "SELECT string_agg(n.name, ' ') FROM core_recipes_ingredients AS l "
+        "JOIN core_ingredients AS n ON n.id = l.ingredients_id "
+        "WHERE l.recipes_id = r.id), '')), 'B') "
+        "WHERE r.id = ANY(%(ids)s)",
+        {'config': settings.RECIPES_SEARCH_CONFIG, 'ids': ids})
+
+
+def _to_vector(parts):
+    positions = defaultdict(list)
+    position = 0
+    for text, weight in parts:
+        for lexeme in LEXEME.findall(text.lower()):
+            position += 1
+            positions[lexeme].append(f'{position}{weight}')
+    return ' '.join(f"'{lexeme}':{','.join(found)}"
+                    for lexeme, found in sorted(positions.items()))
+
+
+def _update_fallback(Recipes, using, ids):
+    recipes = Recipes.objects.using(using)
+    names = defaultdict(list)
+    for name in ('tags', 'ingredients'):
+        through = getattr(Recipes, name).through
+        for recipe_id, value in through.objects.using(using) \
+                .filter(recipes_id__in=ids) \
+                .order_by('recipes_id', f'{name}__name') \
+                .values_list('recipes_id', f'{name}__name'):
+            names[recipe_id].append(value)
+    for recipe_id, title in recipes.filter(id__in=ids) \
+            .values_list('id', 'title'):
+        recipes.filter(id=recipe_id).update(search_vector=_to_vector(
+            [(title, 'A')] + [(value, 'B') for value in names[recipe_id]]))
+
+
+def build_search_vectors(apps, schema_editor):
+    """index the existing recipes, a batch at a time"""
+    Recipes = apps.get_model('core', 'Recipes')
+    using = schema_editor.connection.alias
+    postgresql = schema_editor.connection.vendor == 'postgresql'
+    ids = list(Recipes.objects.using(using).values_list('id', flat=True))
+    batch_size = BATCH_SIZE if postgresql else FALLBACK_BATCH_SIZE
+    for start in range(0, len(ids), batch_size):
+        batch = ids[start:start + batch_size]
+        if postgresql:
+            _update_postgresql(schema_editor, batch)
+        else:
+            _update_fallback(Recipes, using, batch)
+
+
+def create_gin_index(apps, schema_editor):
+    """the GIN index only exists on PostgreSQL, other databases search
+    with the python fallback"""
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX CONCURRENTLY recipes_search_vector_idx '
+            'ON core_recipes USING gin (search_vector)')
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            'DROP INDEX CONCURRENTLY recipes_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    # recipes are indexed a batch per transaction and the GIN index is
+    # built concurrently, so writes go on while this runs
+    atomic = False
+
+    dependencies = [
+        ('core', '0010_recipe_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipes',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(build_search_vectors, migrations.RunPython.noop),
+        migrations.RunPython(create_gin_index, drop_gin_index),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 2.1.15 on 2026-10-17 06:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+from core.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # indexes are built concurrently on PostgreSQL, which cannot happen
+    # inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0011_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredients',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='recipes',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='tags',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        AddIndexConcurrently(
+            model_name='ingredients',
+            index=models.Index(fields=['user', 'updated_at'], name='ingredients_user_updated_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='recipes',
+            index=models.Index(fields=['user', 'updated_at'], name='recipes_user_updated_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='tags',
+            index=models.Index(fields=['user', 'updated_at'], name='tags_user_updated_idx'),
+        ),
+    ]
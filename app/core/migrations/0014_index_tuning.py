@@ -0,0 +1,49 @@
+# Generated by Django 2.1.15 on 2026-10-17 06:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+from core.operations import AddIndexConcurrently, \
+    RemoveFieldIndexConcurrently
+
+
+class Migration(migrations.Migration):
+
+    # indexes are built and dropped concurrently on PostgreSQL, which
+    # cannot happen inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('core', '0013_changelog'),
+    ]
+
+    operations = [
+        # renditions are read by recipe in (width, format) order
+        AddIndexConcurrently(
+            model_name='recipeimagerendition',
+            index=models.Index(fields=['recipe', 'width', 'format'], name='renditions_recipe_width_idx'),
+        ),
+        # the user and recipe foreign key indexes are prefixes of the
+        # composite indexes, and only slow down writes
+        RemoveFieldIndexConcurrently(
+            model_name='recipeimagerendition',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='renditions', to='core.Recipes'),
+        ),
+        RemoveFieldIndexConcurrently(
+            model_name='ingredients',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        RemoveFieldIndexConcurrently(
+            model_name='recipes',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        RemoveFieldIndexConcurrently(
+            model_name='tags',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,9 +1,22 @@
+import threading
 import uuid
 import os
-from django.db import models
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.contrib.postgres.search import SearchVectorField
+from django.db import DEFAULT_DB_ALIAS, models, transaction, connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_save, post_delete, \
+    pre_delete, m2m_changed
+from django.dispatch import receiver
 from django.contrib.auth.models import AbstractBaseUser, \
     BaseUserManager, PermissionsMixin
 from django.conf import settings
+from django.utils import timezone
+
+from core import search
+from core.cache import bump_generation
 
 
 def recipe_image_file_path(instance, filename):
@@ -13,6 +26,13 @@ def recipe_image_file_path(instance, filename):
     return os.path.join('uploads/recipes/', filename)
 
 
+def recipe_rendition_file_path(instance, filename):
+    """generate filepath of a resized recipe image"""
+    ext = filename.split('.')[-1]
+    filename = f'{uuid.uuid4()}-{instance.width}.{ext}'
+    return os.path.join('uploads/recipes/renditions/', filename)
+
+
 class UserManager(BaseUserManager):
 
     def create_user(self, email, password=None, **kwargs):
@@ -48,11 +68,67 @@ class User(AbstractBaseUser, PermissionsMixin):
     USERNAME_FIELD = 'email'
 
 
+class RecipeAttrManager(models.Manager):
+
+    # rows per INSERT, keeps SQLite below its bound parameter limit
+    upsert_batch_size = 400
+
+    def upsert_names(self, user, names):
+        """create the missing names for a user, return {name: id}
+
+        each batch is a single INSERT that skips names the user already
+        has via the (user, name) unique index, followed by one SELECT
+        for all the ids.
+        """
+        names = list(dict.fromkeys(names))
+        # names get ids above the user's last one, which tells the
+        # created ones apart for the change log
+        last_id = self.filter(user=user).aggregate(
+            last=models.Max('id'))['last'] or 0
+        conn = connections[self.db]
+        now = self.model._meta.get_field('updated_at') \
+            .get_db_prep_value(timezone.now(), conn)
+        table = conn.ops.quote_name(self.model._meta.db_table)
+        inserted = 0
+        with transaction.atomic(using=self.db), conn.cursor() as cursor:
+            for start in range(0, len(names), self.upsert_batch_size):
+                batch = names[start:start + self.upsert_batch_size]
+                cursor.execute(
+                    f'INSERT INTO {table} (user_id, name, updated_at) VALUES '
+                    + ', '.join(['(%s, %s, %s)'] * len(batch))
+                    + ' ON CONFLICT (user_id, name) DO NOTHING',
+                    [value for name in batch
+                     for value in (user.pk, name, now)])
+                inserted += max(cursor.rowcount, 0)
+            ids = dict(self.filter(user=user, name__in=names)
+                       .values_list('name', 'id'))
+            if inserted:
+                record_changes(
+                    user.pk, self.model,
+                    [pk for pk in ids.values() if pk > last_id],
+                    using=self.db)
+                invalidate_user_data(user.pk)
+        return ids
+
+
 class Tags(models.Model):
     """tag to be used in a recipe"""
     name = models.CharField(max_length=255)
+    # looked up through the indexes leading with user
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
-                             on_delete=models.CASCADE)
+                             on_delete=models.CASCADE, db_index=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeAttrManager()
+
+    class Meta:
+        unique_together = (('user', 'name'),)
+        indexes = [
+            models.Index(fields=['user', '-name', 'id'],
+                         name='tags_user_name_idx'),
+            models.Index(fields=['user', 'updated_at'],
+                         name='tags_user_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -61,8 +137,21 @@ class Tags(models.Model):
 class Ingredients(models.Model):
     """ingredients to be given to a recipe"""
     name = models.CharField(max_length=255)
+    # looked up through the indexes leading with user
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
-                             on_delete=models.CASCADE)
+                             on_delete=models.CASCADE, db_index=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = RecipeAttrManager()
+
+    class Meta:
+        unique_together = (('user', 'name'),)
+        indexes = [
+            models.Index(fields=['user', '-name', 'id'],
+                         name='ingredients_user_name_idx'),
+            models.Index(fields=['user', 'updated_at'],
+                         name='ingredients_user_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -70,8 +159,9 @@ class Ingredients(models.Model):
 
 class Recipes(models.Model):
     """recipe object"""
+    # looked up through the indexes leading with user
     user = models.ForeignKey(settings.AUTH_USER_MODEL,
-                             on_delete=models.CASCADE)
+                             on_delete=models.CASCADE, db_index=False)
     title = models.CharField(max_length=255)
     time_minutes = models.IntegerField()
     price = models.DecimalField(max_digits=5, decimal_places=2)
@@ -80,6 +170,230 @@ class Recipes(models.Model):
     tags = models.ManyToManyField('Tags')
     image = models.ImageField(
         null=True, upload_to=recipe_image_file_path)
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'], name='recipes_user_id_idx'),
+            models.Index(fields=['user', 'updated_at'],
+                         name='recipes_user_updated_idx'),
+        ]
 
     def __str__(self):
         return self.title
+
+
+class RecipeImageRendition(models.Model):
+    """resized, metadata free copy of a recipe image"""
+    recipe = models.ForeignKey('Recipes', on_delete=models.CASCADE,
+                               related_name='renditions', db_index=False)
+    width = models.PositiveIntegerField()
+    format = models.CharField(max_length=10)
+    image = models.ImageField(upload_to=recipe_rendition_file_path)
+
+    class Meta:
+        ordering = ('width', 'format')
+        indexes = [
+            models.Index(fields=['recipe', 'width', 'format'],
+                         name='renditions_recipe_width_idx'),
+        ]
+
+    def __str__(self):
+        return self.image.name
+
+
+class ChangeLog(models.Model):
+    """a change to one of a user's recipes, tags or ingredients
+
+    entries are only ever appended, the id is the watermark clients
+    sync from. `kind` is the model name of the changed object.
+    """
+    id = models.BigAutoField(primary_key=True)
+    # entries are appended while a user's data is deleted, so they are
+    # left for prune_changelog instead of cascading
+    user = models.ForeignKey(settings.AUTH_USER_MODEL,
+                             on_delete=models.DO_NOTHING,
+                             db_constraint=False, db_index=False,
+                             related_name='+')
+    kind = models.CharField(max_length=20)
+    object_id = models.PositiveIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'],
+                         name='changelog_user_id_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
+
+
+def invalidate_user_data(user_id):
+    """drop cached responses of a user after their data changed
+
+    bumps now for the current request and again once the write is
+    visible to other connections. bulk writes that skip model signals
+    have to call this themselves.
+    """
+    bump_generation(user_id)
+    transaction.on_commit(lambda: bump_generation(user_id))
+
+
+# recipes changed inside collect_recipe_changes() by (user id, alias)
+_collected = threading.local()
+
+
+@contextmanager
+def collect_recipe_changes():
+    """update the recipes changed in the block once, when it exits
+
+    saving a recipe and then setting its tags and ingredients would
+    otherwise log it and rebuild its search vector three times.
+    """
+    if getattr(_collected, 'changes', None) is not None:
+        yield
+        return
+    changes = _collected.changes = defaultdict(set)
+    try:
+        yield
+    finally:
+        _collected.changes = None
+    for (user_id, using), recipe_ids in changes.items():
+        linked_recipes_changed(user_id, recipe_ids, using)
+
+
+def _collect(user_id, recipe_ids, using):
+    """add to the recipes being collected, return whether collecting"""
+    changes = getattr(_collected, 'changes', None)
+    if changes is None:
+        return False
+    changes[user_id, using].update(recipe_ids)
+    return True
+
+
+def record_changes(user_id, model, ids, deleted=False,
+                   using=DEFAULT_DB_ALIAS):
+    """append changes of a user's objects to the change log
+
+    bulk writes that skip model signals have to call this themselves.
+    """
+    ChangeLog.objects.using(using).bulk_create(
+        ChangeLog(user_id=user_id, kind=model._meta.model_name,
+                  object_id=pk, deleted=deleted)
+        for pk in ids)
+
+
+@receiver(post_save, sender=Recipes)
+@receiver(post_save, sender=Tags)
+@receiver(post_save, sender=Ingredients)
+@receiver(post_delete, sender=Recipes)
+@receiver(post_delete, sender=Tags)
+@receiver(post_delete, sender=Ingredients)
+def record_change(sender, instance, using, **kwargs):
+    """log a saved or deleted recipe, tag or ingredient"""
+    if sender is Recipes and kwargs['signal'] is post_save and \
+            _collect(instance.user_id, [instance.pk], using):
+        return
+    record_changes(instance.user_id, sender, [instance.pk],
+                   deleted=kwargs['signal'] is post_delete, using=using)
+
+
+@receiver(post_save, sender=Recipes)
+@receiver(post_save, sender=Tags)
+@receiver(post_save, sender=Ingredients)
+@receiver(post_delete, sender=Recipes)
+@receiver(post_delete, sender=Tags)
+@receiver(post_delete, sender=Ingredients)
+def invalidate_user_responses(sender, instance, **kwargs):
+    """drop cached responses after a user's recipe data changes"""
+    invalidate_user_data(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipes.tags.through)
+@receiver(m2m_changed, sender=Recipes.ingredients.through)
+def invalidate_user_responses_m2m(sender, instance, action, **kwargs):
+    """drop cached responses after recipe tags or ingredients change"""
+    if action.startswith('post_'):
+        invalidate_user_data(instance.user_id)
+
+
+connection_created.connect(search.register_functions)
+
+
+@receiver(post_save, sender=Recipes)
+def update_recipe_search_vector(sender, instance, created, update_fields,
+                                using, **kwargs):
+    """index the title of a new or changed recipe"""
+    if (created or update_fields is None or 'title' in update_fields) \
+            and not _collect(instance.user_id, [instance.pk], using):
+        search.update_search_vectors(
+            Recipes, [instance.pk], using=using, linked=not created)
+
+
+@receiver(m2m_changed, sender=Recipes.tags.through)
+@receiver(m2m_changed, sender=Recipes.ingredients.through)
+def update_relinked_recipes(sender, instance, action, reverse, pk_set,
+                            using, **kwargs):
+    """update recipes whose tags or ingredients were added or removed"""
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'pre_clear':
+        instance._linked_recipe_ids = _linked_recipe_ids(instance)
+        return
+    elif action == 'post_clear':
+        recipe_ids = instance.__dict__.pop('_linked_recipe_ids', [])
+    else:
+        recipe_ids = pk_set or []
+    if action.startswith('post_'):
+        linked_recipes_changed(instance.user_id, recipe_ids, using)
+
+
+def _linked_recipe_ids(instance):
+    """return the ids of the recipes a tag or ingredient is linked to"""
+    return list(instance.recipes_set.values_list('id', flat=True))
+
+
+def linked_recipes_changed(user_id, recipe_ids, using=DEFAULT_DB_ALIAS):
+    """mark recipes as updated whose tags or ingredients changed
+
+    their updated_at is set, as that is what conditional requests are
+    validated against, they are logged for sync and their search
+    vectors are rebuilt.
+    """
+    recipe_ids = list(recipe_ids)
+    if recipe_ids and not _collect(user_id, recipe_ids, using):
+        Recipes.objects.using(using).filter(id__in=recipe_ids) \
+            .update(updated_at=timezone.now())
+        record_changes(user_id, Recipes, recipe_ids, using=using)
+        search.update_search_vectors(Recipes, recipe_ids, using=using)
+
+
+@receiver(post_save, sender=Tags)
+@receiver(post_save, sender=Ingredients)
+def update_renamed_recipes(sender, instance, created, update_fields,
+                           using, **kwargs):
+    """update the recipes of a renamed tag or ingredient"""
+    if created or (update_fields is not None and
+                   'name' not in update_fields):
+        return
+    linked_recipes_changed(
+        instance.user_id, _linked_recipe_ids(instance), using)
+
+
+@receiver(pre_delete, sender=Tags)
+@receiver(pre_delete, sender=Ingredients)
+def remember_linked_recipes(sender, instance, **kwargs):
+    """remember the recipes of a tag or ingredient before the links go"""
+    instance._linked_recipe_ids = _linked_recipe_ids(instance)
+
+
+@receiver(post_delete, sender=Tags)
+@receiver(post_delete, sender=Ingredients)
+def update_unlinked_recipes(sender, instance, using, **kwargs):
+    """update the recipes a deleted tag or ingredient was linked to"""
+    linked_recipes_changed(
+        instance.user_id, instance.__dict__.pop('_linked_recipe_ids', []),
+        using)
@@ -0,0 +1,142 @@
+from django.db import migrations
+
+
+def _create_index(schema_editor, model, fields, **kwargs):
+    """create an index, without blocking writes on PostgreSQL"""
+    sql = None
+    if schema_editor.connection.vendor == 'postgresql':
+        sql = schema_editor.sql_create_index.replace(
+            'CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1)
+    schema_editor.execute(schema_editor._create_index_sql(
+        model, fields, sql=sql, **kwargs))
+
+
+def _drop_index(schema_editor, name):
+    """drop an index, without blocking writes on PostgreSQL"""
+    sql = schema_editor.sql_delete_index
+    if schema_editor.connection.vendor == 'postgresql':
+        sql = 'DROP INDEX CONCURRENTLY IF EXISTS %(name)s'
+    schema_editor.execute(sql % {'name': schema_editor.quote_name(name)})
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """AddIndex that lets the table be written while the index builds
+
+    PostgreSQL cannot build indexes concurrently inside a transaction,
+    so migrations using these operations set `atomic = False`. other
+    databases build the index as usual.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            _create_index(
+                schema_editor, model,
+                [model._meta.get_field(name)
+                 for name, _order in self.index.fields_orders],
+                name=self.index.name,
+                col_suffixes=[order for _name, order
+                              in self.index.fields_orders])
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            _drop_index(schema_editor, self.index.name)
+
+    def describe(self):
+        return f'{super().describe()} concurrently'
+
+
+class RunIndexSQLConcurrently(migrations.RunSQL):
+    """RunSQL of CREATE INDEX and DROP INDEX statements, for indexes
+    Django does not manage, like the reverse ones of through tables
+
+    on PostgreSQL they run concurrently, so the migration has to set
+    `atomic = False`. the statements are given as lists of strings.
+    """
+
+    def _run_sql(self, schema_editor, sqls):
+        if schema_editor.connection.vendor == 'postgresql' and \
+                isinstance(sqls, (list, tuple)):
+            sqls = [sql.replace('CREATE INDEX', 'CREATE INDEX CONCURRENTLY', 1)
+                    .replace('DROP INDEX', 'DROP INDEX CONCURRENTLY', 1)
+                    for sql in sqls]
+        super()._run_sql(schema_editor, sqls)
+
+    def describe(self):
+        return 'Raw SQL index operation, run concurrently'
+
+
+class AlterUniqueTogetherConcurrently(migrations.AlterUniqueTogether):
+    """AlterUniqueTogether building the new unique indexes concurrently
+
+    on PostgreSQL each index is built concurrently, then turned into the
+    constraint Django would have added, which only takes a brief lock.
+    removed constraints are dropped as usual. the migration has to set
+    `atomic = False`.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(
+                app_label, schema_editor, from_state, to_state)
+        new_model = to_state.apps.get_model(app_label, self.name)
+        if not self.allow_migrate_model(schema_editor.connection.alias,
+                                        new_model):
+            return
+        old_model = from_state.apps.get_model(app_label, self.name)
+        olds = {tuple(fields) for fields in old_model._meta.unique_together}
+        news = {tuple(fields) for fields in new_model._meta.unique_together}
+        schema_editor.alter_unique_together(new_model, olds, olds & news)
+
+        quote = schema_editor.quote_name
+        table = new_model._meta.db_table
+        for fields in sorted(news - olds):
+            columns = [new_model._meta.get_field(field).column
+                       for field in fields]
+            name = quote(schema_editor._create_index_name(
+                table, columns, suffix='_uniq'))
+            schema_editor.execute(
+                f'CREATE UNIQUE INDEX CONCURRENTLY {name} ON {quote(table)} '
+                f'({", ".join(quote(column) for column in columns)})')
+            schema_editor.execute(
+                f'ALTER TABLE {quote(table)} ADD CONSTRAINT {name} '
+                f'UNIQUE USING INDEX {name}')
+
+    def describe(self):
+        return f'{super().describe()} concurrently'
+
+
+class RemoveFieldIndexConcurrently(migrations.AlterField):
+    """AlterField turning off db_index, dropping the index concurrently
+
+    for foreign keys whose lookups other indexes already cover, so
+    writes no longer pay for an index no query uses. `field` is the
+    field with db_index=False.
+    """
+
+    def _index_name(self, schema_editor, model):
+        """return the name Django gave the index of the field"""
+        field = model._meta.get_field(self.name)
+        return schema_editor._create_index_name(
+            model._meta.db_table, [field.column], suffix='')
+
+    def database_forwards(self, app_label, schema_editor, from_state,
+                          to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            _drop_index(schema_editor, self._index_name(schema_editor, model))
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            _create_index(schema_editor, model,
+                          [model._meta.get_field(self.name)])
+
+    def describe(self):
+        return f'Drop the index of {self.model_name}.{self.name} ' \
+            'concurrently'
@@ -0,0 +1,145 @@
+import logging
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.fields import Field
+from rest_framework.views import APIView
+
+
+logger = logging.getLogger(__name__)
+
+# transaction control repeats with every atomic block, not with rows
+_TRANSACTION = re.compile(
+    r'\s*(BEGIN|COMMIT|ROLLBACK|SAVEPOINT|RELEASE SAVEPOINT)\b', re.I)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_PLACEHOLDERS = re.compile(r'\((?:\s*(?:%s|\?)\s*,)+\s*(?:%s|\?)\s*\)')
+_SPACE = re.compile(r'\s+')
+
+# frames of these files are never where a query came from
+_SKIPPED = tuple(os.path.join(settings.BASE_DIR, path) for path in (
+    os.path.join('core', 'db', ''), os.path.join('core', 'querywatch.py'),
+    os.path.join('core', 'metrics.py')))
+
+
+def normalize(sql):
+    """return the template of a statement, None for transaction control
+
+    literals become ? and lists of placeholders (...), so statements
+    that only differ in their values share a template.
+    """
+    if _TRANSACTION.match(sql):
+        return None
+    sql = _LITERAL.sub('?', sql)
+    sql = _PLACEHOLDERS.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def query_origin():
+    """describe the view method, serializer field and app code running
+
+    walks the stack of the thread making the query, only call it for
+    the queries that are reported.
+    """
+    view = field = location = None
+    frame = sys._getframe(1)
+    while frame is not None and None in (view, field, location):
+        code = frame.f_code
+        if location is None and \
+                code.co_filename.startswith(settings.BASE_DIR) and \
+                not code.co_filename.startswith(_SKIPPED):
+            path = os.path.relpath(code.co_filename, settings.BASE_DIR)
+            location = f'{path}:{frame.f_lineno} in {code.co_name}'
+        if field is None and code.co_name == 'to_representation' and \
+                isinstance(frame.f_locals.get('field'), Field):
+            current = frame.f_locals['field']
+            field = f'{type(current.parent).__name__}.{current.field_name}'
+        if view is None and isinstance(frame.f_locals.get('self'), APIView):
+            view = f'{type(frame.f_locals["self"]).__name__}.{code.co_name}'
+        frame = frame.f_back
+    return ', '.join(part for part in (view, field, location) if part) \
+        or 'unknown'
+
+
+class QueryRecorder:
+    """count the statements of each template and keep the slow ones
+
+    installed with connection.execute_wrapper. where a query came from
+    is only looked up for slow queries and for the query that takes a
+    template to the repeat threshold.
+    """
+
+    def __init__(self, repeat_threshold, slow_seconds):
+        self.repeat_threshold = repeat_threshold
+        self.slow_seconds = slow_seconds
+        self.counts = Counter()
+        self.origins = {}
+        self.slow = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            template = normalize(sql)
+            if template is not None:
+                self.counts[template] += 1
+                if self.counts[template] == self.repeat_threshold:
+                    self.origins[template] = query_origin()
+            if duration >= self.slow_seconds:
+                self.slow.append((sql, duration, query_origin()))
+
+    def repeated(self):
+        """return (template, count, origin) of the repeated templates"""
+        return [(template, count, self.origins[template])
+                for template, count in self.counts.items()
+                if count >= self.repeat_threshold]
+
+
+@contextmanager
+def watch_queries(repeat_threshold=None, slow_ms=None):
+    """record the queries made on every connection in the block"""
+    recorder = QueryRecorder(
+        repeat_threshold or settings.QUERY_WATCH_REPEAT_THRESHOLD,
+        (slow_ms or settings.QUERY_WATCH_SLOW_MS) / 1000)
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(recorder))
+        yield recorder
+
+
+class QueryWatchMiddleware:
+    """log slow statements and N+1 queries of sampled requests
+
+    QUERY_WATCH_SAMPLE_RATE of the requests are watched, when it is 0
+    the middleware removes itself.
+    """
+
+    def __init__(self, get_response):
+        if not settings.QUERY_WATCH_SAMPLE_RATE:
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if random.random() >= settings.QUERY_WATCH_SAMPLE_RATE:
+            return self.get_response(request)
+
+        with watch_queries() as recorder:
+            response = self.get_response(request)
+        for template, count, origin in recorder.repeated():
+            logger.warning('%s %s repeated a query %d times from %s: %s',
+                           request.method, request.path, count, origin,
+                           template)
+        for sql, duration, origin in recorder.slow:
+            logger.warning('%s %s made a query taking %.1f ms from %s: %s',
+                           request.method, request.path, duration * 1000,
+                           origin, sql)
+        return response
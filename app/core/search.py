@@ -0,0 +1,178 @@
+import math
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Case, F, FloatField, Func, IntegerField, \
+    TextField, Value, When
+from django.db.models.functions import Cast
+
+
+# weight of a lexeme found in the title and in tag or ingredient names,
+# the fallback ranks with the same values as ts_rank's defaults
+TITLE_WEIGHT = 'A'
+NAME_WEIGHT = 'B'
+WEIGHTS = {'A': 1.0, 'B': 0.4, 'C': 0.2, 'D': 0.1}
+
+# rows per UPDATE of the fallback, keeps SQLite below its parameter limit
+BATCH_SIZE = 300
+
+RANK_FUNCTION = 'recipes_search_rank'
+
+# ranks are compared with the positions in keyset cursors, which round
+# trip through JSON as python floats. ts_rank returns a float4 that does
+# not compare equal to them, fixed point integers do
+RANK_SCALE = 10 ** 6
+
+_LEXEME = re.compile(r'\w+')
+
+
+def _relations(model):
+    """return (name, through model, column) for tags and ingredients"""
+    relations = []
+    for name in ('tags', 'ingredients'):
+        through = model._meta.get_field(name).remote_field.through
+        relations.append((name, through, through._meta.get_field(name)))
+    return relations
+
+
+def lexemes(text):
+    """split text into the lexemes the fallback index matches on
+
+    there is no stemming, unlike the PostgreSQL text search config.
+    """
+    return _LEXEME.findall(text.lower())
+
+
+def to_vector(parts):
+    """return a tsvector like string for (text, weight) pairs
+
+    e.g. `'pasta':1A 'tomato':2A,4B`, each lexeme with the positions
+    and weights it appears at.
+    """
+    positions = defaultdict(list)
+    position = 0
+    for text, weight in parts:
+        for lexeme in lexemes(text):
+            position += 1
+            positions[lexeme].append(f'{position}{weight}')
+    return ' '.join(f"'{lexeme}':{','.join(found)}"
+                    for lexeme, found in sorted(positions.items()))
+
+
+def rank(vector, query):
+    """rank a vector built by `to_vector` against a search query
+
+    every lexeme of the query has to be in the vector, as with
+    plainto_tsquery, otherwise the rank is 0.
+    """
+    terms = set(lexemes(query or ''))
+    if not vector or not terms:
+        return 0.0
+    weights = {}
+    for entry in vector.split(' '):
+        lexeme, positions = entry.rsplit(':', 1)
+        weights[lexeme.strip("'")] = sum(
+            WEIGHTS[position[-1]] for position in positions.split(','))
+    if not terms.issubset(weights):
+        return 0.0
+    # like ts_rank's normalization 1, longer documents rank lower
+    score = sum(weights[term] for term in terms)
+    return score / (1 + math.log(len(weights)))
+
+
+def register_functions(sender, connection, **kwargs):
+    """make the fallback rank callable from SQL on SQLite connections"""
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function(RANK_FUNCTION, 2, rank)
+
+
+def _update_postgresql(model, recipe_ids, using):
+    """rebuild the vectors with a single UPDATE"""
+    conn = connections[using]
+    quote = conn.ops.quote_name
+    names = []
+    for name, through, column in _relations(model):
+        related = column.related_model._meta
+        names.append(
+            f"setweight(to_tsvector(%(config)s::regconfig, coalesce(("
+            f"SELECT string_agg(n.name, ' ') "
+            f"FROM {quote(through._meta.db_table)} AS l "
+            f"JOIN {quote(related.db_table)} AS n "
+            f"ON n.id = l.{quote(column.column)} "
+            f"WHERE l.recipes_id = r.id), '')), '{NAME_WEIGHT}')")
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE {quote(model._meta.db_table)} AS r SET search_vector = "
+            f"setweight(to_tsvector(%(config)s::regconfig, r.title), "
+            f"'{TITLE_WEIGHT}') || " + ' || '.join(names) +
+            f" WHERE r.id = ANY(%(ids)s)",
+            {'config': settings.RECIPES_SEARCH_CONFIG,
+             'ids': list(recipe_ids)})
+
+
+def _update_fallback(model, recipe_ids, using, linked):
+    """rebuild the vectors in python, one UPDATE per batch"""
+    recipes = model._default_manager.using(using)
+    titles = dict(recipes.filter(id__in=recipe_ids)
+                  .values_list('id', 'title'))
+    names = defaultdict(list)
+    for name, through, _column in _relations(model) if linked else ():
+        links = through._default_manager.using(using) \
+            .filter(recipes_id__in=titles) \
+            .order_by('recipes_id', f'{name}__name') \
+            .values_list('recipes_id', f'{name}__name')
+        for recipe_id, value in links:
+            names[recipe_id].append(value)
+
+    ids = list(titles)
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = ids[start:start + BATCH_SIZE]
+        vectors = [
+            When(id=recipe_id, then=Value(to_vector(
+                [(titles[recipe_id], TITLE_WEIGHT)]
+                + [(value, NAME_WEIGHT) for value in names[recipe_id]]
+            ), output_field=TextField()))
+            for recipe_id in batch
+        ]
+        recipes.filter(id__in=batch).update(
+            search_vector=Case(*vectors, output_field=TextField()))
+
+
+def update_search_vectors(model, recipe_ids, using=DEFAULT_DB_ALIAS,
+                          linked=True):
+    """rebuild the search vectors of the given recipes
+
+    the vector holds the title and the names of the recipe's tags and
+    ingredients. on PostgreSQL it is a tsvector, elsewhere the text
+    written by `to_vector`. pass `linked=False` for recipes that have no
+    tags or ingredients yet to skip looking them up.
+    """
+    recipe_ids = set(recipe_ids)
+    if not recipe_ids:
+        return
+    if connections[using].vendor == 'postgresql':
+        _update_postgresql(model, recipe_ids, using)
+    else:
+        _update_fallback(model, recipe_ids, using, linked)
+
+
+def search_recipes(queryset, query):
+    """narrow a recipe queryset down to matches, annotated with a rank
+
+    the rank is available as `search_rank`, an integer in millionths,
+    higher is better.
+    """
+    postgresql = connections[queryset.db].vendor == 'postgresql'
+    if postgresql:
+        query = SearchQuery(query, config=settings.RECIPES_SEARCH_CONFIG)
+        queryset = queryset.filter(search_vector=query)
+        rank = SearchRank(F('search_vector'), query)
+    else:
+        rank = Func(F('search_vector'), Value(query), function=RANK_FUNCTION,
+                    output_field=FloatField())
+    queryset = queryset.annotate(
+        search_rank=Cast(rank * Value(RANK_SCALE), IntegerField()))
+    return queryset if postgresql else queryset.filter(search_rank__gt=0)
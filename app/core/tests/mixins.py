@@ -0,0 +1,65 @@
+import re
+from contextlib import ExitStack
+
+from django.core.signals import request_finished, request_started
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from core.querywatch import watch_queries
+
+
+class QueryCountMixin:
+    """pin the number of queries an API request makes"""
+
+    def assertRequestQueries(self, num, method, url, *args, **kwargs):
+        """make a request with self.client and check the query count"""
+        with CaptureQueriesContext(connection) as context:
+            resp = getattr(self.client, method)(url, *args, **kwargs)
+        executed = context.captured_queries
+        if len(executed) != num:
+            queries = '\n'.join(
+                f'{i}. {query["sql"]}' for i, query in enumerate(executed, 1))
+            self.fail(f'{method.upper()} {url} made {len(executed)} '
+                      f'queries, expected {num}:\n{queries}')
+        return resp
+
+
+class NPlusOneMixin:
+    """fail a request that runs one statement template too many times
+
+    watches every request the test client makes, so list endpoints
+    should be tested with at least `query_repeat_threshold` rows.
+    templates matching a pattern in `allowed_repeated_queries` are not
+    reported.
+    """
+
+    query_repeat_threshold = 3
+    allowed_repeated_queries = ()
+
+    def _pre_setup(self):
+        super()._pre_setup()
+        self._query_watch = ExitStack()
+        request_started.connect(self._watch_request)
+        request_finished.connect(self._check_request)
+
+    def _post_teardown(self):
+        request_started.disconnect(self._watch_request)
+        request_finished.disconnect(self._check_request)
+        self._query_watch.close()
+        super()._post_teardown()
+
+    def _watch_request(self, **kwargs):
+        self._recorder = self._query_watch.enter_context(
+            watch_queries(repeat_threshold=self.query_repeat_threshold))
+
+    def _check_request(self, **kwargs):
+        self._query_watch.close()
+        repeated = [
+            (template, count, origin)
+            for template, count, origin in self._recorder.repeated()
+            if not any(re.search(pattern, template)
+                       for pattern in self.allowed_repeated_queries)]
+        if repeated:
+            self.fail('N+1 queries:\n' + '\n'.join(
+                f'{count} times from {origin}: {template}'
+                for template, count, origin in repeated))
@@ -0,0 +1,38 @@
+from django.core import checks
+from django.test import SimpleTestCase, override_settings
+
+from core.checks import check_shared_caches
+
+
+LOCMEM = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+DATABASE = {'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'core_shared_cache'}
+
+
+class SharedCacheCheckTests(SimpleTestCase):
+    """test caches all processes rely on are refused per process"""
+
+    @override_settings(CACHES={'default': LOCMEM, 'shared': LOCMEM})
+    def test_per_process_cache_refused(self):
+        """test per process caches for shared state are errors"""
+        errors = check_shared_caches(None)
+
+        self.assertEqual({error.id for error in errors}, {'core.E001'})
+        self.assertEqual(
+            sorted(error.msg.split()[0] for error in errors),
+            ['AUTH_TOKEN_CACHE_ALIAS', 'AUTH_TOKEN_REVOCATION_CACHE_ALIAS',
+             'DB_REPLICA_CACHE_ALIAS', 'RESPONSE_CACHE_GENERATION_ALIAS'])
+
+    @override_settings(CACHES={'default': LOCMEM, 'shared': LOCMEM})
+    def test_per_process_cache_deploy_check(self):
+        """test runserver and the test suite may keep them to themselves"""
+        self.assertNotIn('core.E001', [
+            error.id for error in checks.run_checks(tags=['caches'])])
+        self.assertIn('core.E001', [
+            error.id for error in checks.run_checks(
+                tags=['caches'], include_deployment_checks=True)])
+
+    @override_settings(CACHES={'default': LOCMEM, 'shared': DATABASE})
+    def test_shared_cache_accepted(self):
+        """test a database cache passes"""
+        self.assertEqual(check_shared_caches(None), [])
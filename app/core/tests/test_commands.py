@@ -1,22 +1,111 @@
+import json
+import os
+import tempfile
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core.db.pool import PoolTimeout
+from core.models import ChangeLog, Recipes, Tags
 
 
 class CommandsTestCase(TestCase):
 
     def test_wait_for_db_ready(self):
         """test waiting for db when db is available"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.return_value = True
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 1)
+        with patch('core.management.commands.wait_for_db.check_database') \
+                as cd:
+            cd.return_value = 0.001
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(cd.call_count, 1)
 
     @patch('time.sleep', return_value=None)
     def test_wait_for_db(self, ts):
-        """test waiting for db"""
-        with patch('django.db.utils.ConnectionHandler.__getitem__') as gi:
-            gi.side_effect = [OperationalError] * 5 + [True]
-            call_command('wait_for_db')
-            self.assertEqual(gi.call_count, 6)
+        """test waiting for db backs off exponentially with jitter"""
+        with patch('core.management.commands.wait_for_db.check_database') \
+                as cd:
+            cd.side_effect = [OperationalError] * 5 + [0.001]
+            call_command('wait_for_db', initial_delay=0.1, max_delay=0.5,
+                         stdout=StringIO())
+            self.assertEqual(cd.call_count, 6)
+
+        pauses = [call[0][0] for call in ts.call_args_list]
+        for pause, delay in zip(pauses, [0.1, 0.2, 0.4, 0.5, 0.5]):
+            self.assertTrue(0 <= pause <= delay)
+
+    @patch('time.sleep', return_value=None)
+    def test_wait_for_db_pool_exhausted(self, ts):
+        """test waiting for db backs off while no connection is free"""
+        with patch('core.management.commands.wait_for_db.check_database') \
+                as cd:
+            cd.side_effect = [PoolTimeout('no connection'), 0.001]
+            call_command('wait_for_db', stdout=StringIO())
+            self.assertEqual(cd.call_count, 2)
+
+    @patch('time.sleep', return_value=None)
+    def test_wait_for_db_timeout(self, ts):
+        """test waiting for db gives up after the timeout"""
+        with patch('core.management.commands.wait_for_db.check_database') \
+                as cd:
+            cd.side_effect = OperationalError
+            with self.assertRaises(CommandError):
+                call_command('wait_for_db', timeout=0, stdout=StringIO())
+
+    def test_prune_changelog(self):
+        """test change log entries past the retention period are deleted"""
+        user = get_user_model().objects.create_user('test@asdf.com', 'asdf')
+        old, kept = (Tags.objects.create(user=user, name=name)
+                     for name in ('old', 'kept'))
+        ChangeLog.objects.filter(object_id=old.id).update(
+            created_at=timezone.now() - timedelta(days=365))
+
+        call_command('prune_changelog', batch_size=1, stdout=StringIO())
+
+        self.assertEqual(
+            list(ChangeLog.objects.values_list('object_id', flat=True)),
+            [kept.id])
+
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_explain_queries_no_full_scans(self):
+        """test no endpoint query scans a whole table"""
+        call_command('explain_queries', recipes=50, fail=True,
+                     stdout=StringIO())
+
+    def test_seed_data(self):
+        """test seeding users with linked tags, ingredients and recipes"""
+        call_command('seed_data', users=2, tags=3, ingredients=4, recipes=5,
+                     tags_per_recipe=2, stdout=StringIO())
+
+        users = get_user_model().objects.filter(
+            email__endswith='seed.localhost')
+        self.assertEqual(users.count(), 2)
+        self.assertEqual(Tags.objects.filter(user__in=users).count(), 6)
+        recipe = Recipes.objects.filter(user=users[0]).first()
+        self.assertEqual(recipe.tags.count(), 2)
+        self.assertEqual(recipe.ingredients.count(), 4)
+        self.assertTrue(recipe.search_vector)
+
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_bench_api(self):
+        """test every endpoint is measured and bench data is removed"""
+        call_command('seed_data', users=2, tags=2, ingredients=2, recipes=3,
+                     stdout=StringIO())
+        output = os.path.join(tempfile.mkdtemp(), 'bench.json')
+
+        call_command('bench_api', concurrency=1, requests=2, warmup=0,
+                     output=output, stdout=StringIO())
+
+        with open(output) as f:
+            report = json.load(f)
+        self.assertIn('user token', report['endpoints'])
+        for name, result in report['endpoints'].items():
+            self.assertEqual(result['errors'], {}, name)
+            self.assertIsNotNone(result['p99_ms'])
+        self.assertFalse(
+            Recipes.objects.filter(title__startswith='bench-api').exists())
@@ -0,0 +1,169 @@
+import threading
+import unittest
+
+from django.db import OperationalError, connection, transaction
+from django.test import SimpleTestCase, TransactionTestCase
+
+from core.db.pool import ConnectionPool, PoolTimeout
+
+if connection.settings_dict['ENGINE'] == 'core.db.pooled':
+    from psycopg2 import extensions
+
+    from core.db.pooled.base import close_pools
+
+
+class FakeConnection:
+    """stands in for a database connection"""
+
+    def __init__(self):
+        self.closed = 0
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTests(SimpleTestCase):
+
+    def setUp(self):
+        self.now = 0
+        self.opened = []
+        self.broken = set()
+
+    def connect(self):
+        conn = FakeConnection()
+        self.opened.append(conn)
+        return conn
+
+    def pool(self, **kwargs):
+        return ConnectionPool(
+            self.connect, lambda conn: conn not in self.broken,
+            clock=lambda: self.now, **kwargs)
+
+    def test_connections_reused(self):
+        """test returned connections are handed out again"""
+        pool = self.pool()
+        conn = pool.get()
+        pool.put(conn)
+
+        self.assertIs(pool.get(), conn)
+        self.assertEqual(len(self.opened), 1)
+
+    def test_max_size(self):
+        """test callers time out when every connection is in use"""
+        pool = self.pool(max_size=2, timeout=0)
+        pool.get()
+        pool.get()
+
+        with self.assertRaises(PoolTimeout):
+            pool.get()
+        self.assertEqual(pool.size, 2)
+
+    def test_timeout_is_database_error(self):
+        """test an exhausted pool raises a database error"""
+        pool = self.pool(max_size=1, timeout=0)
+        pool.get()
+
+        with self.assertRaises(OperationalError):
+            pool.get()
+
+    def test_waits_for_returned_connection(self):
+        """test callers get a connection handed back while they wait"""
+        pool = ConnectionPool(self.connect, lambda conn: True,
+                              max_size=1, timeout=5)
+        conn = pool.get()
+        timer = threading.Timer(0.05, pool.put, [conn])
+        timer.start()
+
+        self.assertIs(pool.get(), conn)
+        timer.join()
+
+    def test_idle_timeout(self):
+        """test connections idle for too long are closed"""
+        pool = self.pool(idle_timeout=60)
+        first, second = pool.get(), pool.get()
+        pool.put(first)
+        self.now = 30
+        pool.put(second)
+        self.now = 70
+
+        self.assertIs(pool.get(), second)
+        self.assertTrue(first.closed)
+        self.assertEqual(pool.size, 1)
+
+    def test_health_check(self):
+        """test broken idle connections are replaced"""
+        pool = self.pool(check_after=10)
+        conn = pool.get()
+        pool.put(conn)
+        self.broken.add(conn)
+        self.now = 5
+        self.assertIs(pool.get(), conn)
+        pool.put(conn)
+        self.now = 20
+
+        replacement = pool.get()
+
+        self.assertIsNot(replacement, conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.size, 1)
+
+    def test_discard(self):
+        """test discarded and closed connections free their slot"""
+        pool = self.pool(max_size=1, timeout=0)
+        conn = pool.get()
+        pool.put(conn, discard=True)
+        conn = pool.get()
+        conn.close()
+        pool.put(conn)
+
+        self.assertIsNot(pool.get(), conn)
+        self.assertEqual(len(self.opened), 3)
+
+
+@unittest.skipUnless(connection.settings_dict['ENGINE'] == 'core.db.pooled',
+                     'needs the pooled postgresql backend')
+class PooledBackendTests(TransactionTestCase):
+    """test the pooled backend against a real database"""
+
+    def raw_connection(self):
+        connection.ensure_connection()
+        return connection.connection
+
+    def test_close_hands_connection_back(self):
+        """test a closed connection is reused by the next query"""
+        raw = self.raw_connection()
+        connection.close()
+
+        self.assertFalse(raw.closed)
+        self.assertIs(self.raw_connection(), raw)
+
+    def test_close_rolls_back(self):
+        """test a connection is handed back with no transaction open"""
+        connection.set_autocommit(False)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        raw = connection.connection
+        connection.close()
+
+        self.assertEqual(raw.get_transaction_status(),
+                         extensions.TRANSACTION_STATUS_IDLE)
+
+    def test_close_in_atomic_block_not_pooled(self):
+        """test a connection closed inside a transaction is not shared"""
+        with transaction.atomic():
+            raw = self.raw_connection()
+            connection.close()
+
+            self.assertTrue(raw.closed)
+            self.assertIs(connection.connection, raw)
+        self.assertIsNot(self.raw_connection(), raw)
+
+    def test_close_pools(self):
+        """test the idle connections of an alias can be closed"""
+        raw = self.raw_connection()
+        connection.close()
+
+        close_pools(connection.alias)
+
+        self.assertTrue(raw.closed)
+        self.assertEqual(connection.pool.size, 0)
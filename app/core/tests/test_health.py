@@ -0,0 +1,92 @@
+from unittest.mock import patch
+
+from django.db.utils import OperationalError
+from django.test import TestCase
+
+from core import health
+from core.db.pool import PoolTimeout
+
+
+class HealthCheckTests(TestCase):
+
+    def setUp(self):
+        health._migrated = False
+
+    def test_liveness(self):
+        """test the liveness probe does not touch the database"""
+        with patch('core.health.check_database',
+                   side_effect=OperationalError('connection refused')) as cd, \
+                self.assertNumQueries(0):
+            resp = self.client.get('/healthz')
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), {'status': 'ok'})
+        cd.assert_not_called()
+
+    def test_probe_any_host(self):
+        """test probes answer hosts that are not allowed with the status"""
+        resp = self.client.get('/healthz', HTTP_HOST='10.1.2.3:8000')
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json(), {'status': 'ok'})
+
+    def test_other_paths_check_host(self):
+        """test only the probe paths skip the allowed hosts check"""
+        resp = self.client.get('/healthz/more', HTTP_HOST='10.1.2.3:8000')
+
+        self.assertEqual(resp.status_code, 400)
+
+    def test_readiness(self):
+        """test the readiness probe passes when migrated"""
+        resp = self.client.get('/readyz')
+
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()['pending_migrations'], [])
+
+    def test_readiness_pending_migrations(self):
+        """test the readiness probe fails until migrations are applied"""
+        with patch('django.db.migrations.executor.MigrationExecutor'
+                   '.migration_plan') as plan:
+            plan.return_value = [(type('Migration', (), {
+                'app_label': 'core', 'name': '9999_next'}), False)]
+            resp = self.client.get('/readyz')
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.json()['pending_migrations'],
+                         ['core.9999_next'])
+
+    def test_readiness_database_down(self):
+        """test the readiness probe fails while the database is down"""
+        error = OperationalError('could not connect to server "db.internal"'
+                                 ' as user "app"')
+        with patch('core.health.check_database', side_effect=error), \
+                self.assertLogs('core.health', 'WARNING') as logs:
+            resp = self.client.get('/readyz')
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.json()['status'], 'unavailable')
+        self.assertEqual(resp.json()['databases']['default'],
+                         {'error': 'not answering'})
+        self.assertNotIn('db.internal', resp.content.decode())
+        self.assertIn('db.internal', logs.output[0])
+
+    def test_readiness_pool_exhausted(self):
+        """test the readiness probe fails while no connection is free"""
+        with patch('core.health.check_database',
+                   side_effect=PoolTimeout('no connection became free')), \
+                self.assertLogs('core.health', 'WARNING'):
+            resp = self.client.get('/readyz')
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.json()['status'], 'unavailable')
+
+    def test_readiness_migrations_unreadable(self):
+        """test the readiness probe hides why migrations are unreadable"""
+        with patch('core.health.pending_migrations',
+                   side_effect=OperationalError('relation "secret" missing')),\
+                self.assertLogs('core.health', 'WARNING'):
+            resp = self.client.get('/readyz')
+
+        self.assertEqual(resp.status_code, 503)
+        self.assertEqual(resp.json()['pending_migrations'],
+                         {'error': 'not readable'})
@@ -0,0 +1,116 @@
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.metrics import REGISTRY, Histogram
+from core.models import Tags
+from users.serializers import UserSerializer
+
+
+TAGS_URL = reverse('recipes:tags-list')
+ME_URL = reverse('user:me')
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        REGISTRY.clear()
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'test123')
+        Tags.objects.create(user=self.user, name='vegan')
+
+    def get_tags(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return client.get(TAGS_URL)
+
+    def test_histogram_buckets(self):
+        """test observations are counted into cumulative buckets"""
+        histogram = Histogram((1, 5))
+        for value in (0, 1, 3, 9):
+            histogram.observe(value)
+
+        self.assertEqual(list(histogram.cumulative()),
+                         [(1, 2), (5, 3), ('+Inf', 4)])
+        self.assertEqual(histogram.sum, 13)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        """test nothing is recorded while metrics are disabled"""
+        resp = self.get_tags()
+
+        self.assertNotIn('Server-Timing', resp)
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_SERVER_TIMING=True)
+    def test_server_timing(self):
+        """test responses carry their timings"""
+        resp = self.get_tags()
+
+        self.assertRegex(
+            resp['Server-Timing'],
+            r'^total;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries", '
+            r'serialize;dur=[\d.]+$')
+
+    @override_settings(METRICS_ENABLED=True, METRICS_SERVER_TIMING=False,
+                       METRICS_TOKEN='scrape')
+    def test_metrics_endpoint(self):
+        """test the histograms are labelled with the view and action"""
+        resp = self.get_tags()
+        self.assertNotIn('Server-Timing', resp)
+
+        resp = self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer scrape')
+
+        self.assertEqual(resp.status_code, 200)
+        body = resp.content.decode()
+        self.assertIn('# TYPE http_request_db_queries histogram', body)
+        self.assertIn('http_request_duration_seconds_count'
+                      '{view="recipes:tags-list",action="list"} 1', body)
+        self.assertIn('http_response_size_bytes_bucket'
+                      '{view="recipes:tags-list",action="list",le="+Inf"} 1',
+                      body)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_TOKEN='scrape',
+                       METRICS_ALLOWED_IPS=[])
+    def test_metrics_endpoint_forbidden(self):
+        """test the metrics are refused without the token"""
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer other'}):
+            resp = self.client.get('/metrics', **headers)
+
+            self.assertEqual(resp.status_code, 403)
+            self.assertNotIn(b'http_request', resp.content)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_TOKEN='',
+                       METRICS_ALLOWED_IPS=['10.0.0.0/8'])
+    def test_metrics_endpoint_allowed_ips(self):
+        """test the metrics are served to the allowed networks only"""
+        allowed = self.client.get('/metrics', REMOTE_ADDR='10.1.2.3')
+        refused = self.client.get('/metrics', REMOTE_ADDR='192.168.1.2')
+
+        self.assertEqual(allowed.status_code, 200)
+        self.assertEqual(refused.status_code, 403)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_TOKEN='scrape')
+    def test_view_serializer_timed(self):
+        """test serializers a view gets are counted as serializing"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        to_representation = UserSerializer.to_representation
+
+        def slow_to_representation(serializer, instance):
+            time.sleep(0.05)
+            return to_representation(serializer, instance)
+
+        with patch.object(UserSerializer, 'to_representation',
+                          slow_to_representation):
+            client.get(ME_URL)
+
+        body = self.client.get(
+            '/metrics', HTTP_AUTHORIZATION='Bearer scrape').content.decode()
+        line, = [line for line in body.splitlines() if line.startswith(
+            'http_request_serialize_duration_seconds_sum{view="user:me"')]
+        self.assertGreaterEqual(float(line.split()[-1]), 0.05)
@@ -1,7 +1,7 @@
 from unittest.mock import patch
 from django.test import TestCase
 from django.contrib.auth import get_user_model
-from core import models
+from core import models, search
 
 
 def sample_user(email='test@londonappdev.com', password='testpass'):
@@ -70,3 +70,26 @@ class ModelTests(TestCase):
         file_path = models.recipe_image_file_path(None, 'myimage.jpg')
         exp_path = f'uploads/recipes/{uuid}.jpg'
         self.assertEqual(file_path, exp_path)
+
+    def test_recipe_search_vector(self):
+        """test the search vector holds the title, tag and ingredient names"""
+        user = sample_user()
+        recipe = models.Recipes.objects.create(
+            user=user, title='Lemon cake', time_minutes=5, price=10.00)
+        recipe.tags.add(models.Tags.objects.create(user=user, name='Sweet'))
+        recipe.ingredients.add(
+            models.Ingredients.objects.create(user=user, name='lemon'))
+
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.search_vector,
+                         "'cake':2A 'lemon':1A,4B 'sweet':3B")
+
+    def test_search_rank(self):
+        """test the fallback rank prefers title matches and needs every
+        word"""
+        vector = search.to_vector([('lemon cake', 'A'), ('sweet', 'B')])
+        self.assertGreater(search.rank(vector, 'cake'),
+                           search.rank(vector, 'sweet'))
+        self.assertGreater(search.rank(vector, 'sweet cake'), 0)
+        self.assertEqual(search.rank(vector, 'sour cake'), 0)
+        self.assertEqual(search.rank(vector, ''), 0)
@@ -0,0 +1,75 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Recipes, Tags
+from core.querywatch import normalize, watch_queries
+from recipes.serializers import RecipesSerializer
+from recipes.views import RecipesViewSet
+
+
+class QueryWatchTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'test123')
+        tag = Tags.objects.create(user=self.user, name='vegan')
+        for title in ('soup', 'salad', 'stew'):
+            Recipes.objects.create(user=self.user, title=title,
+                                   time_minutes=5, price=1).tags.add(tag)
+
+    def test_normalize(self):
+        """test statements differing in values share a template"""
+        self.assertEqual(
+            normalize("SELECT * FROM t WHERE a = 'x''y' AND b IN (%s, %s)"
+                      "  LIMIT 21"),
+            'SELECT * FROM t WHERE a = ? AND b IN (...) LIMIT ?')
+        self.assertEqual(normalize('SELECT * FROM t1 WHERE id IN (%s)'),
+                         'SELECT * FROM t1 WHERE id IN (%s)')
+        self.assertIsNone(normalize('SAVEPOINT "s1"'))
+
+    def test_repeated_query_origin(self):
+        """test an N+1 query is reported with the serializer field"""
+        with watch_queries(repeat_threshold=3) as recorder:
+            RecipesSerializer(Recipes.objects.all(), many=True).data
+
+        repeated = recorder.repeated()
+        self.assertEqual(len(repeated), 2)
+        origins = {origin for _template, count, origin in repeated}
+        self.assertIn('RecipesSerializer.tags', ' '.join(origins))
+
+    def test_prefetched_not_repeated(self):
+        """test prefetched relations are not reported"""
+        recipes = Recipes.objects.prefetch_related('tags', 'ingredients')
+        with watch_queries(repeat_threshold=3) as recorder:
+            RecipesSerializer(recipes, many=True).data
+
+        self.assertEqual(recorder.repeated(), [])
+
+    def test_slow_query(self):
+        """test statements slower than the limit are kept"""
+        with watch_queries(slow_ms=0.000001) as recorder:
+            Tags.objects.count()
+
+        sql, duration, origin = recorder.slow[0]
+        self.assertIn('COUNT', sql)
+        self.assertIn('core/tests/test_querywatch.py', origin)
+
+    @override_settings(QUERY_WATCH_SAMPLE_RATE=1, QUERY_WATCH_SLOW_MS=10000,
+                       QUERY_WATCH_REPEAT_THRESHOLD=3)
+    def test_middleware_logs_sampled_requests(self):
+        """test the middleware logs N+1 queries of sampled requests"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        # serialize recipes without prefetching their relations
+        with self.assertLogs('core.querywatch', 'WARNING') as logs, \
+                patch.object(RecipesViewSet, 'fast_list', False), \
+                patch.object(RecipesViewSet, 'sparse_queryset',
+                             lambda self, queryset: queryset):
+            client.get(reverse('recipes:recipes-list'))
+
+        self.assertIn('RecipesViewSet.list', logs.output[0])
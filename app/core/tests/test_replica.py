@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.cache.backends.db import DatabaseCache
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.db import replica
+from core.db.replica import REPLICA_DB_ALIAS
+from core.models import Recipes, Tags
+
+
+RECIPES_URL = reverse('recipes:recipes-list')
+TAGS_URL = reverse('recipes:tags-list')
+ME_URL = reverse('user:me')
+
+
+class ReplicaRoutingTests(TestCase):
+    """test reads are served from a replica, a second SQLite database"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.databases[REPLICA_DB_ALIAS] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.path.join(cls.replica_dir, 'replica.sqlite3'),
+        }
+        call_command('migrate', database=REPLICA_DB_ALIAS, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA_DB_ALIAS].close()
+        del connections.databases[REPLICA_DB_ALIAS]
+        delattr(connections._connections, REPLICA_DB_ALIAS)
+        shutil.rmtree(cls.replica_dir)
+
+    def setUp(self):
+        caches['shared'].clear()
+        self.user = get_user_model().objects.create_user(
+            'replica@asdf.com', 'asdfasdf', name='primary')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # the replica lags behind and only has the user
+        get_user_model().objects.using(REPLICA_DB_ALIAS).create(
+            id=self.user.id, email=self.user.email, name='replica')
+
+    def tearDown(self):
+        for model in (Recipes, Tags, get_user_model()):
+            model.objects.using(REPLICA_DB_ALIAS).all().delete()
+
+    def test_reads_from_replica(self):
+        """test list and detail reads come from the replica"""
+        Recipes.objects.create(
+            user=self.user, title='primary', time_minutes=5, price=1)
+        recipe = Recipes.objects.using(REPLICA_DB_ALIAS).create(
+            user_id=self.user.id, title='replica', time_minutes=5, price=1)
+
+        resp = self.client.get(RECIPES_URL)
+        self.assertEqual(
+            [item['title'] for item in resp.data['results']], ['replica'])
+        resp = self.client.get(
+            reverse('recipes:recipes-detail', args=[recipe.id]))
+        self.assertEqual(resp.data['title'], 'replica')
+        resp = self.client.get(RECIPES_URL, {'format': 'json-stream'})
+        self.assertIn(b'"replica"', b''.join(resp.streaming_content))
+
+    def test_read_your_writes(self):
+        """test a user reads from the primary for a while after writing"""
+        resp = self.client.post(TAGS_URL, {'name': 'vegan'})
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+
+        resp = self.client.get(TAGS_URL)
+        self.assertEqual(
+            [item['name'] for item in resp.data['results']], ['vegan'])
+        self.assertFalse(
+            Tags.objects.using(REPLICA_DB_ALIAS).exists())
+
+    @override_settings(DB_REPLICA_STICKY_SECONDS=-1)
+    def test_sticky_period_ends(self):
+        """test reads go back to the replica after the sticky period"""
+        Tags.objects.create(user=self.user, name='primary')
+        resp = self.client.patch(ME_URL, {'name': 'changed'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        resp = self.client.get(TAGS_URL)
+
+        self.assertEqual(resp.data['results'], [])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'changed')
+
+    def test_database_cache_read_from_primary(self):
+        """test the database cache holding the sticky markers never lags"""
+        cache_model = DatabaseCache('core_shared_cache', {}).cache_model_class
+        replica._state.replica = True
+        try:
+            self.assertIsNone(
+                replica.ReplicaRouter().db_for_read(cache_model))
+            self.assertEqual(
+                replica.ReplicaRouter().db_for_read(Tags), REPLICA_DB_ALIAS)
+        finally:
+            replica._state.replica = False
+
+    def test_other_users_not_sticky(self):
+        """test one user's write keeps only their reads on the primary"""
+        other = get_user_model().objects.create_user(
+            'other@asdf.com', 'asdfasdf')
+        client = APIClient()
+        client.force_authenticate(other)
+        client.post(TAGS_URL, {'name': 'vegan'})
+        Tags.objects.create(user=self.user, name='primary')
+
+        resp = self.client.get(TAGS_URL)
+
+        self.assertEqual(resp.data['results'], [])
@@ -0,0 +1,36 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.urls import get_resolver
+
+from core import warmup
+
+
+class WarmUpTests(TestCase):
+
+    def test_warm_up(self):
+        """test warming up populates the URL resolvers and connects"""
+        with patch('core.warmup.check_database') as check:
+            warmup.warm_up()
+
+        self.assertTrue(get_resolver()._populated)
+        check.assert_called_with('default')
+
+    def test_warm_up_without_connecting(self):
+        """test the master process warms up without connecting"""
+        with patch('core.warmup.check_database') as check:
+            warmup.warm_up(connect=False)
+
+        check.assert_not_called()
+
+    def test_gunicorn_hooks(self):
+        """test the gunicorn workers warm up before accepting requests"""
+        from app import gunicorn_conf
+
+        with patch('core.warmup.warm_up', return_value=0.1) as warm_up:
+            gunicorn_conf.post_worker_init(type('Worker', (), {
+                'pid': 1, 'log': type('Log', (), {
+                    'info': lambda *args: None})()})())
+
+        warm_up.assert_called_once_with()
+        self.assertGreaterEqual(gunicorn_conf.workers, 1)
@@ -0,0 +1,57 @@
+import importlib
+import importlib.util
+import time
+
+from django.apps import apps
+from django.db import connections
+from django.urls import URLResolver, get_resolver
+
+from core.health import check_database
+
+
+# modules of installed apps the first requests would import
+APP_MODULES = ('models', 'serializers', 'views', 'urls', 'admin')
+
+
+def import_modules():
+    """import the views, serializers and urls of every installed app"""
+    for app_config in apps.get_app_configs():
+        for name in APP_MODULES:
+            module = f'{app_config.name}.{name}'
+            if importlib.util.find_spec(module) is not None:
+                importlib.import_module(module)
+
+
+def prime_urls(resolver=None):
+    """compile every URL pattern and build the reverse lookups"""
+    resolver = resolver or get_resolver()
+    resolver.reverse_dict
+    for pattern in resolver.url_patterns:
+        pattern.pattern.regex
+        if isinstance(pattern, URLResolver):
+            prime_urls(pattern)
+
+
+def open_connections():
+    """connect to every database
+
+    with the pooled backend the connections are handed to the pool,
+    otherwise this only fails early when a database is unreachable.
+    """
+    for alias in connections:
+        check_database(alias)
+        connections[alias].close()
+
+
+def warm_up(connect=True):
+    """do the work of the first request before accepting any
+
+    processes that fork workers must not connect, their connections
+    would be shared with the workers. returns the seconds taken.
+    """
+    start = time.perf_counter()
+    import_modules()
+    prime_urls()
+    if connect:
+        open_connections()
+    return time.perf_counter() - start
@@ -0,0 +1,201 @@
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+
+from core.models import Tags, Ingredients, Recipes, \
+    collect_recipe_changes, invalidate_user_data, record_changes
+from core.search import update_search_vectors
+
+
+RELATIONS = (
+    ('tags', Tags, Recipes.tags.through, 'tags_id'),
+    ('ingredients', Ingredients, Recipes.ingredients.through,
+     'ingredients_id'),
+)
+
+
+class RecipeBulkSerializer(serializers.ModelSerializer):
+    """validate one recipe of a bulk request without touching the db
+
+    related ids are only checked for shape here, ownership is checked for
+    the whole batch at once by `_check_relations`.
+    """
+
+    id = serializers.IntegerField(required=False)
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(), required=False)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), required=False)
+
+    class Meta:
+        model = Recipes
+        fields = ('id', 'title', 'ingredients', 'tags',
+                  'time_minutes', 'price', 'link')
+
+
+def _validate(items, partial=False):
+    """validate each item, returning (index, data) pairs and errors"""
+    if not isinstance(items, list):
+        raise serializers.ValidationError(
+            {'non_field_errors': [_('expected a list of recipes')]})
+    child = RecipeBulkSerializer(partial=partial)
+    valid, errors = [], {}
+    for index, item in enumerate(items):
+        try:
+            valid.append((index, child.run_validation(item)))
+        except serializers.ValidationError as exc:
+            errors[index] = exc.detail
+    return valid, errors
+
+
+def _reject_duplicates(valid):
+    """refuse a batch that names a recipe more than once
+
+    the items would race for its fields and both add their links.
+    """
+    counts = Counter(data['id'] for _index, data in valid if 'id' in data)
+    duplicated = sorted(pk for pk, count in counts.items() if count > 1)
+    if duplicated:
+        raise serializers.ValidationError({'non_field_errors': [
+            _('recipes {ids} appear more than once').format(
+                ids=', '.join(map(str, duplicated)))]})
+
+
+def _check_relations(user, valid, errors):
+    """drop items linking tags or ingredients the user does not own
+
+    one query per relation covers the whole batch.
+    """
+    for name, model, _through, _column in RELATIONS:
+        wanted = {pk for _index, data in valid for pk in data.get(name, ())}
+        if not wanted:
+            continue
+        owned = set(model.objects.filter(user=user, id__in=wanted)
+                    .values_list('id', flat=True))
+        for index, data in valid:
+            unknown = set(data.get(name, ())) - owned
+            if unknown:
+                errors.setdefault(index, {})[name] = [
+                    _('invalid pk "{pk}" - object does not exist.')
+                    .format(pk=pk) for pk in sorted(unknown)]
+    return [(index, data) for index, data in valid if index not in errors]
+
+
+def _link(recipe_ids, valid):
+    """bulk insert the through rows of freshly created or replaced links"""
+    for name, _model, through, column in RELATIONS:
+        rows = [
+            through(recipes_id=recipe_id, **{column: pk})
+            for recipe_id, (_index, data) in zip(recipe_ids, valid)
+            if name in data
+            for pk in dict.fromkeys(data[name])
+        ]
+        through.objects.bulk_create(rows)
+
+
+def _results(valid, ids, errors):
+    """build the per item response for a batch"""
+    results = [{'index': index, 'id': pk}
+               for (index, _data), pk in zip(valid, ids)]
+    results += [{'index': index, 'errors': detail}
+                for index, detail in errors.items()]
+    return sorted(results, key=lambda result: result['index'])
+
+
+def bulk_create_recipes(user, items):
+    """create many recipes, each m2m relation with a single insert"""
+    valid, errors = _validate(items)
+    valid = _check_relations(user, valid, errors)
+    recipes = [
+        Recipes(user=user, **{key: value for key, value in data.items()
+                              if key not in ('id', 'tags', 'ingredients')})
+        for _index, data in valid
+    ]
+    with transaction.atomic():
+        if connection.features.can_return_ids_from_bulk_insert:
+            Recipes.objects.bulk_create(recipes)
+            record_changes(user.pk, Recipes,
+                           [recipe.id for recipe in recipes])
+        else:
+            # without RETURNING rows are saved one at a time, their
+            # changes are logged together
+            with collect_recipe_changes():
+                for recipe in recipes:
+                    recipe.save()
+        ids = [recipe.id for recipe in recipes]
+        _link(ids, valid)
+        if ids:
+            update_search_vectors(Recipes, ids)
+            invalidate_user_data(user.pk)
+    return _results(valid, ids, errors), errors
+
+
+def bulk_update_recipes(user, items, partial=False):
+    """update many recipes with one UPDATE per batch
+
+    tags and ingredients given for an item replace the existing ones.
+    """
+    valid, errors = _validate(items, partial=partial)
+    _reject_duplicates(valid)
+    for index, data in valid:
+        if 'id' not in data:
+            errors[index] = {'id': [_('this field is required.')]}
+    valid = _check_relations(
+        user, [(i, d) for i, d in valid if i not in errors], errors)
+
+    ids = [data['id'] for _index, data in valid]
+    owned = set(Recipes.objects.filter(user=user, id__in=ids)
+                .values_list('id', flat=True))
+    for index, data in valid:
+        if data['id'] not in owned:
+            errors[index] = {'id': [_('not found.')]}
+    valid = [(i, d) for i, d in valid if i not in errors]
+    ids = [data['id'] for _index, data in valid]
+
+    columns = {key for _index, data in valid for key in data} - \
+        {'id', 'tags', 'ingredients'}
+    with transaction.atomic():
+        updates = {}
+        for column in columns:
+            field = Recipes._meta.get_field(column)
+            cases = [
+                When(id=data['id'],
+                     then=Value(data[column], output_field=field))
+                for _index, data in valid if column in data
+            ]
+            updates[column] = Case(*cases, default=column, output_field=field)
+        if ids:
+            Recipes.objects.filter(id__in=ids).update(
+                updated_at=timezone.now(), **updates)
+            record_changes(user.pk, Recipes, ids)
+        for name, _model, through, _column in RELATIONS:
+            replaced = [data['id'] for _index, data in valid if name in data]
+            if replaced:
+                through.objects.filter(recipes_id__in=replaced).delete()
+        _link(ids, valid)
+        indexed = [data['id'] for _index, data in valid
+                   if {'title', 'tags', 'ingredients'} & set(data)]
+        update_search_vectors(Recipes, indexed)
+        if ids:
+            invalidate_user_data(user.pk)
+    return _results(valid, ids, errors), errors
+
+
+def bulk_delete_recipes(user, ids):
+    """delete many recipes of the user"""
+    # bool is an int, true would delete recipe 1
+    if not isinstance(ids, list) or not all(
+            isinstance(pk, int) and not isinstance(pk, bool) for pk in ids):
+        raise serializers.ValidationError(
+            {'non_field_errors': [_('expected a list of recipe ids')]})
+    owned = set(Recipes.objects.filter(user=user, id__in=ids)
+                .values_list('id', flat=True))
+    errors = {index: {'id': [_('not found.')]}
+              for index, pk in enumerate(ids) if pk not in owned}
+    Recipes.objects.filter(id__in=owned).delete()
+    valid = [(index, None) for index, pk in enumerate(ids) if pk in owned]
+    return _results(valid, [pk for pk in ids if pk in owned], errors), errors
@@ -0,0 +1,110 @@
+import hashlib
+import threading
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.cache import get_generation
+
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(event):
+    with _stats_lock:
+        _stats[event] += 1
+
+
+def stats():
+    """return the response cache hit and miss counters of this process"""
+    with _stats_lock:
+        return {'hits': _stats['hits'], 'misses': _stats['misses']}
+
+
+def reset_stats():
+    """zero the response cache counters"""
+    with _stats_lock:
+        _stats.clear()
+
+
+class CachedResponseMixin:
+    """read-through cache for list and retrieve responses
+
+    entries are keyed by user, the user's data generation, action, object
+    id, the normalized query string and the scheme and host the request
+    came in on, which the links in the data are built from. writes to a
+    user's recipes, tags or ingredients bump the generation (see
+    core.models), so stale entries are never read again and simply
+    expire. generations live in a cache every process shares, so a
+    write orphans the entries of all of them.
+
+    with ConditionalRequestMixin further down the bases the validators
+    are cached along with the data, so cached responses are validated
+    without a query as well.
+    """
+
+    cached_actions = ('list', 'retrieve')
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(
+            super().retrieve, request, *args, **kwargs)
+
+    def get_cache_key(self, request):
+        """return the cache key of the response for this request"""
+        params = sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists())
+        digest = hashlib.md5(repr(params).encode()).hexdigest()
+        generation = get_generation(request.user.pk)
+        origin = hashlib.md5(
+            f'{request.scheme}://{request.get_host()}'.encode()).hexdigest()
+        return ':'.join(str(part) for part in (
+            'recipes:response:v3', request.user.pk, generation,
+            self.basename, self.action, self.kwargs.get(self.lookup_field),
+            digest, origin,
+        ))
+
+    def get_validators(self):
+        """return the validators of a cached response if there is one"""
+        if self.action in self.cached_actions:
+            entry = self._cache_entry(self.request)
+            if entry is not None:
+                return entry['validators']
+        return super().get_validators()
+
+    def _cache_entry(self, request):
+        """return the key and entry of the request, looked up once"""
+        if not hasattr(self, '_cache_lookup'):
+            key = self.get_cache_key(request)
+            self._cache_lookup = (
+                key, caches[settings.RESPONSE_CACHE_ALIAS].get(key))
+        return self._cache_lookup[1]
+
+    def _cached_response(self, handler, request, *args, **kwargs):
+        """serve the response from the cache, or cache a fresh one"""
+        entry = self._cache_entry(request)
+        if entry is not None:
+            _count('hits')
+            resp = Response(entry['data'])
+            resp['X-Cache'] = 'hit'
+            return resp
+
+        _count('misses')
+        resp = handler(request, *args, **kwargs)
+        # streamed responses are never held in memory as a whole
+        if resp.status_code == status.HTTP_200_OK and \
+                isinstance(resp, Response):
+            caches[settings.RESPONSE_CACHE_ALIAS].set(
+                self._cache_lookup[0],
+                {'data': resp.data,
+                 'validators': getattr(self, 'validators', None)},
+                settings.RESPONSE_CACHE_TIMEOUT)
+        resp['X-Cache'] = 'miss'
+        return resp
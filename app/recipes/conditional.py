@@ -0,0 +1,103 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = _('the object was changed since it was last read')
+    default_code = 'precondition_failed'
+
+
+class NotModified(Exception):
+    """raised to answer a read with 304 before any work is done"""
+
+
+class ConditionalRequestMixin:
+    """ETag and Last-Modified validation for reads and writes
+
+    validators come from a single aggregate query over `updated_at`:
+    the latest change and the row count of the list or object. list and
+    detail reads send an ETag (and details a Last-Modified) and are
+    answered with 304 Not Modified when the client's copy is current,
+    before anything is serialized. PUT, PATCH and DELETE honour
+    If-Match and If-Unmodified-Since and are refused with 412 when the
+    object changed in the meantime.
+    """
+
+    conditional_read_actions = ('list', 'retrieve')
+    conditional_write_actions = ('update', 'partial_update', 'destroy')
+
+    def get_validators(self):
+        """return (etag, last modified) of the requested list or object
+
+        returns None for objects that do not exist.
+        """
+        lookup = self.kwargs.get(self.lookup_url_kwarg or self.lookup_field)
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        if lookup is not None:
+            queryset = queryset.filter(pk=lookup)
+        state = queryset.aggregate(latest=Max('updated_at'), count=Count('pk'))
+        if not state['count']:
+            return None
+
+        # representations differ by query string and format, but not by
+        # method, so a detail's ETag can be sent back with If-Match
+        params = sorted(
+            (key, sorted(values))
+            for key, values in self.request.query_params.lists())
+        digest = hashlib.md5(repr((
+            state['latest'].isoformat(), state['count'], lookup, params,
+            getattr(self.request.accepted_renderer, 'format', None),
+        )).encode()).hexdigest()
+        last_modified = int(state['latest'].timestamp()) \
+            if lookup is not None else None
+        return f'"{digest}"', last_modified
+
+    def initial(self, request, *args, **kwargs):
+        """evaluate the preconditions of the request"""
+        super().initial(request, *args, **kwargs)
+        self.validators = None
+        if self.action not in self.conditional_read_actions + \
+                self.conditional_write_actions:
+            return
+        self.validators = self.get_validators()
+        if self.validators is None:
+            return
+        etag, last_modified = self.validators
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified)
+        if response is None:
+            return
+        if response.status_code == status.HTTP_304_NOT_MODIFIED:
+            raise NotModified()
+        raise PreconditionFailed()
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return Response(status=status.HTTP_304_NOT_MODIFIED)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """send the validators of what the client now has"""
+        response = super().finalize_response(
+            request, response, *args, **kwargs)
+        validators = getattr(self, 'validators', None)
+        if response.status_code == status.HTTP_200_OK and \
+                self.action in self.conditional_write_actions:
+            validators = self.get_validators()
+        elif response.status_code not in (status.HTTP_200_OK,
+                                          status.HTTP_304_NOT_MODIFIED):
+            validators = None
+        if validators is not None:
+            etag, last_modified = validators
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -0,0 +1,83 @@
+from django.db.models import Count
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+
+from core.models import Recipes
+from core.search import search_recipes
+
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+
+
+def params_to_ints(param, value):
+    """convert a comma separated string of IDs to a set of integers"""
+    try:
+        return {int(str_id) for str_id in value.split(',') if str_id}
+    except ValueError:
+        raise ValidationError(
+            {param: _('must be a comma separated list of ids')})
+
+
+class RecipeFilter:
+    """filter recipes by their tags and ingredients
+
+    each relation is matched with a semi-join against its through table
+    (`id IN (SELECT recipes_id ...)`) so a recipe linked to several of
+    the requested ids is only returned once, without a DISTINCT over
+    every selected column. `match=any` (the default) keeps recipes with
+    at least one of the ids, `match=all` only those linked to every id.
+    when both tags and ingredients are given, both must match.
+
+    `search` keeps recipes whose title, tag and ingredient names contain
+    every word of the query, best matches first (see `ordering`).
+    """
+
+    search_ordering = ('-search_rank', '-id')
+    max_search_length = 255
+
+    relations = (
+        ('tags', Recipes.tags.through, 'tags_id'),
+        ('ingredients', Recipes.ingredients.through, 'ingredients_id'),
+    )
+
+    def __init__(self, query_params):
+        self.match = query_params.get('match', MATCH_ANY)
+        if self.match not in (MATCH_ANY, MATCH_ALL):
+            raise ValidationError(
+                {'match': _('must be one of "any" or "all"')})
+        self.ids = {}
+        for param, _through, _column in self.relations:
+            value = query_params.get(param)
+            if value:
+                self.ids[param] = params_to_ints(param, value)
+        self.search = query_params.get('search', '').strip()
+        if len(self.search) > self.max_search_length:
+            raise ValidationError({'search': _(
+                'ensure this field has no more than {max_length} characters'
+            ).format(max_length=self.max_search_length)})
+
+    @property
+    def ordering(self):
+        """return the ordering the results have to be in, or None"""
+        return self.search_ordering if self.search else None
+
+    def _matching_recipes(self, through, column, ids):
+        """return a subquery of the recipe ids linked to the given ids"""
+        links = through.objects.filter(**{f'{column}__in': ids})
+        if self.match == MATCH_ALL:
+            links = links.values('recipes_id') \
+                .annotate(matched=Count(column)) \
+                .filter(matched=len(ids))
+        return links.values('recipes_id')
+
+    def filter_queryset(self, queryset):
+        """return the queryset narrowed down to the requested recipes"""
+        for param, through, column in self.relations:
+            ids = self.ids.get(param)
+            if ids:
+                queryset = queryset.filter(
+                    id__in=self._matching_recipes(through, column, ids))
+        if self.search:
+            queryset = search_recipes(queryset, self.search)
+        return queryset
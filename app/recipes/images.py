@@ -0,0 +1,153 @@
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from core.models import Recipes, RecipeImageRendition, invalidate_user_data
+
+
+logger = logging.getLogger(__name__)
+
+
+def rendition_formats():
+    """return the (pillow format, extension) pairs to render"""
+    formats = [('JPEG', 'jpg')]
+    if features.check('webp'):
+        formats.insert(0, ('WEBP', 'webp'))
+    return formats
+
+
+def _render(image, width, image_format):
+    """return the encoded bytes of image scaled down to width
+
+    nothing is copied over from the original's info, so EXIF, XMP and
+    ICC metadata are dropped.
+    """
+    image = image.copy()
+    image.thumbnail((width, image.height), Image.LANCZOS)
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format,
+               quality=settings.RECIPE_IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def create_renditions(recipe_id):
+    """replace the renditions of a recipe with ones of its current image"""
+    recipe = Recipes.objects.filter(id=recipe_id).first()
+    if recipe is None or not recipe.image:
+        return
+    with recipe.image.open('rb') as original, Image.open(original) as image:
+        # keep the orientation the metadata asked for before dropping it
+        transpose = getattr(ImageOps, 'exif_transpose', None)
+        if transpose is not None:
+            image = transpose(image)
+        renditions = []
+        for width in settings.RECIPE_IMAGE_RENDITION_WIDTHS:
+            for image_format, ext in rendition_formats():
+                rendition = RecipeImageRendition(
+                    recipe=recipe, width=width, format=ext)
+                rendition.image.save(
+                    f'rendition.{ext}',
+                    ContentFile(_render(image, width, image_format)),
+                    save=False)
+                renditions.append(rendition)
+
+    with transaction.atomic():
+        stale = list(recipe.renditions.all())
+        RecipeImageRendition.objects.filter(
+            id__in=[rendition.id for rendition in stale]).delete()
+        RecipeImageRendition.objects.bulk_create(renditions)
+        Recipes.objects.filter(id=recipe.id).update(updated_at=timezone.now())
+        invalidate_user_data(recipe.user_id)
+    for rendition in stale:
+        rendition.image.delete(save=False)
+
+
+class ImagePipeline:
+    """resize uploaded recipe images on a pool of background threads
+
+    at most RECIPE_IMAGE_MAX_PENDING images are queued or in progress at
+    once, callers have to `reserve` a slot before accepting an upload and
+    get turned away while the pipeline is full. with
+    RECIPE_IMAGE_WORKERS set to 0 images are processed inline instead.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+
+    def _setup(self):
+        with self._lock:
+            if self._slots is None:
+                self._slots = threading.BoundedSemaphore(
+                    settings.RECIPE_IMAGE_MAX_PENDING)
+                self._executor = ThreadPoolExecutor(
+                    max_workers=max(settings.RECIPE_IMAGE_WORKERS, 1),
+                    thread_name_prefix='recipe-images')
+
+    def reserve(self):
+        """claim a slot for one image, return False if the pipeline is
+        full"""
+        if settings.RECIPE_IMAGE_WORKERS == 0:
+            return True
+        self._setup()
+        return self._slots.acquire(blocking=False)
+
+    def release(self):
+        """give back a reserved slot that will not be submitted"""
+        if settings.RECIPE_IMAGE_WORKERS != 0:
+            self._slots.release()
+
+    def submit(self, recipe_id):
+        """process the image of a recipe using a reserved slot
+
+        returns whether the slot went to a worker, which gives it back
+        when done. the work starts once the current transaction commits,
+        so the worker sees the new image. requests run in autocommit
+        mode, where that is straight away. inside a transaction the
+        caller keeps its slot and has to release it, the work then takes
+        a free slot after the commit, or is dropped if there is none,
+        and is dropped on rollback.
+        """
+        if settings.RECIPE_IMAGE_WORKERS == 0:
+            create_renditions(recipe_id)
+            return False
+        if not transaction.get_connection().in_atomic_block:
+            self._executor.submit(self._run, recipe_id)
+            return True
+        transaction.on_commit(lambda: self._submit_committed(recipe_id))
+        return False
+
+    def _submit_committed(self, recipe_id):
+        """queue work registered in a transaction, if a slot is free
+
+        workers never wait for a slot, they would hold up the jobs that
+        are to give them back.
+        """
+        if not self._slots.acquire(blocking=False):
+            logger.warning('image pipeline full, no renditions of recipe '
+                           '%s are made', recipe_id)
+            return
+        self._executor.submit(self._run, recipe_id)
+
+    def _run(self, recipe_id):
+        try:
+            create_renditions(recipe_id)
+        except Exception:
+            logger.exception('could not create renditions of recipe %s',
+                             recipe_id)
+        finally:
+            connections.close_all()
+            self._slots.release()
+
+
+pipeline = ImagePipeline()
@@ -0,0 +1,102 @@
+import cProfile
+import pstats
+import time
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Tags, Ingredients, Recipes
+from recipes.pagination import KeysetPagination
+from recipes.views import RecipesViewSet
+
+
+class Rollback(Exception):
+    """raised to discard the benchmark data once the run is over"""
+
+
+class Command(BaseCommand):
+    """django command to compare the serializer and values() list paths"""
+
+    help = 'measure rows per second of recipe lists with both list paths'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--profile', action='store_true',
+                            help='print the top functions of each path')
+
+    def handle(self, *args, **options):
+        """handle the command"""
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        """list one page holding every recipe with each path"""
+        count = options['recipes']
+        user = get_user_model().objects.create_user(
+            'bench-fast-list@localhost', None)
+        tags = [Tags.objects.create(user=user, name=f'tag {i}')
+                for i in range(5)]
+        ingredients = [
+            Ingredients.objects.create(user=user, name=f'ingredient {i}')
+            for i in range(5)
+        ]
+        Recipes.objects.bulk_create(
+            Recipes(user=user, title=f'recipe {i}', time_minutes=i % 90,
+                    price='5.50', link='https://example.com/recipe')
+            for i in range(count))
+        ids = list(Recipes.objects.filter(user=user)
+                   .values_list('id', flat=True))
+        Recipes.tags.through.objects.bulk_create(
+            Recipes.tags.through(recipes_id=pk, tags_id=tag.id)
+            for pk in ids for tag in tags[:2])
+        Recipes.ingredients.through.objects.bulk_create(
+            Recipes.ingredients.through(
+                recipes_id=pk, ingredients_id=ingredient.id)
+            for pk in ids for ingredient in ingredients[:3])
+
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user)
+        url = reverse('recipes:recipes-list')
+        content = {}
+        with patch.object(KeysetPagination, 'max_page_size', count):
+            for name, fast in (('serializer', False), ('values', True)):
+                with patch.object(RecipesViewSet, 'fast_list', fast):
+                    content[name], seconds = self.measure(
+                        client, url, count, options)
+                self.stdout.write(
+                    f'{name:10} {count / seconds:10.0f} rows/s '
+                    f'{seconds * 1000:8.1f} ms')
+
+        if content['serializer'] != content['values']:
+            raise CommandError('the list paths rendered different JSON')
+        self.stdout.write('responses are byte-identical')
+
+    def measure(self, client, url, count, options):
+        """return the content and fastest time of listing every recipe"""
+        timings = []
+        profile = cProfile.Profile() if options['profile'] else None
+        for _ in range(options['repeat']):
+            # measure the work, not the response cache
+            caches[settings.RESPONSE_CACHE_ALIAS].clear()
+            if profile is not None:
+                profile.enable()
+            start = time.perf_counter()
+            resp = client.get(url, {'page_size': count})
+            timings.append(time.perf_counter() - start)
+            if profile is not None:
+                profile.disable()
+        if profile is not None:
+            pstats.Stats(profile, stream=self.stdout) \
+                .sort_stats('tottime').print_stats(10)
+        return resp.content, min(timings)
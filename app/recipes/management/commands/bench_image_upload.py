@@ -0,0 +1,126 @@
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from django.core.files.storage import default_storage
+from django.core.files.uploadhandler import load_handler
+from django.core.handlers.wsgi import WSGIRequest
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+
+from recipes.uploadhandlers import RecipeImageUploadHandler
+
+
+PATHS = {
+    'default': lambda request: [
+        load_handler(handler, request)
+        for handler in settings.FILE_UPLOAD_HANDLERS],
+    'streaming': lambda request: [RecipeImageUploadHandler(request)],
+}
+
+
+def _max_rss():
+    """return the peak resident set size of this process in bytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Command(BaseCommand):
+    """django command to compare the default and streaming upload paths"""
+
+    help = 'measure peak RSS and time of receiving and storing an image, ' \
+        'each upload in a process of its own'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixels', type=float, default=0.75)
+        parser.add_argument('--repeat', type=int, default=3)
+        # used by the processes the command starts
+        parser.add_argument('--measure', choices=PATHS, help='receive '
+                            'the multipart body in --body once and print '
+                            'the timings as JSON')
+        parser.add_argument('--body')
+
+    def handle(self, *args, **options):
+        """handle the command"""
+        if options['measure']:
+            self.stdout.write(json.dumps(
+                self.measure(options['measure'], options['body'])))
+            return
+
+        side = int((options['megapixels'] * 1000 * 1000) ** 0.5)
+        # noise does not compress, so the file is about as large as the
+        # raw pixel data
+        image = Image.frombytes('RGB', (side, side),
+                                os.urandom(side * side * 3))
+        with tempfile.NamedTemporaryFile(suffix='.png') as upload, \
+                tempfile.NamedTemporaryFile() as body:
+            image.save(upload, format='PNG')
+            self.stdout.write(f'image: {side}x{side}, '
+                              f'{upload.tell() / 1024 / 1024:.1f} MiB')
+            upload.seek(0)
+            body.write(encode_multipart(BOUNDARY, {'image': upload}))
+            body.flush()
+            for name in PATHS:
+                runs = [self.run(name, body.name)
+                        for _ in range(options['repeat'])]
+                self.stdout.write(
+                    f'{name:10} '
+                    f'{min(run["seconds"] for run in runs) * 1000:8.1f} ms '
+                    f'{max(run["growth"] for run in runs) / 2 ** 20:8.1f} '
+                    f'MiB peak RSS growth, '
+                    f'{max(run["peak"] for run in runs) / 2 ** 20:8.1f} '
+                    f'MiB peak RSS')
+
+    def run(self, name, path):
+        """receive an upload in a new process, return its timings"""
+        result = subprocess.run(
+            [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'),
+             'bench_image_upload', '--measure', name, '--body', path],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            env=os.environ, universal_newlines=True)
+        if result.returncode:
+            raise CommandError(result.stderr)
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def measure(self, name, path):
+        """receive and store one upload, return its seconds and peak RSS
+
+        the body is read from a file as a server reads it from a socket.
+        the peak covers the whole process, the growth only what receiving
+        and storing the upload added to it, C buffers of Pillow included.
+        """
+        with open(path, 'rb') as body:
+            request = WSGIRequest({
+                'REQUEST_METHOD': 'POST', 'PATH_INFO': '/',
+                'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+                'wsgi.url_scheme': 'http', 'wsgi.input': body,
+                'CONTENT_TYPE': MULTIPART_CONTENT,
+                'CONTENT_LENGTH': str(os.path.getsize(path)),
+            })
+            request.upload_handlers = PATHS[name](request)
+
+            before = _max_rss()
+            start = time.perf_counter()
+            image = request.FILES.get('image')
+            if image is None:
+                raise CommandError(', '.join(
+                    handler.error for handler in request.upload_handlers
+                    if getattr(handler, 'error', None)))
+            stored = default_storage.save(
+                f'uploads/recipes/bench-{os.getpid()}.png', image)
+            elapsed = time.perf_counter() - start
+            peak = _max_rss()
+
+        image.close()
+        for handler in request.upload_handlers:
+            if hasattr(handler, 'cleanup'):
+                handler.cleanup()
+        default_storage.delete(stored)
+        return {'seconds': elapsed, 'peak': peak, 'growth': peak - before}
@@ -0,0 +1,64 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Tags, Ingredients
+
+
+class Rollback(Exception):
+    """raised to discard the benchmark data once the run is over"""
+
+
+class Command(BaseCommand):
+    """django command to compare single and bulk recipe creation"""
+
+    help = 'time creating recipes one by one against the bulk endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """handle the command"""
+        try:
+            with transaction.atomic():
+                self.run(options['items'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, items):
+        """create the same batch through both paths"""
+        user = get_user_model().objects.create_user(
+            'bench-recipe-bulk@localhost', None)
+        tags = [Tags.objects.create(user=user, name=f'tag {i}').id
+                for i in range(3)]
+        ingredients = [
+            Ingredients.objects.create(user=user, name=f'ingredient {i}').id
+            for i in range(3)
+        ]
+        payload = [
+            {'title': f'recipe {i}', 'time_minutes': 10, 'price': '5.00',
+             'tags': tags, 'ingredients': ingredients}
+            for i in range(items)
+        ]
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user)
+
+        start = time.perf_counter()
+        for item in payload:
+            client.post(reverse('recipes:recipes-list'), item, format='json')
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        resp = client.post(
+            reverse('recipes:recipes-bulk'), payload, format='json')
+        bulk = time.perf_counter() - start
+        assert resp.status_code == 201, resp.data
+
+        self.stdout.write(f'single: {items / single:10.1f} recipes/s')
+        self.stdout.write(f'bulk:   {items / bulk:10.1f} recipes/s')
+        self.stdout.write(f'speedup: {single / bulk:.1f}x')
@@ -0,0 +1,127 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.client import RequestFactory
+
+from core.models import Recipes, Tags, Ingredients
+from recipes.filters import RecipeFilter
+
+
+class Rollback(Exception):
+    """raised to discard the benchmark data once the run is over"""
+
+
+class Command(BaseCommand):
+    """django command to time the recipe filter queries at several sizes"""
+
+    help = 'time recipe list filter queries for a single seeded user'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', nargs='+', type=int,
+            default=[1000, 100000, 1000000],
+            help='number of recipes for the benchmark user at each step')
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--ingredients', type=int, default=200)
+        parser.add_argument('--links', type=int, default=3,
+                            help='tags and ingredients linked per recipe')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--limit', type=int, default=100,
+                            help='rows fetched per query, like one page')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        """handle the command"""
+        self.options = options
+        self.random = random.Random(0)
+        try:
+            with transaction.atomic():
+                self.run()
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self):
+        """seed the data step by step and time the queries at each size"""
+        user = get_user_model().objects.create_user(
+            'bench-recipe-filters@localhost', None)
+        tags = Tags.objects.bulk_create(
+            Tags(user=user, name=f'tag {i}')
+            for i in range(self.options['tags']))
+        ingredients = Ingredients.objects.bulk_create(
+            Ingredients(user=user, name=f'ingredient {i}')
+            for i in range(self.options['ingredients']))
+        tag_ids = list(Tags.objects.filter(user=user)
+                       .values_list('id', flat=True))
+        ingredient_ids = list(Ingredients.objects.filter(user=user)
+                              .values_list('id', flat=True))
+        del tags, ingredients
+
+        seeded = 0
+        for size in sorted(self.options['sizes']):
+            self.seed(user, seeded, size, tag_ids, ingredient_ids)
+            seeded = size
+            self.stdout.write(f'{size} recipes')
+            for name, params in self.cases(tag_ids, ingredient_ids):
+                timings = self.time_query(user, params)
+                self.stdout.write(
+                    f'  {name:<28} median {statistics.median(timings):8.2f}'
+                    f' ms  min {min(timings):8.2f} ms')
+
+    def seed(self, user, start, end, tag_ids, ingredient_ids):
+        """create recipes `start` to `end` and link them up"""
+        batch_size = self.options['batch_size']
+        links = self.options['links']
+        last_id = Recipes.objects.filter(user=user) \
+            .order_by('-id').values_list('id', flat=True).first() or 0
+        for offset in range(start, end, batch_size):
+            Recipes.objects.bulk_create(
+                Recipes(user=user, title=f'recipe {i}',
+                        time_minutes=10, price=5)
+                for i in range(offset, min(offset + batch_size, end)))
+        recipe_ids = Recipes.objects.filter(user=user, id__gt=last_id) \
+            .values_list('id', flat=True)
+        tag_links = []
+        ingredient_links = []
+        for recipe_id in recipe_ids.iterator():
+            for tag_id in self.random.sample(tag_ids, links):
+                tag_links.append(Recipes.tags.through(
+                    recipes_id=recipe_id, tags_id=tag_id))
+            for ingredient_id in self.random.sample(ingredient_ids, links):
+                ingredient_links.append(Recipes.ingredients.through(
+                    recipes_id=recipe_id, ingredients_id=ingredient_id))
+        Recipes.tags.through.objects.bulk_create(
+            tag_links, batch_size=batch_size)
+        Recipes.ingredients.through.objects.bulk_create(
+            ingredient_links, batch_size=batch_size)
+
+    def cases(self, tag_ids, ingredient_ids):
+        """return the query parameter sets to benchmark"""
+        tags = ','.join(str(i) for i in tag_ids[:2])
+        ingredients = ','.join(str(i) for i in ingredient_ids[:2])
+        return (
+            ('unfiltered', {}),
+            ('tags any', {'tags': tags}),
+            ('tags all', {'tags': tags, 'match': 'all'}),
+            ('tags + ingredients any',
+             {'tags': tags, 'ingredients': ingredients}),
+            ('tags + ingredients all',
+             {'tags': tags, 'ingredients': ingredients, 'match': 'all'}),
+        )
+
+    def time_query(self, user, params):
+        """return the timings in milliseconds of fetching one page"""
+        query_params = RequestFactory().get('/', params).GET
+        timings = []
+        for _ in range(self.options['repeat']):
+            start = time.perf_counter()
+            queryset = RecipeFilter(query_params).filter_queryset(
+                Recipes.objects.filter(user=user)).order_by('-id')
+            list(queryset.values_list('id', flat=True)
+                 [:self.options['limit']])
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
@@ -0,0 +1,73 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Tags, Ingredients, Recipes
+
+
+class Rollback(Exception):
+    """raised to discard the benchmark data once the run is over"""
+
+
+class Command(BaseCommand):
+    """django command to compare full and sparse recipe lists"""
+
+    help = 'measure payload size and time of full and sparse recipe lists'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--fields', default='id,title,time_minutes')
+
+    def handle(self, *args, **options):
+        """handle the command"""
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        """list the same page with and without a field selection"""
+        user = get_user_model().objects.create_user(
+            'bench-sparse-fields@localhost', None)
+        tags = [Tags(user=user, name=f'tag {i}') for i in range(5)]
+        ingredients = [Ingredients(user=user, name=f'ingredient {i}')
+                       for i in range(5)]
+        for item in tags + ingredients:
+            item.save()
+        for i in range(options['recipes']):
+            recipe = Recipes.objects.create(
+                user=user, title=f'recipe {i}', time_minutes=10,
+                price='5.00', link='https://example.com/recipe')
+            recipe.tags.add(*tags[:3])
+            recipe.ingredients.add(*ingredients[:3])
+
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user)
+        url = reverse('recipes:recipes-list')
+        page = {'page_size': options['recipes']}
+        for name, params in (('full', page),
+                             ('sparse', {**page,
+                                         'fields': options['fields']})):
+            timings = []
+            for _ in range(options['repeat']):
+                # measure the work, not the response cache
+                caches[settings.RESPONSE_CACHE_ALIAS].clear()
+                connection.queries_log.clear()
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    resp = client.get(url, params)
+                    timings.append(time.perf_counter() - start)
+            self.stdout.write(
+                f'{name:7} {len(resp.content) / 1024:9.1f} KiB '
+                f'{min(timings) * 1000:9.1f} ms '
+                f'{len(context.captured_queries):3} queries')
@@ -0,0 +1,71 @@
+import time
+import tracemalloc
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Tags, Recipes
+from recipes.pagination import KeysetPagination
+
+
+class Rollback(Exception):
+    """raised to discard the benchmark data once the run is over"""
+
+
+class Command(BaseCommand):
+    """django command to compare rendering a list at once and streamed"""
+
+    help = 'measure peak memory of listing every recipe in one response'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        """handle the command"""
+        try:
+            with transaction.atomic():
+                self.run(options['recipes'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, count):
+        """list every recipe with both renderers"""
+        user = get_user_model().objects.create_user(
+            'bench-stream-list@localhost', None)
+        tags = [Tags.objects.create(user=user, name=f'tag {i}')
+                for i in range(2)]
+        Recipes.objects.bulk_create(
+            (Recipes(user=user, title=f'recipe {i}', time_minutes=10,
+                     price='5.50', link='https://example.com/recipe')
+             for i in range(count)), batch_size=500)
+        ids = Recipes.objects.filter(user=user).values_list('id', flat=True)
+        Recipes.tags.through.objects.bulk_create(
+            (Recipes.tags.through(recipes_id=pk, tags_id=tag.id)
+             for pk in ids for tag in tags), batch_size=500)
+
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user)
+        url = reverse('recipes:recipes-list')
+        with patch.object(KeysetPagination, 'max_page_size', count):
+            self.measure('json', lambda: len(
+                client.get(url, {'page_size': count}).content))
+        self.measure('stream', lambda: sum(
+            len(chunk) for chunk in client.get(
+                url, {'format': 'json-stream'}).streaming_content))
+
+    def measure(self, name, request):
+        """report the size, time and peak traced memory of a request"""
+        tracemalloc.start()
+        start = time.perf_counter()
+        size = request()
+        elapsed = time.perf_counter() - start
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f'{name:7} {size / 1024 / 1024:7.1f} MiB body '
+            f'{peak / 1024 / 1024:8.1f} MiB peak {elapsed:7.1f} s')
@@ -0,0 +1,151 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+from django.db import connection, transaction
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Tags, Ingredients, Recipes
+
+
+class Rollback(Exception):
+    """raised to discard the sample data once the run is over"""
+
+
+class QueryRecorder:
+    """execute wrapper keeping the SELECTs a request runs"""
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            self.queries.append((sql, params))
+        return execute(sql, params, many, context)
+
+
+class Command(BaseCommand):
+    """django command to explain the queries of every API endpoint"""
+
+    help = 'run EXPLAIN ANALYZE on the queries of each endpoint and ' \
+        'flag full table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--fail', action='store_true',
+                            help='exit with an error if a scan is flagged')
+
+    def handle(self, *args, **options):
+        """handle the command"""
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            raise CommandError(
+                f'cannot explain queries on {connection.vendor}')
+        flagged = []
+        try:
+            with transaction.atomic():
+                flagged = self.run(options['recipes'], options['verbosity'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        if flagged:
+            self.stdout.write(self.style.WARNING(
+                f'{len(flagged)} queries scan a whole table: '
+                + ', '.join(sorted(set(flagged)))))
+            if options['fail']:
+                raise CommandError('full table scans found')
+        else:
+            self.stdout.write(self.style.SUCCESS('no full table scans'))
+
+    def run(self, count, verbosity):
+        """create sample data and explain every endpoint"""
+        user = get_user_model().objects.create_user(
+            'explain-queries@localhost', None)
+        tags = [Tags.objects.create(user=user, name=f'tag {i}')
+                for i in range(20)]
+        ingredients = [
+            Ingredients.objects.create(user=user, name=f'ingredient {i}')
+            for i in range(20)
+        ]
+        Recipes.objects.bulk_create(
+            (Recipes(user=user, title=f'recipe {i}', time_minutes=i % 90,
+                     price='5.50', link='https://example.com/recipe')
+             for i in range(count)), batch_size=500)
+        ids = list(Recipes.objects.filter(user=user)
+                   .values_list('id', flat=True))
+        Recipes.tags.through.objects.bulk_create(
+            (Recipes.tags.through(recipes_id=pk, tags_id=tags[pk % 20].id)
+             for pk in ids), batch_size=500)
+        Recipes.ingredients.through.objects.bulk_create(
+            (Recipes.ingredients.through(
+                recipes_id=pk, ingredients_id=ingredients[pk % 20].id)
+             for pk in ids), batch_size=500)
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+                # small sample tables are cheaper to scan, any scan the
+                # planner still picks has no usable index. SQLite is left
+                # without statistics, which plans for large tables
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user)
+        token = client.get(reverse('recipes:sync')).data['token']
+        recipes = reverse('recipes:recipes-list')
+        endpoints = (
+            ('tags', reverse('recipes:tags-list'), {}),
+            ('ingredients', reverse('recipes:ingredients-list'), {}),
+            ('recipes', recipes, {}),
+            ('recipes by tag', recipes, {'tags': tags[0].id}),
+            ('recipes by all tags', recipes,
+             {'tags': f'{tags[0].id},{tags[1].id}', 'match': 'all'}),
+            ('recipes by ingredient', recipes,
+             {'ingredients': ingredients[0].id}),
+            ('recipes search', recipes, {'search': 'recipe'}),
+            ('recipe detail', reverse('recipes:recipes-detail',
+                                      args=[ids[0]]), {}),
+            ('sync', reverse('recipes:sync'), {'since': token}),
+        )
+        flagged = []
+        for name, url, params in endpoints:
+            caches[settings.RESPONSE_CACHE_ALIAS].clear()
+            recorder = QueryRecorder()
+            with connection.execute_wrapper(recorder):
+                resp = client.get(url, params)
+            if resp.status_code != 200:
+                raise CommandError(f'{name} returned {resp.status_code}')
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{name}: {len(recorder.queries)} queries'))
+            for sql, query_params in recorder.queries:
+                plan, scans = self.explain(sql, query_params)
+                if scans:
+                    flagged.append(name)
+                    self.stdout.write(self.style.WARNING(
+                        f'  full scan of {", ".join(scans)}'))
+                if scans or verbosity > 1:
+                    self.stdout.write(f'  {sql}')
+                    for line in plan:
+                        self.stdout.write(f'    {line}')
+        return flagged
+
+    def explain(self, sql, params):
+        """return the plan of a query and the tables it scans in full"""
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('EXPLAIN ANALYZE ' + sql, params)
+                plan = [row[0] for row in cursor.fetchall()]
+                scans = [line.split('Seq Scan on ')[1].split()[0]
+                         for line in plan if 'Seq Scan on ' in line]
+            else:
+                # SQLite has no EXPLAIN ANALYZE, the plan is all there is
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plan = [row[-1] for row in cursor.fetchall()]
+                # subqueries in FROM are scanned as they are produced
+                derived = {line.split()[-1] for line in plan
+                           if line.startswith(('CO-ROUTINE', 'MATERIALIZE'))}
+                scans = [line.split()[1] for line in plan
+                         if line.startswith('SCAN ') and
+                         'INDEX' not in line and 'CONSTANT' not in line and
+                         line.split()[1] not in derived]
+        return plan, scans
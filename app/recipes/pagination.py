@@ -0,0 +1,149 @@
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def _reverse_ordering(ordering):
+    """flip the direction of every field in an ordering"""
+    return tuple(
+        field[1:] if field.startswith('-') else f'-{field}'
+        for field in ordering
+    )
+
+
+class KeysetPagination(BasePagination):
+    """paginate by the position of the last row instead of an offset
+
+    the ordering (`cursor_ordering` on the view, or `ordering` here) has
+    to be unique, e.g. end in the primary key, so that every page is a
+    `WHERE (fields) > (position) ... LIMIT page_size` range scan over an
+    index with the same column order. cursors are signed so clients can
+    neither forge positions nor reuse one across differently ordered
+    endpoints.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = settings.API_PAGE_SIZE
+    max_page_size = settings.API_MAX_PAGE_SIZE
+    ordering = ('-id',)
+    invalid_cursor_message = _('invalid cursor')
+    salt = 'recipes.pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """return a single page of the queryset"""
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = tuple(getattr(view, 'cursor_ordering', self.ordering))
+
+        position, reverse = self.decode_cursor(request)
+        ordering = _reverse_ordering(self.ordering) \
+            if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(position, ordering))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+
+        self.first_position = self._position(rows[0]) if rows else None
+        self.last_position = self._position(rows[-1]) if rows else None
+        return rows
+
+    def get_paginated_response(self, data):
+        """wrap a serialized page with links to its neighbours"""
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        """return the requested page size, capped at max_page_size"""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_next_link(self):
+        """return the url of the following page"""
+        if not self.has_next or self.last_position is None:
+            return None
+        return self.encode_cursor(self.last_position, reverse=False)
+
+    def get_previous_link(self):
+        """return the url of the preceding page"""
+        if not self.has_previous or self.first_position is None:
+            return None
+        return self.encode_cursor(self.first_position, reverse=True)
+
+    def encode_cursor(self, position, reverse):
+        """return the current url with a signed cursor for the position"""
+        cursor = signing.dumps(
+            {'p': position, 'r': int(reverse)}, salt=self._salt())
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        """return the position and direction of the requested cursor"""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor is None:
+            return None, False
+        try:
+            data = signing.loads(cursor, salt=self._salt())
+            position, reverse = list(data['p']), bool(data['r'])
+        except (signing.BadSignature, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def _salt(self):
+        """bind cursors to the ordering they were issued for"""
+        return f'{self.salt}:{",".join(self.ordering)}'
+
+    def _position(self, row):
+        """return the values of the ordering fields for a row"""
+        values = []
+        for field in self.ordering:
+            name = field.lstrip('-')
+            values.append(
+                row[name] if isinstance(row, dict) else getattr(row, name))
+        return values
+
+    def _after(self, position, ordering):
+        """build a filter for rows strictly after the position
+
+        (a, b) after (x, y) expands to `a > x OR (a = x AND b > y)`,
+        with `<` for descending fields. PostgreSQL can not start an index
+        scan at an OR, so `a >= x` is added for it to range over.
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        if len(equal) > 1:
+            field, value = ordering[0], position[0]
+            lookup = 'lte' if field.startswith('-') else 'gte'
+            condition &= Q(**{f'{field.lstrip("-")}__{lookup}': value})
+        return condition
@@ -0,0 +1,67 @@
+from functools import lru_cache
+
+from django.db.models import Prefetch
+from rest_framework.relations import ManyRelatedField
+from rest_framework.serializers import ListSerializer, ModelSerializer
+
+
+@lru_cache(maxsize=None)
+def _plan(serializer_class, fields=None):
+    """return (source, related model, columns) for each to-many field
+
+    primary key fields only need the related ids, nested serializers the
+    columns they render, so every relation is fetched with one narrow
+    query for the whole page instead of one query per row. with `fields`
+    only the relations of those fields are planned.
+    """
+    model = serializer_class.Meta.model
+    plan = []
+    for name, field in serializer_class().fields.items():
+        if field.write_only or (fields is not None and name not in fields):
+            continue
+        if isinstance(field, ManyRelatedField):
+            related = model._meta.get_field(field.source).related_model
+            plan.append((field.source, related, (related._meta.pk.name,)))
+        elif isinstance(field, ListSerializer) and \
+                isinstance(field.child, ModelSerializer):
+            related = field.child.Meta.model
+            concrete = {f.name for f in related._meta.concrete_fields}
+            columns = tuple(
+                child.source for child in field.child.fields.values()
+                if not child.write_only and child.source in concrete)
+            relation = model._meta.get_field(field.source)
+            if relation.one_to_many:
+                # reverse foreign keys are matched up by the key column
+                columns += (relation.field.name,)
+            plan.append((field.source, related, columns))
+    return tuple(plan)
+
+
+@lru_cache(maxsize=None)
+def columns_for_serializer(serializer_class, fields=None):
+    """return the model columns the (given) fields of a serializer read"""
+    model = serializer_class.Meta.model
+    concrete = {f.name for f in model._meta.concrete_fields}
+    return tuple(
+        field.source for name, field in serializer_class().fields.items()
+        if (fields is None or name in fields) and field.source in concrete)
+
+
+def _related_queryset(related, columns):
+    """select the columns of related objects in a stable order"""
+    queryset = related.objects.only(*columns)
+    if not related._meta.ordering:
+        queryset = queryset.order_by(related._meta.pk.name)
+    return queryset
+
+
+def prefetch_for_serializer(queryset, serializer_class, fields=None):
+    """prefetch the relations serializer_class renders for each row
+
+    related objects without a default ordering come in primary key order,
+    which is also the order of the ids rendered by `recipes.fastpath`.
+    """
+    return queryset.prefetch_related(*(
+        Prefetch(source, queryset=_related_queryset(related, columns))
+        for source, related, columns in _plan(serializer_class, fields)
+    ))
@@ -0,0 +1,37 @@
+import uuid
+
+from rest_framework.renderers import JSONRenderer
+
+
+class StreamingJSONRenderer(JSONRenderer):
+    """json renderer that can encode a list one chunk at a time
+
+    selected with `?format=json-stream`. views that support it return
+    the output of `render_stream` in a StreamingHttpResponse, anything
+    else is rendered like the plain JSONRenderer would.
+    """
+
+    format = 'json-stream'
+    streaming = True
+
+    def render_stream(self, data, key, chunks, renderer_context=None):
+        """yield data as JSON with data[key] taken from chunks of items
+
+        the output is the same as rendering data with the list filled
+        in, but only one chunk of it is in memory at a time.
+        """
+        marker = uuid.uuid4().hex
+        head, tail = self.render(
+            {**data, key: marker}, renderer_context=renderer_context,
+        ).split(self.render(marker))
+        yield head + b'['
+        first = True
+        for chunk in chunks:
+            if not chunk:
+                continue
+            encoded = b','.join(
+                self.render(item, renderer_context=renderer_context)
+                for item in chunk)
+            yield encoded if first else b',' + encoded
+            first = False
+        yield b']' + tail
@@ -1,9 +1,61 @@
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 
-from core.models import Tags, Ingredients, Recipes
+from core.models import Tags, Ingredients, Recipes, RecipeImageRendition
 
 
-class TagsSerializer(serializers.ModelSerializer):
+class RecipeAttrSerializer(serializers.ModelSerializer):
+    """base serializer for objects a user names once, like tags
+
+    `validate_name` reports most duplicates, the (user, name) unique index
+    catches the ones created concurrently after it checked.
+    """
+
+    duplicate_message = _('an object with this name already exists')
+
+    def validate_name(self, value):
+        """check the user does not have an object with that name yet"""
+        request = self.context.get('request')
+        if request is not None and self.Meta.model.objects.filter(
+                user=request.user, name=value).exists():
+            raise serializers.ValidationError(self.duplicate_message)
+        return value
+
+    def create(self, validated_data):
+        return self._save_unique(super().create, validated_data)
+
+    def update(self, instance, validated_data):
+        return self._save_unique(super().update, instance, validated_data)
+
+    def _save_unique(self, save, *args):
+        """save, reporting a name taken in the meantime as invalid"""
+        try:
+            with transaction.atomic():
+                return save(*args)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                {'name': [self.duplicate_message]})
+
+
+class RecipeAttrUpsertSerializer(serializers.Serializer):
+    """serializer for a batch of tag or ingredient names"""
+    names = serializers.ListField(
+        child=serializers.CharField(max_length=255))
+
+    def validate_names(self, value):
+        """check the batch is neither empty nor too large"""
+        if not value:
+            raise serializers.ValidationError(_('this list may not be empty'))
+        if len(value) > settings.RECIPES_BULK_MAX_ITEMS:
+            raise serializers.ValidationError(
+                _('at most {count} names can be sent at once')
+                .format(count=settings.RECIPES_BULK_MAX_ITEMS))
+        return value
+
+
+class TagsSerializer(RecipeAttrSerializer):
     """serializer for tag objects"""
 
     class Meta:
@@ -12,7 +64,7 @@ class TagsSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
-class IngredientsSerializer(serializers.ModelSerializer):
+class IngredientsSerializer(RecipeAttrSerializer):
     """serializer for ingredient objects"""
 
     class Meta:
@@ -36,17 +88,32 @@ class RecipesSerializer(serializers.ModelSerializer):
         read_only_fields = ('id',)
 
 
+class RecipeImageRenditionSerializer(serializers.ModelSerializer):
+    """serializer for resized recipe images"""
+
+    class Meta:
+        model = RecipeImageRendition
+        fields = ('width', 'format', 'image')
+        read_only_fields = fields
+
+
 class RecipeDetailSerializer(RecipesSerializer):
     """serialize a recipe detail"""
 
     ingredients = IngredientsSerializer(many=True, read_only=True)
     tags = TagsSerializer(many=True, read_only=True)
+    renditions = RecipeImageRenditionSerializer(many=True, read_only=True)
+
+    class Meta(RecipesSerializer.Meta):
+        fields = RecipesSerializer.Meta.fields + ('image', 'renditions')
+        read_only_fields = ('id', 'image')
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """serializer for uploading images to recipes"""
+    renditions = RecipeImageRenditionSerializer(many=True, read_only=True)
 
     class Meta:
         model = Recipes
-        fields = ('id', 'image')
+        fields = ('id', 'image', 'renditions')
         read_only_fields = ('id',)
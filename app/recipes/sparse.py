@@ -0,0 +1,74 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework.exceptions import ValidationError
+
+from .prefetch import columns_for_serializer, prefetch_for_serializer
+
+
+def _names(value):
+    """split a comma separated list of field names"""
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """let clients pick the fields of list and detail responses
+
+    `?fields=id,title` renders only those fields, `?exclude=link` all but
+    those. the query then only selects the columns of the picked fields,
+    plus the ones the pagination orders by, and relations that are not
+    rendered are not prefetched at all.
+    """
+
+    fields_query_param = 'fields'
+    exclude_query_param = 'exclude'
+    sparse_actions = ('list', 'retrieve')
+
+    def get_sparse_fields(self):
+        """return the names of the fields to render, or None for all"""
+        if self.action not in self.sparse_actions:
+            return None
+        params = self.request.query_params
+        if self.fields_query_param not in params and \
+                self.exclude_query_param not in params:
+            return None
+
+        available = self.get_serializer_class().Meta.fields
+        wanted = _names(params.get(self.fields_query_param, ''))
+        excluded = _names(params.get(self.exclude_query_param, ''))
+        for param, names in ((self.fields_query_param, wanted),
+                             (self.exclude_query_param, excluded)):
+            unknown = names.difference(available)
+            if unknown:
+                raise ValidationError({param: _(
+                    'unknown fields: {fields}, choose from {available}'
+                ).format(fields=', '.join(sorted(unknown)),
+                         available=', '.join(available))})
+
+        fields = tuple(name for name in available
+                       if (not wanted or name in wanted) and
+                       name not in excluded)
+        if not fields:
+            raise ValidationError({self.exclude_query_param: _(
+                'at least one field has to be left')})
+        return fields
+
+    def sparse_queryset(self, queryset):
+        """select the columns and prefetch the relations to be rendered"""
+        serializer_class = self.get_serializer_class()
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            ordering = {field.lstrip('-') for field in self.cursor_ordering}
+            concrete = {f.name for f in queryset.model._meta.concrete_fields}
+            queryset = queryset.only(
+                *columns_for_serializer(serializer_class, fields),
+                *ordering.intersection(concrete))
+        return prefetch_for_serializer(queryset, serializer_class, fields)
+
+    def get_serializer(self, *args, **kwargs):
+        """drop the fields that were not asked for"""
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.get_sparse_fields()
+        if fields is not None:
+            target = getattr(serializer, 'child', serializer)
+            for name in set(target.fields).difference(fields):
+                target.fields.pop(name)
+        return serializer
@@ -0,0 +1,144 @@
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers as drf_serializers, status
+from rest_framework.exceptions import APIException
+
+from core.models import ChangeLog, Tags, Ingredients, Recipes
+from . import serializers
+from .fastpath import _plan, render_rows
+
+
+TOKEN_SALT = 'recipes.sync'
+
+# what a sync response holds, in order, keyed by change log kind
+SYNCED = OrderedDict(
+    (model._meta.model_name, (model, serializer_class))
+    for model, serializer_class in (
+        (Recipes, serializers.RecipesSerializer),
+        (Tags, serializers.TagsSerializer),
+        (Ingredients, serializers.IngredientsSerializer),
+    )
+)
+
+
+class SyncTokenExpired(APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = _('the sync token expired, sync again without it')
+    default_code = 'sync_token_expired'
+
+
+def make_token(user, watermark):
+    """return a signed token for the given change log watermark"""
+    return signing.dumps({'user': user.pk, 'id': watermark}, salt=TOKEN_SALT)
+
+
+def read_token(user, token):
+    """return the change log watermark of a token issued to the user
+
+    tokens live as long as the change log entries after them are kept.
+    """
+    max_age = timedelta(days=settings.SYNC_RETENTION_DAYS)
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT,
+                             max_age=max_age.total_seconds())
+    except signing.SignatureExpired:
+        raise SyncTokenExpired()
+    except signing.BadSignature:
+        data = None
+    if not isinstance(data, dict) or data.get('user') != user.pk:
+        raise drf_serializers.ValidationError(
+            {'since': [_('invalid sync token')]})
+    return data['id']
+
+
+def _render(model, serializer_class, queryset):
+    """serialize a queryset the way the list endpoint does"""
+    plan = _plan(serializer_class())
+    if plan is None:
+        return serializer_class(queryset, many=True).data
+    columns, _relations, _renderers = plan
+    rows = list(queryset.values(*dict.fromkeys(['id', *columns])))
+    return render_rows(model, plan, rows, queryset.db)
+
+
+def _settled(user):
+    """return the last change log id that can no longer be overtaken
+
+    ids are taken when a transaction writes, not when it commits, so
+    a recent entry may still become visible below the newest one.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+    return ChangeLog.objects.filter(user=user, created_at__lt=cutoff) \
+        .order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def snapshot(user):
+    """return all of a user's data and the watermark it is current to"""
+    watermark = _settled(user)
+    data = OrderedDict()
+    for kind, (model, serializer_class) in SYNCED.items():
+        queryset = model.objects.filter(user=user).order_by('id')
+        data[kind] = {
+            'changed': _render(model, serializer_class, queryset),
+            'deleted': [],
+        }
+    return data, watermark, False
+
+
+def changes(user, since):
+    """return what changed after a watermark, the next one and if more
+
+    at most SYNC_MAX_CHANGES log entries are read, found through the
+    (user, id) index, so the cost follows the size of the delta. every
+    object is sent in its current state, or as a tombstone. the
+    watermark never passes an entry younger than SYNC_SETTLE_SECONDS.
+    """
+    limit = settings.SYNC_MAX_CHANGES
+    entries = list(
+        ChangeLog.objects.filter(user=user, id__gt=since).order_by('id')
+        .values_list('id', 'kind', 'object_id', 'deleted', 'created_at')
+        [:limit + 1])
+    more = len(entries) > limit
+    entries = entries[:limit]
+
+    # stop before the first entry that might still be overtaken, the
+    # ones after it are sent again next time. with none settled yet the
+    # watermark stays put, and more is only set past a settled page, so
+    # clients wait instead of asking again straight away
+    cutoff = timezone.now() - timedelta(seconds=settings.SYNC_SETTLE_SECONDS)
+    watermark = since
+    for pk, _kind, _object_id, _deleted, created_at in entries:
+        if created_at >= cutoff:
+            break
+        watermark = pk
+    more = more and watermark == entries[-1][0]
+
+    latest = {}
+    for _pk, kind, object_id, deleted, _created_at in entries:
+        latest[kind, object_id] = deleted
+
+    data = OrderedDict()
+    for kind, (model, serializer_class) in SYNCED.items():
+        ids = sorted(object_id for (entry_kind, object_id), deleted
+                     in latest.items() if entry_kind == kind and not deleted)
+        deleted = {object_id for (entry_kind, object_id), deleted
+                   in latest.items() if entry_kind == kind and deleted}
+        changed = []
+        # one parameter goes to the user
+        max_params = connections[model.objects.db].features.max_query_params
+        batch_size = max_params - 1 if max_params else max(len(ids), 1)
+        for start in range(0, len(ids), batch_size):
+            queryset = model.objects.filter(
+                user=user, id__in=ids[start:start + batch_size]) \
+                .order_by('id')
+            changed += _render(model, serializer_class, queryset)
+        # gone since the entry was read
+        deleted.update(set(ids) - {item['id'] for item in changed})
+        data[kind] = {'changed': changed, 'deleted': sorted(deleted)}
+    return data, watermark, more
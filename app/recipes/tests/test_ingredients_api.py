@@ -4,10 +4,12 @@ from django.test import TestCase
 from rest_framework import status
 from rest_framework.test import APIClient
 from core.models import Ingredients
+from core.tests.mixins import NPlusOneMixin, QueryCountMixin
 from recipes.serializers import IngredientsSerializer
 
 
 INGREDIENTS_URL = reverse('recipes:ingredients-list')
+INGREDIENTS_UPSERT_URL = reverse('recipes:ingredients-upsert')
 
 
 class PublicIngredientsAPITests(TestCase):
@@ -22,7 +24,7 @@ class PublicIngredientsAPITests(TestCase):
         self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateIngredientsAPITests(TestCase):
+class PrivateIngredientsAPITests(QueryCountMixin, NPlusOneMixin, TestCase):
     """test the private ingredients API"""
 
     def setUp(self):
@@ -39,7 +41,7 @@ class PrivateIngredientsAPITests(TestCase):
         ingredients = Ingredients.objects.all().order_by('-name')
         serializer = IngredientsSerializer(ingredients, many=True)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(resp.data, serializer.data)
+        self.assertEqual(resp.data['results'], serializer.data)
 
     def test_ingredients_limited_to_user(self):
         """test that only ingredients for the authenticated user are returned"""
@@ -50,8 +52,8 @@ class PrivateIngredientsAPITests(TestCase):
             user=self.user, name='vanilla')
         resp = self.client.get(INGREDIENTS_URL)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(resp.data), 1)
-        self.assertEqual(resp.data[0]['name'], ingredient.name)
+        self.assertEqual(len(resp.data['results']), 1)
+        self.assertEqual(resp.data['results'][0]['name'], ingredient.name)
 
     def test_create_ingredient_successful(self):
         """test create a new ingredient"""
@@ -66,3 +68,25 @@ class PrivateIngredientsAPITests(TestCase):
         payload = {'name': ''}
         resp = self.client.post(INGREDIENTS_URL, payload)
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_ingredients_query_count(self):
+        """test listing ingredients takes the ETag and the page query"""
+        for i in range(5):
+            Ingredients.objects.create(user=self.user, name=f'ingredient {i}')
+
+        resp = self.assertRequestQueries(2, 'get', INGREDIENTS_URL)
+
+        self.assertEqual(len(resp.data['results']), 5)
+
+    def test_upsert_ingredients(self):
+        """test upserting ingredient names returns their ids"""
+        salt = Ingredients.objects.create(user=self.user, name='salt')
+
+        resp = self.client.post(
+            INGREDIENTS_UPSERT_URL, {'names': ['salt', 'pepper']},
+            format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data[0], {'id': salt.id, 'name': 'salt'})
+        pepper = Ingredients.objects.get(user=self.user, name='pepper')
+        self.assertEqual(resp.data[1], {'id': pepper.id, 'name': 'pepper'})
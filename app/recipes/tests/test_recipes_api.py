@@ -1,17 +1,34 @@
 import tempfile
 import os
+import shutil
+import time
+from datetime import timedelta
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
 from PIL import Image
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache, caches
+from django.db import DatabaseError, connection
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Recipes, Ingredients, Tags
+from core.models import Recipes, Ingredients, Tags, RecipeImageRendition, \
+    ChangeLog
+from core.tests.mixins import NPlusOneMixin, QueryCountMixin
+from recipes import cache as response_cache, images, sync
+from recipes.pagination import KeysetPagination
 from recipes.serializers import RecipesSerializer, RecipeDetailSerializer
+from recipes.views import RecipesViewSet
 
 
 RECIPES_URL = reverse('recipes:recipes-list')
+BULK_URL = reverse('recipes:recipes-bulk')
+SYNC_URL = reverse('recipes:sync')
 
 
 def image_upload_url(recipe_id):
@@ -37,6 +54,7 @@ def sample_ingredient(user, name='chocolate'):
 def sample_recipe(user, **kwargs):
     """create and return a sample recipe"""
     defaults = {'title': 'sample recipe', 'time_minutes': 10, 'price': 5.00}
+    defaults.update(kwargs)
     return Recipes.objects.create(user=user, **defaults)
 
 
@@ -52,10 +70,11 @@ class PublicRecipesAPITests(TestCase):
         self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateRecipesAPITests(TestCase):
+class PrivateRecipesAPITests(QueryCountMixin, NPlusOneMixin, TestCase):
     """test unauthenticated recipe API access"""
 
     def setUp(self):
+        cache.clear()
         self.client = APIClient()
         self.user = get_user_model().objects.create_user(
             'asdf@asdf.com',
@@ -71,7 +90,7 @@ class PrivateRecipesAPITests(TestCase):
         recipes = Recipes.objects.all().order_by('-id')
         serializer = RecipesSerializer(recipes, many=True)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(resp.data, serializer.data)
+        self.assertEqual(resp.data['results'], serializer.data)
 
     def test_recipes_limited_to_user(self):
         """test retrieving recipes for user"""
@@ -83,8 +102,8 @@ class PrivateRecipesAPITests(TestCase):
         recipes = Recipes.objects.filter(user=self.user)
         serializer = RecipesSerializer(recipes, many=True)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(resp.data), 1)
-        self.assertEqual(resp.data, serializer.data)
+        self.assertEqual(len(resp.data['results']), 1)
+        self.assertEqual(resp.data['results'], serializer.data)
 
     def test_view_recipe_detail(self):
         """test viewing a recipe detail"""
@@ -149,6 +168,22 @@ class PrivateRecipesAPITests(TestCase):
         self.assertEqual(len(tags), 1)
         self.assertIn(new_tag, tags)
 
+    def test_update_recipe_and_links_once(self):
+        """test an update with new tags and ingredients is applied once"""
+        recipe = sample_recipe(user=self.user)
+        tag = sample_tag(user=self.user, name='curry')
+        ingredient = sample_ingredient(user=self.user, name='lentils')
+        ChangeLog.objects.all().delete()
+
+        self.client.patch(detail_url(recipe.id), {
+            'title': 'dal', 'tags': [tag.id], 'ingredients': [ingredient.id]})
+
+        self.assertEqual(
+            ChangeLog.objects.filter(kind='recipes').count(), 1)
+        resp = self.client.get(RECIPES_URL, {'search': 'curry lentils'})
+        self.assertEqual([item['id'] for item in resp.data['results']],
+                         [recipe.id])
+
     def test_full_update_recipe(self):
         """test updating a recipe with put"""
         recipe = sample_recipe(user=self.user)
@@ -164,17 +199,886 @@ class PrivateRecipesAPITests(TestCase):
         tags = recipe.tags.all()
         self.assertEqual(len(tags), 0)
 
+    def test_filter_recipes_by_tags(self):
+        """test returning recipes with any of the given tags"""
+        recipe1 = sample_recipe(user=self.user, title='thai vegetable curry')
+        recipe2 = sample_recipe(user=self.user, title='aubergine with tahini')
+        tag1 = sample_tag(user=self.user, name='vegan')
+        tag2 = sample_tag(user=self.user, name='vegetarian')
+        recipe1.tags.add(tag1)
+        recipe2.tags.add(tag2)
+        recipe3 = sample_recipe(user=self.user, title='fish and chips')
+
+        resp = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        serializer1 = RecipesSerializer(recipe1)
+        serializer2 = RecipesSerializer(recipe2)
+        serializer3 = RecipesSerializer(recipe3)
+        self.assertIn(serializer1.data, resp.data['results'])
+        self.assertIn(serializer2.data, resp.data['results'])
+        self.assertNotIn(serializer3.data, resp.data['results'])
+
+    def test_filter_recipes_by_ingredients(self):
+        """test returning recipes with any of the given ingredients"""
+        recipe1 = sample_recipe(user=self.user, title='posh beans on toast')
+        recipe2 = sample_recipe(user=self.user, title='chicken cacciatore')
+        ingredient1 = sample_ingredient(user=self.user, name='feta cheese')
+        ingredient2 = sample_ingredient(user=self.user, name='chicken')
+        recipe1.ingredients.add(ingredient1)
+        recipe2.ingredients.add(ingredient2)
+        recipe3 = sample_recipe(user=self.user, title='steak and mushrooms')
+
+        resp = self.client.get(
+            RECIPES_URL,
+            {'ingredients': f'{ingredient1.id},{ingredient2.id}'}
+        )
+
+        serializer1 = RecipesSerializer(recipe1)
+        serializer2 = RecipesSerializer(recipe2)
+        serializer3 = RecipesSerializer(recipe3)
+        self.assertIn(serializer1.data, resp.data['results'])
+        self.assertIn(serializer2.data, resp.data['results'])
+        self.assertNotIn(serializer3.data, resp.data['results'])
+
+    def test_filter_recipes_not_duplicated(self):
+        """test a recipe matching several tags is only returned once"""
+        recipe = sample_recipe(user=self.user)
+        tag1 = sample_tag(user=self.user, name='vegan')
+        tag2 = sample_tag(user=self.user, name='quick')
+        recipe.tags.add(tag1, tag2)
+
+        resp = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        self.assertEqual(len(resp.data['results']), 1)
+        self.assertEqual(resp.data['results'][0]['id'], recipe.id)
+
+    def test_filter_recipes_match_all(self):
+        """test match=all only returns recipes with every given tag"""
+        recipe1 = sample_recipe(user=self.user, title='vegan curry')
+        recipe2 = sample_recipe(user=self.user, title='vegan cake')
+        tag1 = sample_tag(user=self.user, name='vegan')
+        tag2 = sample_tag(user=self.user, name='spicy')
+        recipe1.tags.add(tag1, tag2)
+        recipe2.tags.add(tag1)
+
+        resp = self.client.get(
+            RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'})
+
+        self.assertEqual(len(resp.data['results']), 1)
+        self.assertEqual(resp.data['results'][0]['id'], recipe1.id)
+
+    def test_filter_recipes_by_tags_and_ingredients(self):
+        """test tag and ingredient filters must both match"""
+        tag = sample_tag(user=self.user, name='dinner')
+        ingredient = sample_ingredient(user=self.user, name='rice')
+        recipe1 = sample_recipe(user=self.user, title='risotto')
+        recipe1.tags.add(tag)
+        recipe1.ingredients.add(ingredient)
+        recipe2 = sample_recipe(user=self.user, title='steak')
+        recipe2.tags.add(tag)
+
+        resp = self.client.get(
+            RECIPES_URL, {'tags': tag.id, 'ingredients': ingredient.id})
+
+        self.assertEqual(len(resp.data['results']), 1)
+        self.assertEqual(resp.data['results'][0]['id'], recipe1.id)
+
+    def test_filter_recipes_invalid_ids(self):
+        """test filtering with ids that are not integers fails"""
+        resp = self.client.get(RECIPES_URL, {'tags': '1,abc'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_recipes_invalid_match(self):
+        """test filtering with an unknown match mode fails"""
+        resp = self.client.get(RECIPES_URL, {'tags': '1', 'match': 'some'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_recipes(self):
+        """test searching recipe titles, tags and ingredients"""
+        soup = sample_recipe(user=self.user, title='Tomato soup')
+        salad = sample_recipe(user=self.user, title='Green salad')
+        salad.ingredients.add(sample_ingredient(user=self.user,
+                                                name='tomato'))
+        pasta = sample_recipe(user=self.user, title='Pasta')
+        pasta.tags.add(sample_tag(user=self.user, name='tomato sauce'))
+        sample_recipe(user=self.user, title='Steak')
+        other_user = get_user_model().objects.create_user(
+            'other@gmail.com', 'testpass')
+        sample_recipe(user=other_user, title='Tomato pie')
+
+        resp = self.client.get(RECIPES_URL, {'search': 'TOMATO'})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        ids = [recipe['id'] for recipe in resp.data['results']]
+        self.assertEqual(ids[0], soup.id)
+        self.assertEqual(set(ids), {soup.id, salad.id, pasta.id})
+
+    def test_search_recipes_every_word(self):
+        """test only recipes containing every searched word are returned"""
+        recipe = sample_recipe(user=self.user, title='Tomato soup')
+        sample_recipe(user=self.user, title='Tomato salad')
+
+        resp = self.client.get(RECIPES_URL, {'search': 'soup tomato'})
+
+        self.assertEqual([r['id'] for r in resp.data['results']],
+                         [recipe.id])
+
+    def test_search_recipes_follows_changes(self):
+        """test renamed, removed and deleted tags are reflected"""
+        recipe = sample_recipe(user=self.user, title='Pancakes')
+        tag = sample_tag(user=self.user, name='breakfast')
+        other = sample_tag(user=self.user, name='brunch')
+        recipe.tags.add(tag, other)
+
+        tag.name = 'dessert'
+        tag.save()
+        resp = self.client.get(RECIPES_URL, {'search': 'dessert'})
+        self.assertEqual(len(resp.data['results']), 1)
+        resp = self.client.get(RECIPES_URL, {'search': 'breakfast'})
+        self.assertEqual(len(resp.data['results']), 0)
+
+        recipe.tags.remove(tag)
+        resp = self.client.get(RECIPES_URL, {'search': 'dessert'})
+        self.assertEqual(len(resp.data['results']), 0)
+
+        other.delete()
+        resp = self.client.get(RECIPES_URL, {'search': 'brunch'})
+        self.assertEqual(len(resp.data['results']), 0)
+
+    def test_search_recipes_paginated(self):
+        """test search results are paginated in rank order"""
+        for i in range(5):
+            sample_recipe(user=self.user, title=f'soup {i}')
+        first = self.client.get(RECIPES_URL,
+                                {'search': 'soup', 'page_size': 3})
+        second = self.client.get(first.data['next'])
+
+        ids = [r['id'] for r in first.data['results'] +
+               second.data['results']]
+        self.assertEqual(len(ids), 5)
+        self.assertEqual(len(set(ids)), 5)
+        self.assertIsNone(second.data['next'])
+
+    def test_search_recipes_pages_complete(self):
+        """test walking search pages with tied and distinct ranks returns
+        every match once"""
+        tag = sample_tag(user=self.user, name='soup')
+        expected = set()
+        for i in range(9):
+            recipe = sample_recipe(user=self.user,
+                                   title=f'soup {"thick " * (i % 3)}{i}')
+            if i % 2:
+                recipe.tags.add(tag)
+            expected.add(recipe.id)
+
+        ids, url = [], RECIPES_URL
+        params = {'search': 'soup', 'page_size': 2}
+        while url:
+            resp = self.client.get(url, params)
+            ids += [r['id'] for r in resp.data['results']]
+            url, params = resp.data['next'], None
+
+        self.assertEqual(len(ids), len(expected))
+        self.assertEqual(set(ids), expected)
+
+    def test_search_recipes_too_long(self):
+        """test overly long search queries are rejected"""
+        resp = self.client.get(RECIPES_URL, {'search': 'a' * 256})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_recipes_paginated_by_cursor(self):
+        """test walking the recipe list forwards and back with cursors"""
+        recipes = [sample_recipe(user=self.user, title=f'recipe {i}')
+                   for i in range(5)]
+        ids = [recipe.id for recipe in reversed(recipes)]
+
+        resp = self.client.get(RECIPES_URL, {'page_size': 2})
+        self.assertEqual([r['id'] for r in resp.data['results']], ids[:2])
+        self.assertIsNone(resp.data['previous'])
+
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual([r['id'] for r in resp.data['results']], ids[2:4])
+
+        resp = self.client.get(resp.data['next'])
+        self.assertEqual([r['id'] for r in resp.data['results']], ids[4:])
+        self.assertIsNone(resp.data['next'])
+
+        resp = self.client.get(resp.data['previous'])
+        self.assertEqual([r['id'] for r in resp.data['results']], ids[2:4])
+
+    def test_recipes_page_size_capped(self):
+        """test the requested page size is capped"""
+        for i in range(3):
+            sample_recipe(user=self.user)
+        with patch.object(KeysetPagination, 'max_page_size', 2):
+            resp = self.client.get(RECIPES_URL, {'page_size': 50})
+        self.assertEqual(len(resp.data['results']), 2)
+        self.assertIsNotNone(resp.data['next'])
+
+    def test_recipes_tampered_cursor(self):
+        """test a cursor that was not issued by the API is rejected"""
+        sample_recipe(user=self.user)
+        sample_recipe(user=self.user)
+        resp = self.client.get(RECIPES_URL, {'page_size': 1})
+        cursor = parse_qs(urlparse(resp.data['next']).query)['cursor'][0]
+
+        resp = self.client.get(RECIPES_URL, {'cursor': cursor[:-1] + 'x'})
+
+        self.assertEqual(resp.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_recipes_query_count(self):
+        """test listing recipes does not query once per recipe"""
+        for i in range(5):
+            recipe = sample_recipe(user=self.user)
+            recipe.tags.add(sample_tag(user=self.user, name=f'tag {i}'))
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'ingredient {i}'))
+
+        resp = self.assertRequestQueries(4, 'get', RECIPES_URL)
+
+        self.assertEqual(len(resp.data['results']), 5)
+        for recipe in resp.data['results']:
+            self.assertEqual(len(recipe['tags']), 1)
+            self.assertEqual(len(recipe['ingredients']), 1)
+
+    def test_list_recipes_sparse_fields(self):
+        """test only the requested fields are rendered and selected"""
+        recipe = sample_recipe(user=self.user, link='https://example.com')
+        recipe.tags.add(sample_tag(user=self.user))
+
+        with CaptureQueriesContext(connection) as context:
+            resp = self.client.get(
+                RECIPES_URL, {'fields': 'id,title,time_minutes'})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['results'], [{
+            'id': recipe.id, 'title': recipe.title,
+            'time_minutes': recipe.time_minutes,
+        }])
+        # the ETag aggregate and the page, no prefetch of tags or
+        # ingredients and no unused columns
+        self.assertEqual(len(context.captured_queries), 2)
+        for query in context.captured_queries:
+            self.assertNotIn('"link"', query['sql'])
+
+    def test_list_recipes_exclude_fields(self):
+        """test excluded fields are left out"""
+        sample_recipe(user=self.user)
+
+        resp = self.client.get(RECIPES_URL, {'exclude': 'tags,ingredients'})
+
+        self.assertEqual(set(resp.data['results'][0]),
+                         {'id', 'title', 'time_minutes', 'price', 'link'})
+
+    def test_list_recipes_unknown_fields(self):
+        """test asking for fields the serializer does not have fails"""
+        resp = self.client.get(RECIPES_URL, {'fields': 'id,user'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+        resp = self.client.get(RECIPES_URL, {'exclude': 'nope'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_recipe_sparse_fields(self):
+        """test viewing only some fields of a recipe detail"""
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(sample_tag(user=self.user))
+
+        resp = self.assertRequestQueries(
+            3, 'get', detail_url(recipe.id), {'fields': 'title,tags'})
+
+        self.assertEqual(set(resp.data), {'title', 'tags'})
+        self.assertEqual(resp.data['tags'][0]['name'], 'main course')
+
+    def test_list_recipes_fast_path_identical(self):
+        """test the values() list path renders the serializer's JSON"""
+        tags = [sample_tag(user=self.user, name=f'tag {i}') for i in range(3)]
+        for i in range(4):
+            recipe = sample_recipe(user=self.user, title=f'soup {i}',
+                                   price='4.5', link=f'link {i}')
+            recipe.tags.add(*tags[i:])
+            recipe.ingredients.add(
+                sample_ingredient(user=self.user, name=f'ingredient {i}'))
+        sample_recipe(user=self.user, title='bare soup')
+
+        for params in ({}, {'page_size': 2}, {'search': 'soup'},
+                       {'fields': 'title,tags,price'}):
+            cache.clear()
+            fast = self.client.get(RECIPES_URL, params)
+            cache.clear()
+            with patch.object(RecipesViewSet, 'fast_list', False):
+                slow = self.client.get(RECIPES_URL, params)
+            self.assertEqual(fast.status_code, status.HTTP_200_OK)
+            self.assertEqual(fast.content, slow.content)
+
+    def test_list_recipes_streamed(self):
+        """test streaming every recipe as one page in chunks"""
+        tag = sample_tag(user=self.user)
+        for i in range(5):
+            recipe = sample_recipe(user=self.user, title=f'recipe {i}')
+            recipe.tags.add(tag)
+        page = self.client.get(RECIPES_URL)
+
+        with patch.object(RecipesViewSet, 'stream_chunk_size', 2):
+            resp = self.client.get(RECIPES_URL, {'format': 'json-stream'})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertTrue(resp.streaming)
+        self.assertEqual(resp['Content-Type'], 'application/json')
+        self.assertEqual(b''.join(resp.streaming_content), page.content)
+
+    def test_retrieve_recipe_query_count(self):
+        """test viewing a recipe detail fetches each relation once"""
+        recipe = sample_recipe(user=self.user)
+        recipe.tags.add(sample_tag(user=self.user, name='vegan'),
+                        sample_tag(user=self.user, name='quick'))
+        recipe.ingredients.add(sample_ingredient(user=self.user))
+        for width in (320, 1024):
+            RecipeImageRendition.objects.create(
+                recipe=recipe, width=width, format='jpg',
+                image=f'uploads/recipes/renditions/test-{width}.jpg')
+
+        resp = self.assertRequestQueries(5, 'get', detail_url(recipe.id))
+
+        self.assertEqual(len(resp.data['tags']), 2)
+        self.assertEqual(len(resp.data['ingredients']), 1)
+        self.assertEqual(len(resp.data['renditions']), 2)
+
+
+class RecipeResponseCacheTests(QueryCountMixin, NPlusOneMixin, TestCase):
+    """test caching of recipe list and detail responses"""
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+        response_cache.reset_stats()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'cache@asdf.com', 'asdfasdf')
+        self.client.force_authenticate(self.user)
+
+    def test_list_served_from_cache(self):
+        """test repeating a list request does not query the database"""
+        sample_recipe(user=self.user)
+        first = self.client.get(RECIPES_URL)
+
+        second = self.assertRequestQueries(0, 'get', RECIPES_URL)
+
+        self.assertEqual(first['X-Cache'], 'miss')
+        self.assertEqual(second['X-Cache'], 'hit')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(response_cache.stats(), {'hits': 1, 'misses': 1})
+
+    def test_query_params_cached_separately(self):
+        """test different filters are not served the same entry"""
+        tag = sample_tag(user=self.user)
+        sample_recipe(user=self.user).tags.add(tag)
+        sample_recipe(user=self.user)
+
+        self.client.get(RECIPES_URL)
+        resp = self.client.get(RECIPES_URL, {'tags': tag.id})
+
+        self.assertEqual(resp['X-Cache'], 'miss')
+        self.assertEqual(len(resp.data['results']), 1)
+
+    def test_create_invalidates_list(self):
+        """test creating a recipe evicts the cached list"""
+        self.client.get(RECIPES_URL)
+        sample_recipe(user=self.user)
+
+        resp = self.client.get(RECIPES_URL)
+
+        self.assertEqual(resp['X-Cache'], 'miss')
+        self.assertEqual(len(resp.data['results']), 1)
+
+    def test_tag_change_invalidates_detail(self):
+        """test renaming a tag evicts cached recipe details"""
+        recipe = sample_recipe(user=self.user)
+        tag = sample_tag(user=self.user, name='vegan')
+        recipe.tags.add(tag)
+        self.client.get(detail_url(recipe.id))
+        tag.name = 'vegetarian'
+        tag.save()
+
+        resp = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(resp['X-Cache'], 'miss')
+        self.assertEqual(resp.data['tags'][0]['name'], 'vegetarian')
+
+    def test_recipe_tags_change_invalidates_list(self):
+        """test adding a tag to a recipe evicts the cached list"""
+        recipe = sample_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        recipe.tags.add(sample_tag(user=self.user))
+
+        resp = self.client.get(RECIPES_URL)
+
+        self.assertEqual(resp['X-Cache'], 'miss')
+        self.assertEqual(len(resp.data['results'][0]['tags']), 1)
+
+    @override_settings(ALLOWED_HOSTS=['one.example', 'two.example'])
+    def test_cache_limited_to_host(self):
+        """test links built for one host are not served to another"""
+        for _ in range(3):
+            sample_recipe(user=self.user)
+        self.client.get(RECIPES_URL, {'page_size': 1},
+                        HTTP_HOST='one.example')
+
+        resp = self.client.get(RECIPES_URL, {'page_size': 1},
+                               HTTP_HOST='two.example', secure=True)
+
+        self.assertEqual(resp['X-Cache'], 'miss')
+        self.assertTrue(
+            resp.data['next'].startswith('https://two.example/'))
+
+    def test_cache_limited_to_user(self):
+        """test a cached list is not served to another user"""
+        sample_recipe(user=self.user)
+        self.client.get(RECIPES_URL)
+        user2 = get_user_model().objects.create_user(
+            'other@asdf.com', 'asdfasdf')
+        self.client.force_authenticate(user2)
+
+        resp = self.client.get(RECIPES_URL)
+
+        self.assertEqual(resp['X-Cache'], 'miss')
+        self.assertEqual(len(resp.data['results']), 0)
+
+
+class RecipeConditionalRequestTests(QueryCountMixin, NPlusOneMixin, TestCase):
+    """test ETag and Last-Modified handling of recipes"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'etag@asdf.com', 'asdfasdf')
+        self.client.force_authenticate(self.user)
+
+    def test_unchanged_list_not_modified(self):
+        """test a current list is answered with 304 from the cache"""
+        sample_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        resp = self.assertRequestQueries(
+            0, 'get', RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(resp['ETag'], etag)
+        self.assertEqual(resp.content, b'')
+
+    def test_unchanged_list_not_modified_uncached(self):
+        """test a current list is answered with 304 without a cache"""
+        sample_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+        cache.clear()
+
+        resp = self.assertRequestQueries(
+            1, 'get', RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_changed_list_etag(self):
+        """test adding a tag, deleting and filtering change the ETag"""
+        recipe = sample_recipe(user=self.user)
+        other = sample_recipe(user=self.user)
+        etags = [self.client.get(RECIPES_URL)['ETag']]
+
+        recipe.tags.add(sample_tag(user=self.user))
+        etags.append(self.client.get(RECIPES_URL)['ETag'])
+        other.delete()
+        etags.append(self.client.get(RECIPES_URL)['ETag'])
+        etags.append(self.client.get(RECIPES_URL, {'page_size': 1})['ETag'])
+
+        self.assertEqual(len(set(etags)), len(etags))
+        resp = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_detail_validators(self):
+        """test details carry Last-Modified and follow tag renames"""
+        recipe = sample_recipe(user=self.user)
+        tag = sample_tag(user=self.user)
+        recipe.tags.add(tag)
+        first = self.client.get(detail_url(recipe.id))
+        self.assertIn('Last-Modified', first)
+
+        resp = self.client.get(detail_url(recipe.id),
+                               HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        tag.name = 'starter'
+        tag.save()
+        resp = self.client.get(detail_url(recipe.id),
+                               HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(resp.data['tags'][0]['name'], 'starter')
+
+    def test_update_if_match(self):
+        """test updates with a current ETag succeed and return a new one"""
+        recipe = sample_recipe(user=self.user)
+        etag = self.client.get(detail_url(recipe.id))['ETag']
+
+        resp = self.client.patch(detail_url(recipe.id), {'title': 'new'},
+                                 HTTP_IF_MATCH=etag)
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(resp['ETag'], etag)
+        self.assertEqual(self.client.get(detail_url(recipe.id))['ETag'],
+                         resp['ETag'])
+
+    def test_update_stale_if_match(self):
+        """test updating a recipe that changed since it was read fails"""
+        recipe = sample_recipe(user=self.user, title='old')
+        etag = self.client.get(detail_url(recipe.id))['ETag']
+        recipe.tags.add(sample_tag(user=self.user))
+
+        resp = self.client.put(detail_url(recipe.id), {
+            'title': 'new', 'time_minutes': 5, 'price': '1.00',
+            'tags': [], 'ingredients': [],
+        }, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(resp.status_code,
+                         status.HTTP_412_PRECONDITION_FAILED)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'old')
+
+        resp = self.client.delete(detail_url(recipe.id), HTTP_IF_MATCH=etag)
+        self.assertEqual(resp.status_code,
+                         status.HTTP_412_PRECONDITION_FAILED)
+        self.assertTrue(Recipes.objects.filter(id=recipe.id).exists())
+
+
+@override_settings(SYNC_SETTLE_SECONDS=0)
+class RecipeSyncAPITests(NPlusOneMixin, TestCase):
+    """test incremental sync of recipes, tags and ingredients"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'sync@asdf.com', 'asdfasdf')
+        self.client.force_authenticate(self.user)
+        self.tag = sample_tag(self.user)
+        self.recipe = sample_recipe(self.user)
+        self.recipe.tags.add(self.tag)
+
+    def test_sync_full(self):
+        """test a sync without a token returns everything"""
+        sample_recipe(get_user_model().objects.create_user(
+            'other@asdf.com', 'asdfasdf'))
+
+        resp = self.client.get(SYNC_URL)
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertFalse(resp.data['more'])
+        self.assertEqual(resp.data['recipes']['changed'],
+                         RecipesSerializer([self.recipe], many=True).data)
+        self.assertEqual(resp.data['tags']['changed'],
+                         [{'id': self.tag.id, 'name': self.tag.name}])
+        self.assertEqual(resp.data['ingredients'],
+                         {'changed': [], 'deleted': []})
+
+    def test_sync_changes(self):
+        """test a sync with a token returns changes and tombstones"""
+        untouched = sample_recipe(self.user, title='untouched')
+        token = self.client.get(SYNC_URL).data['token']
+        self.recipe.title = 'changed'
+        self.recipe.save()
+        self.recipe.title = 'changed again'
+        self.recipe.save()
+        ingredient = sample_ingredient(self.user)
+        tag_id = self.tag.id
+        self.tag.delete()
+
+        resp = self.client.get(SYNC_URL, {'since': token})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(resp.data['recipes'], {
+            'changed': RecipesSerializer([self.recipe], many=True).data,
+            'deleted': [],
+        })
+        self.assertEqual(resp.data['recipes']['changed'][0]['tags'], [])
+        self.assertNotIn(untouched.id, [
+            recipe['id'] for recipe in resp.data['recipes']['changed']])
+        self.assertEqual(resp.data['tags'],
+                         {'changed': [], 'deleted': [tag_id]})
+        self.assertEqual(resp.data['ingredients']['changed'],
+                         [{'id': ingredient.id, 'name': ingredient.name}])
+
+        resp = self.client.get(SYNC_URL, {'since': resp.data['token']})
+        for kind in ('recipes', 'tags', 'ingredients'):
+            self.assertEqual(resp.data[kind], {'changed': [], 'deleted': []})
+
+    def test_sync_bulk_changes(self):
+        """test recipes written in bulk are synced"""
+        token = self.client.get(SYNC_URL).data['token']
+        self.client.post(BULK_URL, [{'title': 'bulk', 'time_minutes': 5,
+                                     'price': '1.00'}], format='json')
+        self.client.patch(BULK_URL, [{'id': self.recipe.id, 'title': 'new'}],
+                          format='json')
+
+        resp = self.client.get(SYNC_URL, {'since': token})
+
+        self.assertEqual(
+            sorted(recipe['title']
+                   for recipe in resp.data['recipes']['changed']),
+            ['bulk', 'new'])
+
+    @override_settings(SYNC_MAX_CHANGES=2)
+    def test_sync_more(self):
+        """test large deltas are returned over several responses"""
+        token = self.client.get(SYNC_URL).data['token']
+        recipes = [sample_recipe(self.user, title=f'recipe {i}')
+                   for i in range(3)]
+
+        resp = self.client.get(SYNC_URL, {'since': token})
+        self.assertTrue(resp.data['more'])
+        first = resp.data['recipes']['changed']
+        resp = self.client.get(SYNC_URL, {'since': resp.data['token']})
+        self.assertFalse(resp.data['more'])
+
+        self.assertEqual(
+            [recipe['id'] for recipe in
+             first + resp.data['recipes']['changed']],
+            [recipe.id for recipe in recipes])
 
-class RecipeImageUploadTests(TestCase):
+    @override_settings(SYNC_MAX_CHANGES=2, SYNC_SETTLE_SECONDS=60)
+    def test_sync_more_recent_changes_resent(self):
+        """test paging does not pass changes that may be overtaken"""
+        ChangeLog.objects.update(
+            created_at=timezone.now() - timedelta(hours=1))
+        token = self.client.get(SYNC_URL).data['token']
+        recipes = [sample_recipe(self.user, title=f'recipe {i}')
+                   for i in range(3)]
+
+        resp = self.client.get(SYNC_URL, {'since': token})
+        self.assertFalse(resp.data['more'])
+        self.assertEqual(len(resp.data['recipes']['changed']), 2)
+        self.assertEqual(sync.read_token(self.user, resp.data['token']),
+                         sync.read_token(self.user, token))
+
+        with override_settings(SYNC_SETTLE_SECONDS=0):
+            changed = []
+            more = True
+            while more:
+                resp = self.client.get(SYNC_URL, {'since': token})
+                token, more = resp.data['token'], resp.data['more']
+                changed += resp.data['recipes']['changed']
+        self.assertEqual([recipe['id'] for recipe in changed],
+                         [recipe.id for recipe in recipes])
+
+    @override_settings(SYNC_SETTLE_SECONDS=60)
+    def test_sync_recent_changes_resent(self):
+        """test the token does not pass changes that may be overtaken"""
+        token = self.client.get(SYNC_URL).data['token']
+        self.recipe.save()
+
+        resp = self.client.get(SYNC_URL, {'since': token})
+        self.assertEqual(len(resp.data['recipes']['changed']), 1)
+        resp = self.client.get(SYNC_URL, {'since': resp.data['token']})
+        self.assertEqual(len(resp.data['recipes']['changed']), 1)
+
+    def test_sync_token_invalid(self):
+        """test tokens that were tampered with or not issued are refused"""
+        token = self.client.get(SYNC_URL).data['token']
+        other = get_user_model().objects.create_user(
+            'other@asdf.com', 'asdfasdf')
+        self.client.force_authenticate(other)
+
+        for since in (token, token + 'x', 'garbage'):
+            resp = self.client.get(SYNC_URL, {'since': since})
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_sync_token_expired(self):
+        """test tokens older than the retention period are gone"""
+        token = self.client.get(SYNC_URL).data['token']
+        later = time.time() + (settings.SYNC_RETENTION_DAYS + 1) * 86400
+
+        with patch('time.time', return_value=later):
+            resp = self.client.get(SYNC_URL, {'since': token})
+
+        self.assertEqual(resp.status_code, status.HTTP_410_GONE)
+
+
+class RecipeBulkAPITests(NPlusOneMixin, TestCase):
+    """test creating, updating and deleting recipes in bulk"""
+
+    # backends that cannot return ids from a bulk insert save new
+    # recipes one at a time
+    allowed_repeated_queries = () \
+        if connection.features.can_return_ids_from_bulk_insert \
+        else (r'^INSERT INTO "core_recipes" ',)
 
     def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'bulk@asdf.com', 'asdfasdf')
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create_recipes(self):
+        """test creating several recipes with tags and ingredients"""
+        tag = sample_tag(user=self.user)
+        ingredient = sample_ingredient(user=self.user)
+        payload = [
+            {'title': 'soup', 'time_minutes': 20, 'price': '3.00',
+             'tags': [tag.id], 'ingredients': [ingredient.id]},
+            {'title': 'salad', 'time_minutes': 5, 'price': '2.50'},
+        ]
+
+        resp = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([r['index'] for r in resp.data], [0, 1])
+        soup = Recipes.objects.get(id=resp.data[0]['id'])
+        self.assertEqual(soup.user, self.user)
+        self.assertEqual(list(soup.tags.all()), [tag])
+        self.assertEqual(list(soup.ingredients.all()), [ingredient])
+        salad = Recipes.objects.get(id=resp.data[1]['id'])
+        self.assertEqual(salad.title, 'salad')
+
+    def test_bulk_create_reports_item_errors(self):
+        """test invalid items are reported and valid ones still created"""
+        user2 = get_user_model().objects.create_user(
+            'other@asdf.com', 'asdfasdf')
+        other_tag = sample_tag(user=user2)
+        payload = [
+            {'title': 'soup', 'time_minutes': 20, 'price': '3.00'},
+            {'title': 'salad'},
+            {'title': 'stew', 'time_minutes': 90, 'price': '8.00',
+             'tags': [other_tag.id]},
+        ]
+
+        resp = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertIn('id', resp.data[0])
+        self.assertIn('time_minutes', resp.data[1]['errors'])
+        self.assertIn('tags', resp.data[2]['errors'])
+        self.assertEqual(Recipes.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_create_checks_ownership_once(self):
+        """test related ids of the whole batch are checked in one query"""
+        tags = [sample_tag(user=self.user, name=f'tag {i}') for i in range(3)]
+        payload = [
+            {'title': f'recipe {i}', 'time_minutes': 5, 'price': '1.00',
+             'tags': [tag.id for tag in tags]}
+            for i in range(10)
+        ]
+
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(BULK_URL, payload, format='json')
+
+        tag_lookups = [
+            query for query in context.captured_queries
+            if query['sql'].startswith('SELECT') and
+            'FROM "core_tags"' in query['sql']
+        ]
+        self.assertEqual(len(tag_lookups), 1)
+
+    def test_bulk_update_recipes(self):
+        """test updating several recipes and replacing their tags"""
+        recipe1 = sample_recipe(user=self.user, title='soup')
+        recipe2 = sample_recipe(user=self.user, title='salad')
+        recipe1.tags.add(sample_tag(user=self.user))
+        new_tag = sample_tag(user=self.user, name='new')
+        payload = [
+            {'id': recipe1.id, 'title': 'tomato soup', 'tags': [new_tag.id]},
+            {'id': recipe2.id, 'time_minutes': 7},
+        ]
+
+        resp = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        recipe1.refresh_from_db()
+        recipe2.refresh_from_db()
+        self.assertEqual(recipe1.title, 'tomato soup')
+        self.assertEqual(list(recipe1.tags.all()), [new_tag])
+        self.assertEqual(recipe2.title, 'salad')
+        self.assertEqual(recipe2.time_minutes, 7)
+
+    def test_bulk_update_other_users_recipe(self):
+        """test recipes of other users can not be updated"""
+        user2 = get_user_model().objects.create_user(
+            'other@asdf.com', 'asdfasdf')
+        recipe = sample_recipe(user=user2, title='soup')
+
+        resp = self.client.patch(
+            BULK_URL, [{'id': recipe.id, 'title': 'mine'}], format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'soup')
+
+    def test_bulk_update_same_recipe_twice(self):
+        """test a batch naming a recipe twice is rejected as a whole"""
+        recipe = sample_recipe(user=self.user, title='soup')
+        tag1 = sample_tag(user=self.user, name='tag 1')
+        tag2 = sample_tag(user=self.user, name='tag 2')
+
+        for tags in ([tag1.id], [tag2.id]):
+            payload = [
+                {'id': recipe.id, 'title': 'stew', 'tags': [tag1.id]},
+                {'id': recipe.id, 'title': 'curry', 'tags': tags},
+            ]
+            resp = self.client.patch(BULK_URL, payload, format='json')
+
+            self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn(str(recipe.id), resp.data['non_field_errors'][0])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'soup')
+        self.assertFalse(recipe.tags.exists())
+
+    def test_bulk_delete_recipes(self):
+        """test deleting several recipes, skipping unknown ids"""
+        recipe1 = sample_recipe(user=self.user)
+        recipe2 = sample_recipe(user=self.user)
+        user2 = get_user_model().objects.create_user(
+            'other@asdf.com', 'asdfasdf')
+        recipe3 = sample_recipe(user=user2)
+
+        resp = self.client.delete(
+            BULK_URL, [recipe1.id, recipe2.id, recipe3.id], format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertFalse(Recipes.objects.filter(user=self.user).exists())
+        self.assertTrue(Recipes.objects.filter(id=recipe3.id).exists())
+        self.assertIn('errors', resp.data[2])
+
+    def test_bulk_delete_rejects_booleans(self):
+        """test true is not taken for the id 1"""
+        recipe = sample_recipe(user=self.user)
+
+        resp = self.client.delete(BULK_URL, [True], format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Recipes.objects.filter(id=recipe.id).exists())
+
+    @patch('django.conf.settings.RECIPES_BULK_MAX_ITEMS', 2)
+    def test_bulk_too_many_items(self):
+        """test batches above the configured size are rejected"""
+        payload = [{'title': 'soup', 'time_minutes': 5, 'price': '1.00'}] * 3
+
+        resp = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipes.objects.exists())
+
+
+@override_settings(RECIPE_IMAGE_WORKERS=0)
+class RecipeImageUploadTests(NPlusOneMixin, TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.media = override_settings(MEDIA_ROOT=self.media_root)
+        self.media.enable()
         self.client = APIClient()
         self.user = get_user_model().objects.create_user('asdf@azdsf.com', 'asdfasdfasdf')
         self.client.force_authenticate(self.user)
         self.recipe = sample_recipe(user=self.user)
 
     def tearDown(self):
-        self.recipe.image.delete()
+        self.media.disable()
+        shutil.rmtree(self.media_root)
 
     def test_upload_image_to_recipe(self):
         """test uploading an image to a recipe"""
@@ -196,83 +1100,175 @@ class RecipeImageUploadTests(TestCase):
         resp = self.client.post(url, {'image': 'notimage'}, format='multipart')
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
 
-    # def test_filter_recipes_by_tags(self):
-    #     """returning recipes with specific tags"""
-    #     recipe1 = sample_recipe(user=self.user, title='vegetable curry')
-    #     recipe2 = sample_recipe(user=self.user, title='aubergine with tahini')
-    #     tag1 = sample_tag(user=self.user, name='vegan')
-    #     tag2 = sample_tag(user=self.user, name='vegetarian')
-    #     recipe1.tags.add(tag1)
-    #     recipe2.tags.add(tag2)
-    #     recipe3 = sample_recipe(user=self.user, title='fish and chips')
-    #     resp = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
-    #     serializer1 = RecipesSerializer(recipe1)
-    #     serializer2 = RecipesSerializer(recipe2)
-    #     serializer3 = RecipesSerializer(recipe3)
-    #     self.assertIn(serializer1.data, resp.data)
-    #     self.assertIn(serializer2.data, resp.data)
-    #     self.assertNotIn(serializer3.data, resp.data)
-    #
-    # def test_filter_recipes_by_ingredients(self):
-    #     """test returning specific recipes by ingredients"""
-    #     recipe1 = sample_recipe(user=self.user, title='posh beans on toast')
-    #     recipe2 = sample_recipe(user=self.user, title='chicken cachitorri')
-    #     ingredient1 = sample_ingredient(user=self.user, name='feta cheese')
-    #     ingredient2 = sample_ingredient(user=self.user, name='chicken')
-    #     recipe1.ingredients.add(ingredient1)
-    #     recipe2.ingredients.add(ingredient2)
-    #     recipe3 = sample_recipe(user=self.user, title='steak and mushrooms')
-    #     resp = self.client.get(
-    #         RECIPES_URL, {'ingredients': f'{ingredient1.id},{ingredient2.id}'})
-    #     serializer1 = RecipesSerializer(recipe1)
-    #     serializer2 = RecipesSerializer(recipe2)
-    #     serializer3 = RecipesSerializer(recipe3)
-    #     self.assertIn(serializer1.data, resp.data)
-    #     self.assertIn(serializer2.data, resp.data)
-    #     self.assertNotIn(serializer3.data, resp.data)
-
-
-def test_filter_recipes_by_tags(self):
-    """Test returning recipes with specific tags"""
-    recipe1 = sample_recipe(user=self.user, title='Thai vegetable curry')
-    recipe2 = sample_recipe(user=self.user, title='Aubergine with tahini')
-    tag1 = sample_tag(user=self.user, name='Vegan')
-    tag2 = sample_tag(user=self.user, name='Vegetarian')
-    recipe1.tags.add(tag1)
-    recipe2.tags.add(tag2)
-    recipe3 = sample_recipe(user=self.user, title='Fish and chips')
-
-    res = self.client.get(
-        RECIPES_URL,
-        {'tags': f'{tag1.id},{tag2.id}'}
-    )
-
-    serializer1 = RecipesSerializer(recipe1)
-    serializer2 = RecipesSerializer(recipe2)
-    serializer3 = RecipesSerializer(recipe3)
-    self.assertIn(serializer1.data, res.data)
-    self.assertIn(serializer2.data, res.data)
-    self.assertNotIn(serializer3.data, res.data)
-
-
-def test_filter_recipes_by_ingredients(self):
-    """Test returning recipes with specific ingredients"""
-    recipe1 = sample_recipe(user=self.user, title='Posh beans on toast')
-    recipe2 = sample_recipe(user=self.user, title='Chicken cacciatore')
-    ingredient1 = sample_ingredient(user=self.user, name='Feta cheese')
-    ingredient2 = sample_ingredient(user=self.user, name='Chicken')
-    recipe1.ingredients.add(ingredient1)
-    recipe2.ingredients.add(ingredient2)
-    recipe3 = sample_recipe(user=self.user, title='Steak and mushrooms')
-
-    res = self.client.get(
-        RECIPES_URL,
-        {'ingredients': f'{ingredient1.id},{ingredient2.id}'}
-    )
-
-    serializer1 = RecipesSerializer(recipe1)
-    serializer2 = RecipesSerializer(recipe2)
-    serializer3 = RecipesSerializer(recipe3)
-    self.assertIn(serializer1.data, res.data)
-    self.assertIn(serializer2.data, res.data)
-    self.assertNotIn(serializer3.data, res.data)
+    def test_upload_image_creates_renditions(self):
+        """test resized copies without metadata are recorded on the recipe"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            img = Image.new('RGB', (800, 400))
+            exif = Image.Exif()
+            exif[0x010f] = 'camera maker'
+            img.save(ntf, format='JPEG', exif=exif)
+            ntf.seek(0)
+            resp = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        widths = settings.RECIPE_IMAGE_RENDITION_WIDTHS
+        formats = [ext for _format, ext in images.rendition_formats()]
+        self.assertEqual(len(resp.data['renditions']),
+                         len(widths) * len(formats))
+        for rendition in self.recipe.renditions.all():
+            self.assertIn(rendition.format, formats)
+            with Image.open(rendition.image.path) as thumbnail:
+                self.assertEqual(thumbnail.width, min(rendition.width, 800))
+                self.assertNotIn('exif', thumbnail.info)
+
+        resp = self.client.get(detail_url(self.recipe.id))
+        self.assertEqual(len(resp.data['renditions']),
+                         len(widths) * len(formats))
+
+    def test_upload_image_pipeline_full(self):
+        """test uploads are turned away while the pipeline is full"""
+        url = image_upload_url(self.recipe.id)
+        with patch.object(images.pipeline, 'reserve', return_value=False):
+            resp = self.client.post(url, {'image': 'notimage'},
+                                    format='multipart')
+
+        self.assertEqual(resp.status_code,
+                         status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', resp)
+
+    def _upload(self):
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as ntf:
+            Image.new('RGB', (40, 30)).save(ntf, format='PNG')
+            ntf.seek(0)
+            return self.client.post(url, {'image': ntf}, format='multipart')
+
+    @override_settings(RECIPE_IMAGE_WORKERS=1, RECIPE_IMAGE_MAX_PENDING=1)
+    def test_upload_image_failed_save_releases_slot(self):
+        """test an upload failing to save gives its slot back"""
+        pipeline = images.ImagePipeline()
+        with patch.object(images, 'pipeline', pipeline), \
+                patch('recipes.serializers.RecipeImageSerializer.save',
+                      side_effect=DatabaseError('gone')):
+            for _ in range(2):
+                with self.assertRaises(DatabaseError):
+                    self._upload()
+
+        self.assertTrue(pipeline.reserve())
+
+    @override_settings(RECIPE_IMAGE_WORKERS=1, RECIPE_IMAGE_MAX_PENDING=1)
+    def test_upload_image_rolled_back_releases_slot(self):
+        """test an upload whose transaction never commits gives its slot
+        back"""
+        pipeline = images.ImagePipeline()
+        with patch.object(images, 'pipeline', pipeline):
+            for _ in range(2):
+                resp = self._upload()
+                self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+        self.assertTrue(pipeline.reserve())
+
+    def _part_files(self):
+        directory = os.path.join(settings.MEDIA_ROOT, 'uploads/recipes')
+        if not os.path.isdir(directory):
+            return []
+        return [name for name in os.listdir(directory)
+                if name.endswith('.part')]
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=1024)
+    def test_upload_image_too_large(self):
+        """test images larger than the limit are rejected"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as ntf:
+            ntf.write(os.urandom(4096))
+            ntf.seek(0)
+            resp = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('larger than 1024 bytes', resp.data['image'][0])
+        self.assertFalse(self.recipe.renditions.exists())
+        self.assertEqual(self._part_files(), [])
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=100 * 100)
+    def test_upload_image_too_many_pixels(self):
+        """test images with more pixels than the limit are rejected"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as ntf:
+            Image.new('RGB', (200, 200)).save(ntf, format='PNG')
+            ntf.seek(0)
+            resp = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('pixels', resp.data['image'][0])
+        self.assertFalse(self.recipe.image)
+        self.assertEqual(self._part_files(), [])
+
+    def test_upload_image_not_an_image(self):
+        """test files that are not images are rejected"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as ntf:
+            ntf.write(b'not an image at all')
+            ntf.seek(0)
+            resp = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', resp.data)
+        self.assertEqual(self._part_files(), [])
+
+    def test_upload_image_moved_into_place(self):
+        """test streamed uploads are stored without leaving part files"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as ntf:
+            Image.new('RGB', (40, 30)).save(ntf, format='PNG')
+            ntf.seek(0)
+            resp = self.client.post(url, {'image': ntf}, format='multipart')
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        with Image.open(self.recipe.image.path) as image:
+            self.assertEqual(image.size, (40, 30))
+        self.assertEqual(self._part_files(), [])
+
+    def test_upload_image_extra_files_not_stored(self):
+        """test file fields besides the image leave no part files"""
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as ntf, \
+                tempfile.NamedTemporaryFile(suffix='.png') as extra:
+            for f in (ntf, extra):
+                Image.new('RGB', (40, 30)).save(f, format='PNG')
+                f.seek(0)
+            # the part file of a field before the image was orphaned
+            resp = self.client.post(url, {'other': extra, 'image': ntf},
+                                    format='multipart')
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._part_files(), [])
+
+
+class ImagePipelineTests(NPlusOneMixin, TestCase):
+    """test the background image pipeline"""
+
+    @override_settings(RECIPE_IMAGE_WORKERS=1, RECIPE_IMAGE_MAX_PENDING=2)
+    def test_reserve_bounded(self):
+        """test no more slots than configured can be reserved"""
+        pipeline = images.ImagePipeline()
+        self.assertTrue(pipeline.reserve())
+        self.assertTrue(pipeline.reserve())
+        self.assertFalse(pipeline.reserve())
+        pipeline.release()
+        self.assertTrue(pipeline.reserve())
+
+    @override_settings(RECIPE_IMAGE_WORKERS=1, RECIPE_IMAGE_MAX_PENDING=1)
+    def test_committed_work_dropped_when_full(self):
+        """test work queued after a commit never waits for a slot"""
+        pipeline = images.ImagePipeline()
+        self.assertTrue(pipeline.reserve())
+
+        with patch.object(images.ThreadPoolExecutor, 'submit') as submit, \
+                self.assertLogs('recipes.images', 'WARNING'):
+            pipeline._submit_committed(1)
+
+        submit.assert_not_called()
+        self.assertFalse(pipeline.reserve())
@@ -1,13 +1,19 @@
+from unittest.mock import patch
 from django.contrib.auth import get_user_model
+from django.db import connection
 from django.urls import reverse
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework import status
 from rest_framework.test import APIClient
 from core.models import Tags
+from core.tests.mixins import NPlusOneMixin, QueryCountMixin
 from recipes.serializers import TagsSerializer
+from recipes.views import TagsViewSet
 
 
 TAGS_URL = reverse('recipes:tags-list')
+TAGS_UPSERT_URL = reverse('recipes:tags-upsert')
 
 
 class PublicTagsAPITest(TestCase):
@@ -24,7 +30,7 @@ class PublicTagsAPITest(TestCase):
         self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateTagsAPITests(TestCase):
+class PrivateTagsAPITests(QueryCountMixin, NPlusOneMixin, TestCase):
     """test the authorized user tags API"""
 
     def setUp(self):
@@ -41,7 +47,7 @@ class PrivateTagsAPITests(TestCase):
         tags = Tags.objects.all().order_by('-name')
         serializer = TagsSerializer(tags, many=True)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(resp.data, serializer.data)
+        self.assertEqual(resp.data['results'], serializer.data)
 
     def test_tags_limited_to_user(self):
         """test tags returned are for authenticated user"""
@@ -54,8 +60,8 @@ class PrivateTagsAPITests(TestCase):
 
         resp = self.client.get(TAGS_URL)
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(resp.data), 1)
-        self.assertEqual(resp.data[0]['name'], tag.name)
+        self.assertEqual(len(resp.data['results']), 1)
+        self.assertEqual(resp.data['results'][0]['name'], tag.name)
 
     def test_create_tag_successful(self):
         """test creating a new tag"""
@@ -73,3 +79,123 @@ class PrivateTagsAPITests(TestCase):
         payload = {'name': ''}
         resp = self.client.post(TAGS_URL, payload)
         self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_tags_paginated_by_name(self):
+        """test walking the tag pages returns every tag once by name"""
+        for name in ('b', 'a', 'd', 'e', 'c'):
+            Tags.objects.create(user=self.user, name=name)
+
+        names = []
+        resp = self.client.get(TAGS_URL, {'page_size': 2})
+        names += [tag['name'] for tag in resp.data['results']]
+        while resp.data['next']:
+            resp = self.client.get(resp.data['next'])
+            names += [tag['name'] for tag in resp.data['results']]
+
+        self.assertEqual(names, ['e', 'd', 'c', 'b', 'a'])
+
+    def test_tags_cursor_bounds_leading_column(self):
+        """test later pages bound the name alone, for the index to range
+        over"""
+        for name in ('a', 'b', 'c'):
+            Tags.objects.create(user=self.user, name=name)
+        resp = self.client.get(TAGS_URL, {'page_size': 1})
+
+        with CaptureQueriesContext(connection) as context:
+            resp = self.client.get(resp.data['next'])
+
+        self.assertEqual([tag['name'] for tag in resp.data['results']], ['b'])
+        self.assertTrue(any('"core_tags"."name" <= ' in query['sql']
+                            for query in context.captured_queries))
+
+    def test_tags_sparse_fields(self):
+        """test listing only the requested tag fields"""
+        Tags.objects.create(user=self.user, name='vegan')
+
+        resp = self.client.get(TAGS_URL, {'fields': 'name'})
+
+        self.assertEqual(resp.data['results'], [{'name': 'vegan'}])
+
+    def test_tags_fast_path_identical(self):
+        """test the values() list path renders the serializer's JSON"""
+        for name in ('vegan', 'quick', 'dessert'):
+            Tags.objects.create(user=self.user, name=name)
+
+        fast = self.client.get(TAGS_URL, {'page_size': 2})
+        with patch.object(TagsViewSet, 'fast_list', False):
+            slow = self.client.get(TAGS_URL, {'page_size': 2})
+
+        self.assertEqual(fast.content, slow.content)
+
+    def test_tags_streamed_empty(self):
+        """test streaming a user without tags renders an empty page"""
+        resp = self.client.get(TAGS_URL, {'format': 'json-stream'})
+
+        self.assertEqual(b''.join(resp.streaming_content),
+                         b'{"next":null,"previous":null,"results":[]}')
+
+    def test_tags_not_modified(self):
+        """test an unchanged tag list is answered with 304"""
+        tag = Tags.objects.create(user=self.user, name='vegan')
+        etag = self.client.get(TAGS_URL)['ETag']
+
+        resp = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        tag.name = 'vegetarian'
+        tag.save()
+        resp = self.client.get(TAGS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_create_tag_duplicate_name_race(self):
+        """test a tag created after the name was checked is a 400"""
+        Tags.objects.create(user=self.user, name='Vegan')
+
+        with patch.object(TagsSerializer, 'validate_name',
+                          side_effect=lambda value: value):
+            resp = self.client.post(TAGS_URL, {'name': 'Vegan'})
+
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', resp.data)
+        self.assertEqual(Tags.objects.filter(user=self.user).count(), 1)
+
+    def test_create_tag_duplicate_name(self):
+        """test creating a tag with a name the user already has fails"""
+        Tags.objects.create(user=self.user, name='vegan')
+        resp = self.client.post(TAGS_URL, {'name': 'vegan'})
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Tags.objects.filter(user=self.user).count(), 1)
+
+    def test_upsert_tags(self):
+        """test upserting names returns ids, creating missing tags once"""
+        vegan = Tags.objects.create(user=self.user, name='vegan')
+        user2 = get_user_model().objects.create_user(
+            'other@londondappdev.com', 'pass123')
+        Tags.objects.create(user=user2, name='quick')
+
+        resp = self.client.post(
+            TAGS_UPSERT_URL, {'names': ['quick', 'vegan', 'quick', 'spicy']},
+            format='json')
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in resp.data],
+                         ['quick', 'vegan', 'spicy'])
+        self.assertEqual(resp.data[1]['id'], vegan.id)
+        tags = Tags.objects.filter(user=self.user)
+        self.assertEqual(tags.count(), 3)
+        for tag in resp.data:
+            self.assertEqual(tags.get(name=tag['name']).id, tag['id'])
+
+    def test_upsert_tags_is_idempotent(self):
+        """test upserting the same names twice returns the same ids"""
+        payload = {'names': ['vegan', 'quick']}
+        first = self.client.post(TAGS_UPSERT_URL, payload, format='json')
+        second = self.client.post(TAGS_UPSERT_URL, payload, format='json')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(Tags.objects.filter(user=self.user).count(), 2)
+
+    def test_upsert_tags_invalid(self):
+        """test upserting without names fails"""
+        resp = self.client.post(TAGS_UPSERT_URL, {'names': []},
+                                format='json')
+        self.assertEqual(resp.status_code, status.HTTP_400_BAD_REQUEST)
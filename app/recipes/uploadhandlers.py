@@ -0,0 +1,149 @@
+import io
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, \
+    StopFutureHandlers
+from django.utils.translation import gettext as _
+from PIL import Image
+
+
+class StreamedImageFile(UploadedFile):
+    """an uploaded image that was written straight into MEDIA_ROOT
+
+    exposing `temporary_file_path` lets ImageField validation open the
+    file from disk and FileSystemStorage move it into place with a
+    rename instead of copying it.
+    """
+
+    def __init__(self, path, name, content_type, size, charset,
+                 content_type_extra=None):
+        super().__init__(open(path, 'rb'), name, content_type, size,
+                         charset, content_type_extra)
+        self.path = path
+
+    def temporary_file_path(self):
+        return self.path
+
+
+class RecipeImageUploadHandler(FileUploadHandler):
+    """stream a recipe image to disk and validate it on the way in
+
+    chunks of the `image` field go to a part file under
+    MEDIA_ROOT/uploads/recipes/ so nothing but the image header is ever
+    held in memory, other file fields are dropped. the header is parsed as
+    soon as enough of it arrived, images that are too large, have too
+    many pixels or are not an allowed format are rejected before the
+    rest is stored and long before anything is decoded. the reason is
+    kept in `error` for the view to report.
+    """
+
+    directory = 'uploads/recipes'
+    field = 'image'
+    formats = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.error = None
+        self.path = None
+        self._file = None
+        # every part file, a request can repeat the field
+        self._paths = []
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        """turn away bodies that can not hold an acceptable image"""
+        self.content_length = content_length
+        if content_length and content_length > self._max_body():
+            self.error = _('image files may not be larger than {size} bytes') \
+                .format(size=settings.RECIPE_IMAGE_MAX_BYTES)
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.size = 0
+        self._header = b''
+        self._checked = False
+        if self.error is None and field_name == self.field:
+            directory = os.path.join(settings.MEDIA_ROOT, self.directory)
+            os.makedirs(directory, exist_ok=True)
+            self.path = os.path.join(directory, f'.{uuid.uuid4()}.part')
+            self._paths.append(self.path)
+            self._file = open(self.path, 'wb')
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.error is not None or self._file is None:
+            return None
+        self.size += len(raw_data)
+        if self.size > settings.RECIPE_IMAGE_MAX_BYTES:
+            self._reject(_('image files may not be larger than {size} bytes')
+                         .format(size=settings.RECIPE_IMAGE_MAX_BYTES))
+            return None
+        if not self._checked:
+            self._check_header(raw_data)
+            if self.error is not None:
+                return None
+        self._file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        if self.error is not None or self._file is None:
+            return None
+        if not self._checked:
+            self._reject(_('upload a valid image'))
+            return None
+        self._file.close()
+        self._file = None
+        return StreamedImageFile(
+            self.path, self.file_name, self.content_type, self.size,
+            self.charset, self.content_type_extra)
+
+    def upload_interrupted(self):
+        self.cleanup()
+
+    def cleanup(self):
+        """remove the part files that were not moved into place"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        for path in self._paths:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def _check_header(self, raw_data):
+        """try to read the image header from the data received so far"""
+        self._header += raw_data
+        try:
+            with Image.open(io.BytesIO(self._header)) as image:
+                image_format, (width, height) = image.format, image.size
+        except Image.DecompressionBombError:
+            self._reject(self._too_many_pixels())
+            return
+        except (OSError, SyntaxError, ValueError):
+            if len(self._header) > settings.RECIPE_IMAGE_MAX_HEADER_BYTES:
+                self._reject(_('upload a valid image'))
+            return
+
+        self._header = b''
+        self._checked = True
+        if image_format not in self.formats:
+            self._reject(_('images must be one of {formats}')
+                         .format(formats=', '.join(self.formats)))
+        elif width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            self._reject(self._too_many_pixels())
+
+    def _too_many_pixels(self):
+        return _('images may not have more than {pixels} pixels') \
+            .format(pixels=settings.RECIPE_IMAGE_MAX_PIXELS)
+
+    def _reject(self, error):
+        self.error = error
+        self._header = b''
+        self.cleanup()
+
+    def _max_body(self):
+        """the largest request an acceptable image fits in, allowing for
+        the multipart framing"""
+        return settings.RECIPE_IMAGE_MAX_BYTES + 64 * 1024
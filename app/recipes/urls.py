@@ -11,5 +11,6 @@ router.register('recipes', views.RecipesViewSet)
 app_name = 'recipes'
 
 urlpatterns = [
+    path('sync/', views.SyncView.as_view(), name='sync'),
     path('', include(router.urls))
 ]
@@ -1,27 +1,60 @@
+from collections import OrderedDict
+
+from django.conf import settings
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework import viewsets, mixins, status
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
-from core.models import Tags, Ingredients, Recipes
-from . import serializers
-
-
-class BaseRecipeAttrViewSet(viewsets.GenericViewSet,
+from core.db.replica import ReplicaReadMixin
+from core.metrics import SerializeTimingMixin
+from core.models import Tags, Ingredients, Recipes, \
+    collect_recipe_changes
+from users.authentication import CachedTokenAuthentication
+from . import serializers, filters, pagination, bulk, images, sync
+from .cache import CachedResponseMixin
+from .conditional import ConditionalRequestMixin
+from .fastpath import FastListMixin
+from .sparse import SparseFieldsMixin
+from .uploadhandlers import RecipeImageUploadHandler
+
+
+class BaseRecipeAttrViewSet(ReplicaReadMixin,
+                            SerializeTimingMixin,
+                            ConditionalRequestMixin,
+                            FastListMixin,
+                            SparseFieldsMixin,
+                            viewsets.GenericViewSet,
                             mixins.ListModelMixin,
                             mixins.CreateModelMixin):
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
+    pagination_class = pagination.KeysetPagination
+    cursor_ordering = ('-name', 'id')
 
     def get_queryset(self):
         """return objects for the current authenticated user"""
-        return self.queryset.filter(user=self.request.user).order_by('-name')
+        queryset = self.queryset.filter(user=self.request.user) \
+            .order_by(*self.cursor_ordering)
+        if self.action == 'list':
+            queryset = self.sparse_queryset(queryset)
+        return queryset
 
     def perform_create(self, serializer):
         """create a new tag"""
         serializer.save(user=self.request.user)
 
+    @action(methods=['POST'], detail=False)
+    def upsert(self, request):
+        """return the ids of the given names, creating missing ones"""
+        serializer = serializers.RecipeAttrUpsertSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        names = serializer.validated_data['names']
+        ids = self.queryset.model.objects.upsert_names(request.user, names)
+        return Response([{'id': ids[name], 'name': name}
+                         for name in dict.fromkeys(names)])
+
 
 class TagsViewSet(BaseRecipeAttrViewSet):
     """manage tags in the database"""
@@ -35,30 +68,27 @@ class IngredientsViewSet(BaseRecipeAttrViewSet):
     serializer_class = serializers.IngredientsSerializer
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(ReplicaReadMixin, SerializeTimingMixin,
+                     CachedResponseMixin, ConditionalRequestMixin,
+                     FastListMixin, SparseFieldsMixin, viewsets.ModelViewSet):
     """manage recipes in the database"""
     serializer_class = serializers.RecipesSerializer
     queryset = Recipes.objects.all()
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (IsAuthenticated,)
-
-    def _params_to_ints(self, qs):
-        """convery a list of string IDs to a list of integers"""
-        return [int(str_id) for str_id in qs.split(',')]
+    pagination_class = pagination.KeysetPagination
+    cursor_ordering = ('-id',)
 
     def get_queryset(self):
         """retrieve the recipes for the authenticated user"""
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset
-        if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
-        if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
-
-        return self.queryset.filter(user=self.request.user)
+        queryset = self.queryset.filter(user=self.request.user)
+        recipe_filter = filters.RecipeFilter(self.request.query_params)
+        self.cursor_ordering = recipe_filter.ordering or self.cursor_ordering
+        queryset = recipe_filter.filter_queryset(queryset) \
+            .order_by(*self.cursor_ordering)
+        if self.action in ('list', 'retrieve'):
+            queryset = self.sparse_queryset(queryset.defer('search_vector'))
+        return queryset
 
     def get_serializer_class(self):
         """return appropriate serializer class"""
@@ -70,14 +100,103 @@ class RecipesViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         """create a new recipe"""
-        serializer.save(user=self.request.user)
+        with collect_recipe_changes():
+            serializer.save(user=self.request.user)
+
+    def perform_update(self, serializer):
+        """update a recipe along with its tags and ingredients"""
+        with collect_recipe_changes():
+            serializer.save()
 
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
-        """upload an image to a recipe"""
+        """upload an image to a recipe
+
+        resized renditions are generated in the background, uploads are
+        turned away before the body is read while the pipeline is full.
+        """
         recipe = self.get_object()
-        serializer = self.get_serializer(recipe, data=request.data)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        if not images.pipeline.reserve():
+            return Response(
+                {'detail': 'too many images are being processed'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={'Retry-After': '5'})
+        handed_off = False
+        handler = RecipeImageUploadHandler(request._request)
+        request._request.upload_handlers = [handler]
+        try:
+            serializer = self.get_serializer(recipe, data=request.data)
+            if handler.error is not None:
+                errors = {'image': [handler.error]}
+            elif serializer.is_valid():
+                serializer.save()
+                handed_off = images.pipeline.submit(recipe.id)
+                return Response(serializer.data, status=status.HTTP_200_OK)
+            else:
+                errors = serializer.errors
+        finally:
+            handler.cleanup()
+            # the slot is ours until a worker has the job
+            if not handed_off:
+                images.pipeline.release()
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(methods=['POST', 'PUT', 'PATCH', 'DELETE'], detail=False)
+    def bulk(self, request):
+        """create, update or delete many recipes in one request
+
+        returns one result per item, with the recipe id or its errors.
+        """
+        items = request.data
+        if isinstance(items, list) and \
+                len(items) > settings.RECIPES_BULK_MAX_ITEMS:
+            return Response(
+                {'non_field_errors': [
+                    f'at most {settings.RECIPES_BULK_MAX_ITEMS} items '
+                    f'can be sent at once']},
+                status=status.HTTP_400_BAD_REQUEST)
+
+        if request.method == 'POST':
+            results, errors = bulk.bulk_create_recipes(request.user, items)
+            success = status.HTTP_201_CREATED
+        elif request.method == 'DELETE':
+            results, errors = bulk.bulk_delete_recipes(request.user, items)
+            success = status.HTTP_200_OK
+        else:
+            results, errors = bulk.bulk_update_recipes(
+                request.user, items, partial=request.method == 'PATCH')
+            success = status.HTTP_200_OK
+
+        if not errors:
+            resp_status = success
+        elif len(errors) == len(results):
+            resp_status = status.HTTP_400_BAD_REQUEST
+        else:
+            resp_status = status.HTTP_207_MULTI_STATUS
+        return Response(results, status=resp_status)
+
+
+class SyncView(APIView):
+    """sync a user's recipes, tags and ingredients incrementally
+
+    without `since` everything is returned. the `token` of a response
+    is sent back as `since` to get only what changed after it, deleted
+    objects as tombstones. when `more` is set the next request has to
+    follow straight away.
+    """
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request):
+        """return the changes since the given token"""
+        token = request.query_params.get('since')
+        if token is None:
+            data, watermark, more = sync.snapshot(request.user)
+        else:
+            data, watermark, more = sync.changes(
+                request.user, sync.read_token(request.user, token))
+        return Response(OrderedDict([
+            ('token', sync.make_token(request.user, watermark)),
+            ('more', more),
+            *data.items(),
+        ]))
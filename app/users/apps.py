@@ -2,4 +2,7 @@ from django.apps import AppConfig
 
 
 class UserConfig(AppConfig):
-    name = 'user'
+    name = 'users'
+
+    def ready(self):
+        from . import signals  # noqa: F401
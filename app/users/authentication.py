@@ -0,0 +1,161 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from . import tokens
+
+
+class LRUCache:
+    """a thread safe, size bounded mapping whose entries expire"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """return the value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """store value under key, evicting the least recently used"""
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """remove key if present"""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def delete_where(self, predicate):
+        """remove every entry whose value matches predicate"""
+        with self._lock:
+            for key in [k for k, (value, _) in self._data.items()
+                        if predicate(value)]:
+                del self._data[key]
+
+    def clear(self):
+        """remove every entry"""
+        with self._lock:
+            self._data.clear()
+
+
+_tokens = LRUCache(settings.AUTH_TOKEN_CACHE_SIZE,
+                   settings.AUTH_TOKEN_CACHE_TTL)
+
+
+def _shared_cache():
+    """return the cache shared between processes, if one is configured"""
+    alias = settings.AUTH_TOKEN_CACHE_ALIAS
+    return caches[alias] if alias else None
+
+
+def _shared_key(key):
+    return f'users:token:{key}'
+
+
+def _user_key(user_id):
+    return f'users:user:{user_id}'
+
+
+def forget_token(key):
+    """drop a token from the local and shared caches"""
+    _tokens.delete(key)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(_shared_key(key))
+
+
+def forget_user(user_id, keys=()):
+    """drop every cached token of a user
+
+    entries held by other processes are only dropped from their local
+    cache once AUTH_TOKEN_CACHE_TTL has passed, keep it short.
+    """
+    _tokens.delete_where(lambda user: user.pk == user_id)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete_many([_user_key(user_id)]
+                           + [_shared_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """token authentication that remembers which user a token belongs to
+
+    signed tokens are checked by their signature and age, then against
+    the revocation list, and their user is looked up by id. database
+    tokens from before signed tokens are looked up by key, and rejected
+    once they are older than AUTH_TOKEN_TTL. either way users are looked
+    up in a small in-process LRU first, then in the shared cache
+    (AUTH_TOKEN_CACHE_ALIAS) and only then in the database, so most
+    authenticated requests do not touch the database at all.
+    """
+
+    def authenticate_credentials(self, key):
+        if tokens.SEPARATOR in key:
+            return self.authenticate_signed(key)
+
+        user = _tokens.get(key)
+        if user is None:
+            shared = _shared_cache()
+            if shared is not None:
+                user = shared.get(_shared_key(key))
+            if user is None:
+                user, token = super().authenticate_credentials(key)
+                if tokens.legacy_expired(token):
+                    raise exceptions.AuthenticationFailed(
+                        _('Token has expired.'))
+                if shared is not None:
+                    shared.set(_shared_key(key), user,
+                               settings.AUTH_TOKEN_CACHE_TTL)
+            _tokens.set(key, user)
+
+        # hand out a copy so views changing request.user can not leak
+        # unsaved changes into the cache
+        user = copy.copy(user)
+        return (user, self.get_model()(key=key, user=user))
+
+    def authenticate_signed(self, key):
+        """authenticate a signed token, with one revocation list lookup"""
+        token = tokens.read(key)
+        if tokens.is_revoked(token):
+            raise exceptions.AuthenticationFailed(_('Token has been revoked.'))
+
+        cache_key = _user_key(token.user_id)
+        user = _tokens.get(cache_key)
+        if user is None:
+            shared = _shared_cache()
+            if shared is not None:
+                user = shared.get(cache_key)
+            if user is None:
+                user = get_user_model().objects \
+                    .filter(pk=token.user_id).first()
+                if user is None or not user.is_active:
+                    raise exceptions.AuthenticationFailed(
+                        _('User inactive or deleted.'))
+                if shared is not None:
+                    shared.set(cache_key, user, settings.AUTH_TOKEN_CACHE_TTL)
+            _tokens.set(cache_key, user)
+
+        return (copy.copy(user), token)
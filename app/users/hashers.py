@@ -0,0 +1,111 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingBusy(APIException):
+    """raised when too many passwords are waiting to be hashed"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = _('too many logins are being processed')
+    default_code = 'hashing_busy'
+    # sent as Retry-After
+    wait = 1
+
+
+class HashingPool:
+    """hash passwords on a few threads of each process
+
+    at most PASSWORD_HASH_WORKERS hashes run at once, so a burst of
+    logins leaves the CPU to other requests. up to
+    PASSWORD_HASH_MAX_PENDING more wait for a thread, beyond that logins
+    are turned away with HashingBusy. with PASSWORD_HASH_WORKERS set to 0
+    passwords are hashed inline instead.
+    """
+
+    def __init__(self):
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _setup(self):
+        with self._lock:
+            if self._slots is None:
+                self._slots = threading.BoundedSemaphore(
+                    settings.PASSWORD_HASH_WORKERS
+                    + settings.PASSWORD_HASH_MAX_PENDING)
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.PASSWORD_HASH_WORKERS,
+                    thread_name_prefix='password-hashing')
+
+    def run(self, func, *args):
+        """call a hashing function on the pool and return its result"""
+        # verify calls encode, which then runs on the same thread
+        if settings.PASSWORD_HASH_WORKERS == 0 or \
+                getattr(self._local, 'hashing', False):
+            return func(*args)
+        self._setup()
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            return self._executor.submit(self._call, func, args).result()
+        finally:
+            self._slots.release()
+
+    def _call(self, func, args):
+        self._local.hashing = True
+        try:
+            return func(*args)
+        finally:
+            self._local.hashing = False
+
+
+pool = HashingPool()
+
+
+class PooledHasherMixin:
+    """hash and verify passwords on the hashing pool"""
+
+    def encode(self, password, salt, *args):
+        return pool.run(super().encode, password, salt, *args)
+
+    def verify(self, password, encoded):
+        return pool.run(super().verify, password, encoded)
+
+
+class Argon2PasswordHasher(PooledHasherMixin, hashers.Argon2PasswordHasher):
+    """argon2 with the cost set in settings"""
+
+    @property
+    def time_cost(self):
+        return settings.PASSWORD_ARGON2_TIME_COST
+
+    @property
+    def memory_cost(self):
+        return settings.PASSWORD_ARGON2_MEMORY_COST
+
+    @property
+    def parallelism(self):
+        return settings.PASSWORD_ARGON2_PARALLELISM
+
+
+class BCryptSHA256PasswordHasher(PooledHasherMixin,
+                                 hashers.BCryptSHA256PasswordHasher):
+    """bcrypt with the cost set in settings"""
+
+    @property
+    def rounds(self):
+        return settings.PASSWORD_BCRYPT_ROUNDS
+
+
+class PBKDF2PasswordHasher(PooledHasherMixin, hashers.PBKDF2PasswordHasher):
+    """PBKDF2 with the cost set in settings"""
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_PBKDF2_ITERATIONS
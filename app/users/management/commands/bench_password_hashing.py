@@ -0,0 +1,121 @@
+import threading
+import time
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from rest_framework.test import APIClient
+
+from users import hashers
+
+
+HASHERS = (
+    ('pbkdf2', 'users.hashers.PBKDF2PasswordHasher'),
+    ('argon2', 'users.hashers.Argon2PasswordHasher'),
+    ('bcrypt', 'users.hashers.BCryptSHA256PasswordHasher'),
+)
+
+
+class Rollback(Exception):
+    """raised to discard the benchmark user once the run is over"""
+
+
+class Command(BaseCommand):
+    """django command to measure password hashing under load"""
+
+    help = 'measure logins per second per core of each hasher at the ' \
+        'configured cost, and API latency during a burst of logins with ' \
+        'and without the hashing pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20,
+                            help='logins timed for each hasher')
+        parser.add_argument('--concurrency', type=int, default=8,
+                            help='threads logging in during the burst')
+        parser.add_argument('--requests', type=int, default=200,
+                            help='API requests timed during the burst')
+
+    def handle(self, *args, **options):
+        """handle the command"""
+        with override_settings(PASSWORD_HASH_WORKERS=0):
+            for name, path in HASHERS:
+                self.per_core(name, import_string(path)(), options['logins'])
+        try:
+            with transaction.atomic():
+                self.burst(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def per_core(self, name, hasher, logins):
+        """time checking passwords one after another on one thread"""
+        if hasher.library is not None:
+            try:
+                hasher._load_library()
+            except ValueError:
+                self.stdout.write(f'{name:8} not installed')
+                return
+        encoded = hasher.encode('password', hasher.salt())
+        start = time.perf_counter()
+        for _ in range(logins):
+            hasher.verify('password', encoded)
+        seconds = (time.perf_counter() - start) / logins
+        self.stdout.write(f'{name:8} {seconds * 1000:7.1f} ms per login '
+                          f'{1 / seconds:7.1f} logins/s per core')
+
+    def burst(self, options):
+        """time API requests while threads keep logging in"""
+        encoded = make_password('password')
+        user = get_user_model().objects.create_user(
+            'bench-password-hashing@localhost', None)
+        client = APIClient(SERVER_NAME='localhost')
+        client.force_authenticate(user)
+        url = reverse('user:me')
+        workers = settings.PASSWORD_HASH_WORKERS or 1
+        for name, count in (('inline', 0), (f'{workers} workers', workers)):
+            with override_settings(PASSWORD_HASH_WORKERS=count), \
+                    patch.object(hashers, 'pool', hashers.HashingPool()):
+                logins, rejected, latencies = self.measure(
+                    client, url, encoded, options)
+            latencies.sort()
+            p50, p99 = (latencies[len(latencies) * pct // 100] * 1000
+                        for pct in (50, 99))
+            self.stdout.write(
+                f'{name:10} {logins:7.1f} logins/s {rejected:5} rejected '
+                f'API p50 {p50:6.2f} ms p99 {p99:6.2f} ms')
+
+    def measure(self, client, url, encoded, options):
+        """return logins/s, rejected logins and API request latencies"""
+        stop = threading.Event()
+        counts = {'logins': 0, 'rejected': 0}
+
+        def login():
+            while not stop.is_set():
+                try:
+                    check_password('password', encoded)
+                    counts['logins'] += 1
+                except hashers.HashingBusy:
+                    counts['rejected'] += 1
+                    time.sleep(0.01)
+
+        threads = [threading.Thread(target=login)
+                   for _ in range(options['concurrency'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        latencies = []
+        for _ in range(options['requests']):
+            request_start = time.perf_counter()
+            client.get(url)
+            latencies.append(time.perf_counter() - request_start)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        return counts['logins'] / elapsed, counts['rejected'], latencies
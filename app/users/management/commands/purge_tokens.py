@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+
+class Command(BaseCommand):
+    """django command to delete database tokens that have expired"""
+
+    help = 'delete auth tokens created more than AUTH_TOKEN_TTL ago. ' \
+        'signed tokens are not stored and need no purging'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        """handle the command"""
+        cutoff = timezone.now() - timedelta(seconds=settings.AUTH_TOKEN_TTL)
+        # created is not indexed, walk the primary key once instead of
+        # scanning the table for every batch
+        expired = Token.objects.filter(created__lte=cutoff) \
+            .order_by('key').values_list('key', flat=True)
+        purged = 0
+        last = ''
+        while True:
+            batch = list(expired.filter(key__gt=last)
+                         [:options['batch_size']])
+            if not batch:
+                break
+            last = batch[-1]
+            # one short DELETE per batch instead of one long one
+            count, _ = Token.objects.filter(
+                key__in=batch, created__lte=cutoff).delete()
+            purged += count
+
+        self.stdout.write(f'purged {purged} expired tokens')
@@ -2,6 +2,8 @@ from django.contrib.auth import get_user_model, authenticate
 from django.utils.translation import ugettext_lazy as _
 from rest_framework import serializers
 
+from . import tokens
+
 
 class UserSerializer(serializers.ModelSerializer):
     """serializer for the users obejct"""
@@ -23,6 +25,8 @@ class UserSerializer(serializers.ModelSerializer):
         if password:
             user.set_password(password)
             user.save()
+            # tokens issued with the old password stop working
+            tokens.revoke_user(user.pk)
 
         return user
 
@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_token, forget_user
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    """stop accepting a token as soon as it is deleted"""
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def forget_changed_user(sender, instance, **kwargs):
+    """drop cached tokens when a user is changed, deactivated or deleted"""
+    keys = Token.objects.filter(user_id=instance.pk) \
+        .values_list('key', flat=True)
+    forget_user(instance.pk, list(keys))
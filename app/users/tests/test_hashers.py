@@ -0,0 +1,94 @@
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2SHA1PasswordHasher, \
+    check_password, make_password
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from users import hashers
+
+
+TOKEN_URL = reverse('user:token')
+
+
+@override_settings(PASSWORD_HASHERS=[
+    'users.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+], PASSWORD_PBKDF2_ITERATIONS=1000)
+class PasswordHashingTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'test@londonappdev.com', 'testpass')
+
+    def login(self):
+        return self.client.post(
+            TOKEN_URL, {'email': 'test@londonappdev.com',
+                        'password': 'testpass'})
+
+    def test_cost_from_settings(self):
+        """test passwords are hashed with the configured cost"""
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$1000$'))
+
+    def test_rehash_on_login_after_cost_change(self):
+        """test a login rehashes a password made with an older cost"""
+        with override_settings(PASSWORD_PBKDF2_ITERATIONS=2000):
+            resp = self.login()
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+
+    def test_rehash_on_login_with_preferred_hasher(self):
+        """test a login replaces a hash made with another hasher"""
+        self.user.password = PBKDF2SHA1PasswordHasher().encode(
+            'testpass', 'salt')
+        self.user.save()
+
+        resp = self.login()
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+
+    def test_hashed_on_pool(self):
+        """test passwords are hashed on the pool threads"""
+        threads = []
+        verify = hashers.hashers.PBKDF2PasswordHasher.verify
+
+        def record(hasher, password, encoded):
+            threads.append(threading.current_thread().name)
+            return verify(hasher, password, encoded)
+
+        with patch.object(hashers.hashers.PBKDF2PasswordHasher, 'verify',
+                          record):
+            self.assertTrue(check_password('pw', make_password('pw')))
+
+        self.assertTrue(threads[0].startswith('password-hashing'))
+
+    @override_settings(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_MAX_PENDING=0)
+    def test_login_busy(self):
+        """test logins are turned away while the pool is full"""
+        pool = hashers.HashingPool()
+        pool._setup()
+        pool._slots.acquire()
+
+        with patch('users.hashers.pool', pool):
+            resp = self.login()
+
+        self.assertEqual(resp.status_code,
+                         status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(resp['Retry-After'], '1')
+
+    @override_settings(PASSWORD_HASH_WORKERS=0)
+    def test_hash_inline(self):
+        """test passwords are hashed inline without workers"""
+        with patch('users.hashers.pool', hashers.HashingPool()) as pool:
+            self.assertTrue(check_password('pw', make_password('pw')))
+
+        self.assertIsNone(pool._executor)
@@ -0,0 +1,172 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.tests.mixins import NPlusOneMixin, QueryCountMixin
+from users import authentication
+
+
+TOKEN_URL = reverse('user:token')
+REFRESH_URL = reverse('user:token-refresh')
+REVOKE_URL = reverse('user:token-revoke')
+ME_URL = reverse('user:me')
+
+
+class SignedTokenTests(QueryCountMixin, NPlusOneMixin, TestCase):
+    """test signed tokens expire, rotate and can be revoked"""
+
+    def setUp(self):
+        for alias in ('default', 'shared'):
+            caches[alias].clear()
+        authentication._tokens.clear()
+        self.user = get_user_model().objects.create_user(
+            email='test@londonappdev.com',
+            password='testpass',
+            name='test'
+        )
+        self.client = APIClient()
+
+    def login(self):
+        """return a new token of the user, and use it"""
+        resp = self.client.post(TOKEN_URL, {'email': 'test@londonappdev.com',
+                                            'password': 'testpass'})
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.use(resp.data['token'])
+        return resp.data['token']
+
+    def use(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def test_login_issues_signed_token(self):
+        """test logging in stores no token and checks it without queries"""
+        self.login()
+
+        self.assertFalse(Token.objects.exists())
+        self.assertRequestQueries(1, 'get', ME_URL)
+        resp = self.assertRequestQueries(0, 'get', ME_URL)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_forged_token_rejected(self):
+        """test a token whose signature does not hold is rejected"""
+        token = self.login()
+        user_id, rest = token.split('.', 1)
+        self.use(f'{int(user_id) + 1}.{rest}')
+
+        resp = self.client.get(ME_URL)
+
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_expired_token_rejected(self):
+        """test a token is rejected once AUTH_TOKEN_TTL has passed"""
+        self.login()
+
+        with override_settings(AUTH_TOKEN_TTL=0):
+            resp = self.client.get(ME_URL)
+
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_rotates_token(self):
+        """test refreshing issues a new token and revokes the old one"""
+        old = self.login()
+
+        resp = self.client.post(REFRESH_URL)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(resp.data['token'], old)
+        self.assertIn('expires_at', resp.data)
+
+        self.use(resp.data['token'])
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_200_OK)
+        self.use(old)
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke_token(self):
+        """test a revoked token is rejected and other tokens are not"""
+        other = self.login()
+        self.login()
+
+        resp = self.client.post(REVOKE_URL)
+
+        self.assertEqual(resp.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+        self.use(other)
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_200_OK)
+
+    def test_revoke_all_tokens(self):
+        """test revoking all tokens rejects every token issued so far"""
+        other = self.login()
+        legacy = Token.objects.create(user=self.user)
+        self.login()
+
+        self.client.post(REVOKE_URL, {'all': True})
+
+        for token in (other, legacy.key):
+            self.use(token)
+            self.assertEqual(self.client.get(ME_URL).status_code,
+                             status.HTTP_401_UNAUTHORIZED)
+        self.login()
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_200_OK)
+
+    def test_password_change_revokes_tokens(self):
+        """test changing the password rejects the tokens issued before"""
+        self.login()
+
+        self.client.patch(ME_URL, {'password': 'newpass123'})
+
+        self.assertEqual(self.client.get(ME_URL).status_code,
+                         status.HTTP_401_UNAUTHORIZED)
+
+    def test_refresh_replaces_legacy_token(self):
+        """test a database token can be swapped for a signed one"""
+        legacy = Token.objects.create(user=self.user)
+        self.use(legacy.key)
+
+        resp = self.client.post(REFRESH_URL)
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.assertFalse(Token.objects.exists())
+
+    def test_expired_legacy_token_rejected(self):
+        """test a database token older than AUTH_TOKEN_TTL is rejected"""
+        legacy = Token.objects.create(user=self.user)
+        Token.objects.filter(pk=legacy.pk).update(
+            created=timezone.now() - timedelta(days=30))
+        self.use(legacy.key)
+
+        with override_settings(AUTH_TOKEN_TTL=24 * 3600):
+            resp = self.client.get(ME_URL)
+
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PurgeTokensTests(TestCase):
+    """test the purge_tokens command"""
+
+    @override_settings(AUTH_TOKEN_TTL=24 * 3600)
+    def test_purge_expired_tokens(self):
+        """test only tokens older than AUTH_TOKEN_TTL are deleted"""
+        users = [get_user_model().objects.create_user(
+            f'user{n}@londonappdev.com', 'testpass') for n in range(5)]
+        tokens = [Token.objects.create(user=user) for user in users]
+        Token.objects.filter(pk__in=[token.pk for token in tokens[:4]]) \
+            .update(created=timezone.now() - timedelta(days=2))
+
+        out = StringIO()
+        call_command('purge_tokens', batch_size=3, stdout=out)
+
+        self.assertEqual(list(Token.objects.values_list('pk', flat=True)),
+                         [tokens[4].pk])
+        self.assertIn('purged 4', out.getvalue())
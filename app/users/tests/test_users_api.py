@@ -1,9 +1,15 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
 from django.urls import reverse
+from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 from rest_framework import status
 
+from core.tests.mixins import NPlusOneMixin, QueryCountMixin
+from users import authentication
+
 
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
@@ -109,7 +115,7 @@ class PublicUsersAPITests(TestCase):
         self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
 
 
-class PrivateUserApiTests(TestCase):
+class PrivateUserApiTests(NPlusOneMixin, TestCase):
     """test API requests that require authentication"""
 
     def setUp(self):
@@ -145,3 +151,77 @@ class PrivateUserApiTests(TestCase):
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+
+class CachedTokenAuthenticationTests(QueryCountMixin, NPlusOneMixin, TestCase):
+    """test token authentication is served from the cache"""
+
+    def setUp(self):
+        for alias in ('default', 'shared'):
+            caches[alias].clear()
+        authentication._tokens.clear()
+        self.user = create_user(
+            email='test@londonappdev.com',
+            password='testpass',
+            name='test'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_lookup_cached(self):
+        """test only the first request looks the token up"""
+        self.assertRequestQueries(1, 'get', ME_URL)
+        resp = self.assertRequestQueries(0, 'get', ME_URL)
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_token_shared_between_processes(self):
+        """test a token cached by another process skips the database"""
+        self.client.get(ME_URL)
+        authentication._tokens.clear()
+
+        resp = self.assertRequestQueries(0, 'get', ME_URL)
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+
+    def test_deleted_token_rejected(self):
+        """test a deleted token stops working straight away"""
+        self.client.get(ME_URL)
+        self.token.delete()
+
+        resp = self.client.get(ME_URL)
+
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_rejected(self):
+        """test a deactivated user can no longer authenticate"""
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        self.user.save()
+
+        resp = self.client.get(ME_URL)
+
+        self.assertEqual(resp.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_updated_user_not_stale(self):
+        """test a profile update is visible on the next request"""
+        self.client.get(ME_URL)
+        self.client.patch(ME_URL, {'name': 'new name'})
+
+        resp = self.client.get(ME_URL)
+
+        self.assertEqual(resp.data['name'], 'new name')
+
+    def test_update_keeps_changes_of_other_processes(self):
+        """test an update does not write back the cached copy of the user"""
+        self.client.get(ME_URL)
+        # another process changes the password, this one keeps its copy
+        get_user_model().objects.filter(pk=self.user.pk) \
+            .update(password=make_password('otherpass'))
+
+        resp = self.client.patch(ME_URL, {'name': 'new name'})
+
+        self.assertEqual(resp.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'new name')
+        self.assertTrue(self.user.check_password('otherpass'))
@@ -0,0 +1,107 @@
+import math
+import secrets
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+from django.utils import baseconv, timezone
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authtoken.models import Token
+
+
+SALT = 'users.tokens'
+
+# signed tokens have it before their signature, the hex keys of the
+# older database tokens never do
+SEPARATOR = ':'
+
+
+class SignedToken(namedtuple('SignedToken', 'key user_id jti issued')):
+    """a verified signed token, issued is in milliseconds since the epoch"""
+
+    @property
+    def expires(self):
+        """return when the token expires, in seconds since the epoch"""
+        return self.issued / 1000 + settings.AUTH_TOKEN_TTL
+
+    @property
+    def expires_at(self):
+        return datetime.fromtimestamp(self.expires, timezone.utc)
+
+
+def _now():
+    return int(time.time() * 1000)
+
+
+def issue(user):
+    """return a new signed token for a user
+
+    the user id, a random token id and the time of issue are signed, so
+    the token can be checked without storing it anywhere.
+    """
+    jti = secrets.token_urlsafe(9)
+    issued = _now()
+    value = f'{user.pk}.{jti}.{baseconv.base62.encode(issued)}'
+    key = signing.Signer(sep=SEPARATOR, salt=SALT).sign(value)
+    return SignedToken(key, user.pk, jti, issued)
+
+
+def read(key):
+    """return the token of a key, if its signature holds and it is current"""
+    try:
+        value = signing.Signer(sep=SEPARATOR, salt=SALT).unsign(key)
+    except signing.BadSignature:
+        raise exceptions.AuthenticationFailed(_('Invalid token.'))
+    user_id, jti, issued = value.split('.')
+    token = SignedToken(key, int(user_id), jti,
+                        baseconv.base62.decode(issued))
+    if token.expires <= time.time():
+        raise exceptions.AuthenticationFailed(_('Token has expired.'))
+    return token
+
+
+def legacy_expired(token):
+    """return whether a database token is older than AUTH_TOKEN_TTL"""
+    return token.created <= \
+        timezone.now() - timedelta(seconds=settings.AUTH_TOKEN_TTL)
+
+
+def _revocations():
+    return caches[settings.AUTH_TOKEN_REVOCATION_CACHE_ALIAS]
+
+
+def _revoked_key(jti):
+    return f'users:revoked:{jti}'
+
+
+def _revoked_before_key(user_id):
+    return f'users:revoked-before:{user_id}'
+
+
+def revoke(token):
+    """stop accepting a signed token before it expires
+
+    the entry is dropped from the cache when the token would have
+    expired anyway, so the list only holds tokens that are still current.
+    """
+    timeout = math.ceil(token.expires - time.time())
+    if timeout > 0:
+        _revocations().set(_revoked_key(token.jti), True, timeout)
+
+
+def revoke_user(user_id):
+    """stop accepting every token a user was issued so far"""
+    _revocations().set(_revoked_before_key(user_id), _now(),
+                       settings.AUTH_TOKEN_TTL)
+    Token.objects.filter(user_id=user_id).delete()
+
+
+def is_revoked(token):
+    """return whether a signed token was revoked, in one cache lookup"""
+    keys = (_revoked_key(token.jti), _revoked_before_key(token.user_id))
+    found = _revocations().get_many(keys)
+    return keys[0] in found or found.get(keys[1], -1) >= token.issued
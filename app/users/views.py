@@ -1,26 +1,84 @@
-from rest_framework import generics, authentication, permissions
+from django.contrib.auth import get_user_model
+from rest_framework import generics, permissions, status
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+from core.db.replica import ReplicaReadMixin
+from core.metrics import SerializeTimingMixin
+from . import tokens
+from .authentication import CachedTokenAuthentication
 from .serializers import UserSerializer, AuthTokenSerializer
 
 
-class CreateUserView(generics.CreateAPIView):
+class CreateUserView(SerializeTimingMixin, generics.CreateAPIView):
     """create a new user in the system"""
     serializer_class = UserSerializer
 
 
+def token_response(user):
+    """return a response with a new signed token for a user"""
+    token = tokens.issue(user)
+    return Response({'token': token.key, 'expires_at': token.expires_at})
+
+
+def revoke_current(request):
+    """stop accepting the token a request was authenticated with"""
+    if isinstance(request.auth, tokens.SignedToken):
+        tokens.revoke(request.auth)
+    else:
+        request.auth.delete()
+
+
 class CreateTokenView(ObtainAuthToken):
     """create a new auth token for user"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
 
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data,
+                                           context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        return token_response(serializer.validated_data['user'])
+
+
+class RefreshTokenView(APIView):
+    """swap the token of the request for a new one"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (permissions.IsAuthenticated,)
 
-class ManageUserView(generics.RetrieveUpdateAPIView):
+    def post(self, request):
+        revoke_current(request)
+        return token_response(request.user)
+
+
+class RevokeTokenView(APIView):
+    """stop accepting the token of the request, or all the user's tokens"""
+    authentication_classes = (CachedTokenAuthentication,)
+    permission_classes = (permissions.IsAuthenticated,)
+
+    def post(self, request):
+        if request.data.get('all'):
+            tokens.revoke_user(request.user.pk)
+        else:
+            revoke_current(request)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ManageUserView(ReplicaReadMixin, SerializeTimingMixin,
+                     generics.RetrieveUpdateAPIView):
     """manage the authenticated user"""
     serializer_class = UserSerializer
-    authentication_classes = (authentication.TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication,)
     permission_classes = (permissions.IsAuthenticated,)
 
     def get_object(self):
-        """retrieve and return authenticated user"""
-        return self.request.user
+        """retrieve and return authenticated user
+
+        request.user may come from the token cache, so changes are made
+        to a copy read from the database rather than to a stale one.
+        """
+        if self.request.method in permissions.SAFE_METHODS:
+            return self.request.user
+        return get_user_model().objects.get(pk=self.request.user.pk)